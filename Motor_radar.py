@@ -1,73 +1,213 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import serial
 import serial.tools.list_ports
+import logging
+import queue
 import threading
 import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from radar_calibration import (
+    CalibrationPoint, METHOD_PIECEWISE, METHOD_SPLINE, fit_linear, fit_table, residual_stats,
+)
+from radar_client import RadarMotorClient, RX
+from radar_events import EventDispatcher, Nack, parse_event
+from radar_log import LogBuffer
+from radar_program import load_program
+from radar_record import ReplayClient, SessionRecorder, replay
+from radar_protocol import (
+    BAUD_RATE, DEGREES_PER_PULSE, MOTOR_STATES, DEFAULT_MAX_SPEED_HZ, MAX_STEP_FREQUENCY_HZ,
+    RAMP_PROFILES, RAMP_TRAPEZOIDAL, HOMING_MAX_BACKOFF_DEGREES, CALIBRATION_MAX_POINTS, Telemetry, Position, ScanPoint,
+    SegmentDone, FirmwareStats, HomingReport, RadarCommandError,
+)
 
 # --- Configurações ---
 DEFAULT_PORT = 'COM12' # Mude para a porta do seu ESP32!
-BAUD_RATE = 115200
-
-ser = None # Variável global para a porta serial
+GUI_QUEUE_MAXSIZE = 10000 # Eventos pendentes entre a thread de leitura e o Tk
+GUI_DRAIN_INTERVAL_MS = 50 # Período de esvaziamento da fila pelo root.after
+GUI_DRAIN_BATCH = 2000 # Máximo de eventos processados por chamada
+DIAGNOSTICS_TOP_COMMANDS = 4 # Comandos mais frequentes exibidos no painel de diagnóstico
+CALIBRATION_DEFAULT_POINTS = 3
+CALIBRATION_MAX_GUI_POINTS = 72 # Pontos medidos aceitos pela GUI (ex.: 36 = a cada 10°)
+CALIBRATION_ROWS_PER_COLUMN = 12 # Pontos por coluna de campos; os demais seguem em novas colunas
+CALIBRATION_MODELS = {"Linear": None, "Por partes": METHOD_PIECEWISE, "Spline": METHOD_SPLINE} # None = CALIBRAR
+CALIBRATION_POSITION_TIMEOUT_S = 1.0 # Espera pelo POS ao registrar um ponto (sem resposta, vale o teórico digitado)
+
+# Linhas que alteram o estado da GUI (as demais vão apenas para o log e podem ser descartadas se a fila encher)
+GUI_STATE_LINES = {
+    "WARNING_LIMIT_SWITCH_ACTIVE", "WARNING_LIMIT_SWITCH_HIT", "ACK_LIMIT_SWITCH_RESET",
+    "ACK_PARADO", "ACK_ANGULO_CONCLUIDO", "ACK_HOMING_STARTED", "ACK_HOMING_CONCLUIDO", "ACK_NOT_HOMED",
+    "ACK_CALIBRATION_COMPLETE", "ACK_CALIBRATION_RESET", "ACK_SCAN_INICIADO", "ACK_SCAN_CONCLUIDO",
+    "ACK_PROG_INICIADO", "ACK_PROG_CONCLUIDO",
+}
+# Linhas que só atualizam o label do fim de curso: dentro de um lote, apenas a última é aplicada
+LIMIT_SWITCH_STATUS_LINES = {"WARNING_LIMIT_SWITCH_ACTIVE", "WARNING_LIMIT_SWITCH_HIT", "ACK_LIMIT_SWITCH_RESET"}
+
+# Log
+LOG_VIEW_LINES = 500 # Linhas mantidas no Text widget (apenas a cauda visível)
+LOG_SPILL_PATH = "motor_radar.log" # Arquivo do log completo, quando "Gravar em arquivo" está marcado
+SESSION_RECORD_PATTERN = "sessao_%Y%m%d_%H%M%S.rrec" # Gravação do tráfego serial (strftime), "Gravar sessão"
+LOG_LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+LOG_PREFIX_FILTERS = { # Checkbox -> prefixos das mensagens de depuração do firmware que ele oculta
+    "PULSE_COUNT": ("PULSE_COUNT", "AUTO_BACKOFF_PULSE_COUNT"),
+    "MOTOR_CTRL_TASK": ("MOTOR_CTRL_TASK",),
+    "HOME": ("HOME",),
+}
+
+client = None # Cliente headless do motor (radar_client.RadarMotorClient)
 root = None # Variável global para a janela principal
 log_text = None # Variável global para a área de log
 motor_power_state = False # True = motor habilitado, False = motor desabilitado (para o botão único)
 limit_switch_status_label = None # Label para o status do fim de curso
 homed_status_label = None # REINTRODUZIDO: Label para o status do homing
+homing_report_label = None # Repetibilidade do último homing em duas passadas (registro HOM)
+position_label = None # Posição absoluta pela telemetria (TLM) e pelas respostas POS
+scan_status_label = None # Progresso do SCAN/VARREDURA (registros SCN)
+program_status_label = None # Progresso do programa de movimento (registros SEG)
+program_segment_count = 0 # Segmentos do programa em execução
+program_running = False # Entre ACK_PROG_INICIADO e ACK_PROG_CONCLUIDO/ACK_PARADO: só então um SEG atualiza o rótulo
+diagnostics_host_label = None # Painel de diagnóstico: métricas do host (radar_metrics)
+diagnostics_firmware_label = None # Painel de diagnóstico: último registro STATS da ESP32
+gui_events = queue.Queue(maxsize=GUI_QUEUE_MAXSIZE) # Eventos (tipo, dado) da thread de leitura para o Tk
+gui_dropped_log_lines = 0 # Linhas de log descartadas com a fila cheia
+log_buffer = LogBuffer() # Log completo (circular); o Text mostra só a cauda filtrada
+log_render_pending = [] # Linhas aceitas pelo filtro ainda não desenhadas
+log_level_combobox = None
+log_prefix_filter_vars = {} # Prefixo -> BooleanVar (True = ocultar)
+log_spill_var = None
+binary_protocol_var = None # Checkbox "Protocolo binário" da conexão
+session_record_var = None # Checkbox "Gravar sessão": grava TX/RX com instantes (radar_record)
+replay_stop_event = None # threading.Event da reprodução de sessão em andamento (None = sem reprodução)
 
 # Calibração
-calibration_step = 0 # Qual ponto de calibração estamos (0, 1, 2)
+calibration_step = 0 # Qual ponto de calibração estamos (0 .. número de pontos - 1)
 calibration_theoretical_inputs = [] # Para armazenar os objetos Entry para ângulos teóricos
 calibration_measured_inputs = [] # Para armazenar os objetos Entry para ângulos medidos
 calibration_data_for_esp32 = [] # Acumula os pares (teórico, medido) a serem enviados para o ESP32
 
 # --- Funções de Comunicação Serial ---
-def connect_serial():
-    global ser
-    port = port_combobox.get()
+def connect_serial(serial_port=None):
+    """Conecta à porta do combobox; `serial_port` injeta uma porta já aberta (simulador, benchmark)."""
+    global client
+    port = serial_port.port if serial_port is not None else port_combobox.get()
     if not port:
         messagebox.showerror("Erro", "Selecione uma porta serial.")
         return
 
     try:
-        ser = serial.Serial(port, BAUD_RATE, timeout=0.1)
+        client = RadarMotorClient(port, BAUD_RATE, serial_port=serial_port)
+        client.add_listener(on_serial_traffic)
+        client.add_connection_lost_listener(on_connection_lost)
+        client.metrics.add_gauge("gui_event_queue_depth", "Eventos aguardando a thread do Tk", gui_events.qsize)
+        client.connect()
+        if session_record_var.get():
+            start_session_recording()
+        if binary_protocol_var.get():
+            client.request_binary_protocol(timeout=1.0).add_done_callback(on_binary_protocol_negotiated)
         status_label.config(text=f"Conectado em {port}", foreground="green")
         connect_button.config(state=tk.DISABLED)
         disconnect_button.config(state=tk.NORMAL)
         log_message(f"Conectado em {port}")
-        
-        serial_read_thread = threading.Thread(target=read_serial_continuously, daemon=True)
-        serial_read_thread.start()
 
         update_gui_after_connect()
+        send_command("query_position") # Posição atual e se o HOME já foi feito desde a energização
         
     except serial.SerialException as e:
+        client = None
         messagebox.showerror("Erro de Conexão", f"Não foi possível conectar à porta {port}:\n{e}")
         status_label.config(text="Desconectado", foreground="red")
         log_message(f"Erro ao conectar: {e}")
 
 def disconnect_serial():
-    global ser, motor_power_state
-    if ser and ser.is_open:
-        send_command("PARAR") # Tenta parar o motor
-        send_command("DESABILITAR") # Desabilita o driver também
+    global client, motor_power_state
+    if client:
+        if client.is_connected:
+            send_command("stop") # Tenta parar o motor
+            send_command("disable") # Desabilita o driver também
+            time.sleep(0.05) # Pequeno delay para o comando ser enviado
         motor_power_state = False
         update_power_button()
-        time.sleep(0.05) # Pequeno delay para o comando ser enviado
-        ser.close()
-        ser = None
+        client.close()
+        stop_session_recording()
+        client = None
         status_label.config(text="Desconectado", foreground="red")
         connect_button.config(state=tk.NORMAL)
         disconnect_button.config(state=tk.DISABLED)
         disable_controls()
         log_message("Desconectado.")
 
-def send_command(command):
-    if ser and ser.is_open:
+def start_session_recording():
+    path = time.strftime(SESSION_RECORD_PATTERN)
+    try:
+        client.recorder = SessionRecorder(path)
+    except OSError as e:
+        messagebox.showerror("Erro", f"Não foi possível gravar a sessão:\n{e}")
+        session_record_var.set(False)
+        return
+    log_message(f"Gravando sessão em {path}")
+
+def stop_session_recording():
+    recorder = client.recorder if client else None
+    if recorder is None:
+        return
+    client.recorder = None
+    recorder.close()
+    log_message(f"Sessão gravada em {recorder.path} ({recorder.records} registros).")
+
+def toggle_session_recording():
+    if client is None: # Sem conexão: vale a partir da próxima
+        return
+    if session_record_var.get():
+        start_session_recording()
+    else:
+        stop_session_recording()
+
+def toggle_session_replay():
+    """Reproduz uma sessão gravada pela mesma fila de eventos da GUI (log, labels); clicar de novo interrompe."""
+    global replay_stop_event
+    if replay_stop_event is not None:
+        replay_stop_event.set()
+        return
+    if client is not None:
+        messagebox.showwarning("Aviso", "Desconecte antes de reproduzir uma sessão.")
+        return
+    path = filedialog.askopenfilename(title="Reproduzir sessão",
+                                      filetypes=[("Sessões gravadas", "*.rrec"), ("Todos os arquivos", "*.*")])
+    if not path:
+        return
+    real_time = messagebox.askyesnocancel("Reproduzir sessão", "Reproduzir no tempo original?\n"
+                                          "(Não = o mais rápido possível)")
+    if real_time is None:
+        return
+    replay_client = ReplayClient()
+    replay_client.add_listener(on_serial_traffic)
+    replay_stop_event = threading.Event()
+
+    def run(stop_event):
+        try:
+            replay(path, replay_client, 1.0 if real_time else 0, stop_event)
+        except (OSError, ValueError) as e:
+            post_gui_event("log", f"Erro na reprodução: {e}")
+        post_gui_event("replay_done", path)
+
+    threading.Thread(target=run, args=(replay_stop_event,), daemon=True).start()
+    connect_button.config(state=tk.DISABLED)
+    replay_button.config(text="PARAR REPRODUÇÃO")
+    log_message(f"Reproduzindo {path}")
+
+def on_replay_done(path):
+    global replay_stop_event
+    replay_stop_event = None
+    connect_button.config(state=tk.NORMAL)
+    replay_button.config(text="REPRODUZIR SESSÃO")
+    log_message(f"Reprodução de {path} encerrada.")
+
+def send_command(action, *args):
+    """Chama o método `action` do cliente (ex.: "move", 90.0, 50) e retorna o Future do comando."""
+    if client and client.is_connected:
         try:
-            ser.write(f"{command}\n".encode('utf-8'))
-            log_message(f"Enviado: {command}")
+            return getattr(client, action)(*args)
         except serial.SerialException as e:
             messagebox.showerror("Erro de Envio", f"Erro ao enviar comando: {e}\nVerifique a conexão.")
             disconnect_serial()
@@ -75,78 +215,311 @@ def send_command(command):
         messagebox.showwarning("Aviso", "Não conectado à porta serial.")
         log_message("Não conectado, não pode enviar comando.")
 
-def read_serial_continuously():
-    """Lê continuamente da porta serial e atualiza o log."""
-    while True:
-        if ser and ser.is_open:
-            try:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    log_message(f"Recebido da ESP32: {line}")
-                    # Processa ACK messages e avisos
-                    if line == "WARNING_LIMIT_SWITCH_ACTIVE" or line == "WARNING_LIMIT_SWITCH_HIT":
-                        limit_switch_status_label.config(text="FIM DE CURSO ATIVO!", foreground="red", font=("Arial", 12, "bold"))
-                    elif line == "ACK_LIMIT_SWITCH_RESET":
-                         limit_switch_status_label.config(text="Fim de Curso: OK", foreground="green", font=("Arial", 10))
-                    
-                    if line == "ACK_PARADO" or line == "ACK_ANGULO_CONCLUIDO": 
-                         limit_switch_status_label.config(text="Fim de Curso: OK", foreground="green", font=("Arial", 10)) # Reset visual
-                         home_button.config(state=tk.NORMAL) # Habilita o botão de homing se o motor parou
-                         enable_angle_controls_after_move() # Habilita os controles angulares após movimento
-                    elif line == "ACK_HOMING_STARTED": # REINTRODUZIDO
-                        homed_status_label.config(text="Homing: Em Andamento...", foreground="orange")
-                        home_button.config(state=tk.DISABLED) # Desabilita o botão de homing durante o processo
-                        disable_angle_controls() # Desabilita TODOS os controles de ângulo (incluindo direção) durante homing
-                    elif line == "ACK_HOMING_CONCLUIDO": # REINTRODUZIDO
-                        homed_status_label.config(text="Homing: CONCLUÍDO!", foreground="green", font=("Arial", 10, "bold"))
-                        home_button.config(state=tk.NORMAL) # Habilita o botão novamente
-                        enable_angle_controls() # Reabilita os controles de ângulo após homing
-                    elif line == "ACK_NOT_HOMED": # REINTRODUZIDO
-                        homed_status_label.config(text="Homing: NÃO CALIBRADO", foreground="red", font=("Arial", 10))
-                        home_button.config(state=tk.NORMAL) # Habilita o botão home
-                        enable_angle_controls() # HABILITA CONTROLES DE ÂNGULO MESMO SEM HOMING
-                    elif "NACK_" in line: # Qualquer NACK de erro genérico
-                        limit_switch_status_label.config(text="Fim de Curso: OK", foreground="green", font=("Arial", 10))
-                        home_button.config(state=tk.NORMAL) # Habilita o botão home
-                        homed_status_label.config(text="Homing: ERRO!", foreground="red") # Indica erro no homing
-                        enable_angle_controls() # HABILITA CONTROLES DE ÂNGULO MESMO COM ERRO DE HOMING
-                    elif "ACK_CALIBRATION_POINT" in line: # Processa ponto de calibração (GUI não usa mais este ACK para avançar)
-                        pass 
-                    elif line == "ACK_CALIBRATION_COMPLETE": # Recebido quando a ESP32 termina o cálculo
-                        status_label_calibration.config(text="Calibração Concluída!", foreground="green", font=("Arial", 10, "bold"))
-                        messagebox.showinfo("Calibração", "Calibração concluída! O fator de calibração foi ajustado no motor.")
-                        cal_start_button.config(state=tk.NORMAL) # Reabilita iniciar nova calibração
-                        cal_submit_button.config(state=tk.DISABLED) # Desabilita o botão Calcular/Enviar
-                        cal_move_button.config(state=tk.DISABLED) # Desabilita mover durante o movimento
-                        cal_submit_current_point_button.config(state=tk.DISABLED) # Desabilita o botão de registrar ponto
-                        enable_angle_controls() # Reabilita os controles de ângulo se o motor está habilitado
-                    elif line == "NACK_CALIBRATION_FACTOR_ZERO": # Erro de fator zero na calibração
-                        status_label_calibration.config(text="Calibração falhou: Fator Zero!", foreground="red", font=("Arial", 10, "bold"))
-                        messagebox.showerror("Erro de Calibração", "Fator de calibração resultou em zero. Refaça a calibração com medições mais variadas.")
-                        cal_start_button.config(state=tk.NORMAL)
-                        cal_submit_button.config(state=tk.DISABLED)
-                        cal_submit_current_point_button.config(state=tk.DISABLED)
-                        enable_angle_controls()
-                    elif line == "ACK_CALIBRATION_RESET": # Calibração zerada
-                        status_label_calibration.config(text="Calibração Zerada!", foreground="red", font=("Arial", 10, "bold"))
-                        messagebox.showinfo("Calibração", "A calibração foi zerada para os valores padrão.")
-                        cal_start_button.config(state=tk.NORMAL)
-                        cal_submit_button.config(state=tk.DISABLED)
-                        cal_submit_current_point_button.config(state=tk.DISABLED)
-                        enable_angle_controls() # Habilita controles de ângulo
-            except serial.SerialException as e:
-                log_message(f"Erro de leitura serial: {e}")
-                disconnect_serial()
-                break
-            except Exception as e:
-                log_message(f"Erro inesperado na leitura serial: {e}")
-        time.sleep(0.01)
-
-def log_message(message):
-    """Adiciona uma mensagem ao Text widget de log."""
-    if log_text:
-        log_text.insert(tk.END, message + "\n")
-        log_text.see(tk.END)
+def is_gui_state_line(line):
+    return line in GUI_STATE_LINES or line.startswith("NACK_")
+
+def post_gui_event(kind, payload):
+    """Enfileira um evento para a thread do Tk. Pode ser chamado de qualquer thread."""
+    global gui_dropped_log_lines
+    try:
+        gui_events.put_nowait((kind, payload))
+    except queue.Full:
+        if kind == "rx" and not is_gui_state_line(payload):
+            gui_dropped_log_lines += 1 # Linha apenas de log: descarta
+        elif threading.current_thread() is threading.main_thread():
+            # Só o Tk esvazia a fila: esperar aqui travaria a GUI (ex.: TX de um botão durante uma rajada de RX)
+            log_message(f"Enviado: {payload}" if kind == "tx" else str(payload))
+        else:
+            gui_events.put((kind, payload)) # Eventos de estado da thread de leitura nunca são descartados: aguarda o Tk
+
+def on_serial_traffic(direction, line):
+    """Assinante do cliente (thread de leitura): apenas enfileira, sem tocar no Tk."""
+    post_gui_event("rx" if direction == RX else "tx", line)
+
+def on_connection_lost(exc):
+    post_gui_event("connection_lost", exc)
+
+def on_binary_protocol_negotiated(future):
+    if future.cancelled() or future.exception() is not None:
+        post_gui_event("log", "Firmware sem suporte ao protocolo binário: usando texto.")
+    else:
+        post_gui_event("log", "Protocolo binário ativo.")
+
+def drain_gui_events():
+    """Processa na thread do Tk, em lote, os eventos enfileirados e se reagenda via root.after."""
+    global gui_dropped_log_lines
+    pending_limit_switch_event = None
+    latest_records = {} # Tipo do registro -> último recebido no lote
+
+    def flush_records(): # Antes de cada linha de estado: um SCN/SEG anterior não sobrescreve o rótulo final
+        for record in latest_records.values():
+            gui_dispatcher.dispatch(record)
+        latest_records.clear()
+
+    for _ in range(GUI_DRAIN_BATCH):
+        try:
+            kind, payload = gui_events.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "rx":
+            event = parse_event(payload)
+            if isinstance(event, GUI_RECORD_TYPES):
+                latest_records[type(event)] = event # Registros não vão para o log: só o último de cada tipo no lote
+                continue
+            log_message(f"Recebido da ESP32: {payload}", line=payload)
+            if payload in LIMIT_SWITCH_STATUS_LINES:
+                pending_limit_switch_event = event # Coalesce: só o último status do lote importa
+            elif is_gui_state_line(payload):
+                flush_records()
+                if pending_limit_switch_event:
+                    gui_dispatcher.dispatch(pending_limit_switch_event) # Preserva a ordem em relação a esta linha
+                    pending_limit_switch_event = None
+                gui_dispatcher.dispatch(event)
+        elif kind == "tx":
+            log_message(f"Enviado: {payload}")
+        elif kind == "log":
+            log_message(payload)
+        elif kind == "connection_lost":
+            log_message(f"Erro de leitura serial: {payload}")
+            disconnect_serial()
+        elif kind == "calibration_position":
+            record_calibration_point(*payload)
+        elif kind == "replay_done":
+            on_replay_done(payload)
+    if pending_limit_switch_event:
+        gui_dispatcher.dispatch(pending_limit_switch_event)
+    flush_records()
+    if gui_dropped_log_lines:
+        log_message(f"... {gui_dropped_log_lines} linhas de log descartadas (fila cheia)")
+        gui_dropped_log_lines = 0
+    render_log_view() # Um único insert/see por lote
+
+    # Fila ainda com eventos: volta logo; caso contrário, aguarda o próximo período
+    root.after(1 if not gui_events.empty() else GUI_DRAIN_INTERVAL_MS, drain_gui_events)
+
+def update_position_label(telemetry):
+    state = MOTOR_STATES.get(telemetry.state, str(telemetry.state)).replace("STATE_", "")
+    position_label.config(text=f"Posição: {telemetry.position_steps * DEGREES_PER_PULSE % 360:.2f}° "
+                               f"({telemetry.position_steps} passos) | Restam: {telemetry.remaining_pulses} | {state}")
+
+def update_position_record_label(position):
+    reference = "HOME" if position.referenced else "sem HOME"
+    position_label.config(text=f"Posição: {position.degrees:.2f}° ({position.position_steps} passos) | {reference}")
+
+def update_scan_label(point):
+    scan_status_label.config(text=f"Varredura: passada {point.pass_number}, ponto {point.index} "
+                                  f"({point.position_steps * DEGREES_PER_PULSE:.2f}°)", foreground="orange")
+
+def update_program_label(segment_done):
+    if not program_running: # SEG atrasado (ex.: fila cheia): não desfaz o "concluído"/"interrompido"
+        return
+    program_status_label.config(text=f"Programa: segmento {segment_done.index + 1} de {program_segment_count} "
+                                     f"({segment_done.position_steps * DEGREES_PER_PULSE:.2f}°)", foreground="orange")
+
+def update_diagnostics_labels(stats=None):
+    """Redesenha o painel de diagnóstico; `stats` é o FirmwareStats recém-recebido, se houver."""
+    if client is None:
+        return
+    metrics = client.metrics
+    top_commands = list(metrics.latency_summary(0.95).items())[:DIAGNOSTICS_TOP_COMMANDS]
+    latencies = ", ".join(f"{name} {quantile * 1000:.0f} ms" if quantile != float("inf") else f"{name} >60 s"
+                          for name, (_, quantile) in top_commands)
+    diagnostics_host_label.config(text=f"Host: RX {metrics.bytes_received} B ({metrics.lines_received} linhas) | "
+                                       f"TX {metrics.bytes_sent} B | pendentes {client.pending_count} | "
+                                       f"fila GUI {gui_events.qsize()}\nLatência p95: {latencies or '--'}")
+    if stats is not None:
+        mean_command_us = stats.command_total_us // stats.commands if stats.commands else 0
+        diagnostics_firmware_label.config(
+            text=f"ESP32: loop {stats.loop_min_us}-{stats.loop_max_us} µs | "
+                 f"jitter passo {stats.step_jitter_max_us} µs\n"
+                 f"{stats.commands} comandos (média {mean_command_us} µs, máx {stats.command_max_us} µs) | "
+                 f"RX {stats.rx_bytes} B | TX {stats.tx_bytes} B")
+
+def refresh_diagnostics():
+    """Pede STATS à ESP32; o painel do firmware é atualizado quando o registro chega."""
+    update_diagnostics_labels()
+    send_command("query_stats")
+
+def export_metrics():
+    if client is None:
+        messagebox.showwarning("Aviso", "Não conectado à porta serial.")
+        return
+    path = filedialog.asksaveasfilename(title="Exportar métricas", defaultextension=".prom",
+                                        filetypes=[("Prometheus", "*.prom *.txt"), ("Todos os arquivos", "*.*")])
+    if not path:
+        return
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(client.metrics.render_prometheus(client.firmware_stats))
+    except OSError as e:
+        messagebox.showerror("Erro", f"Não foi possível gravar as métricas:\n{e}")
+        return
+    log_message(f"Métricas exportadas para {path}.")
+
+def on_limit_switch_active(event):
+    limit_switch_status_label.config(text="FIM DE CURSO ATIVO!", foreground="red", font=("Arial", 12, "bold"))
+
+def on_limit_switch_reset(event):
+    limit_switch_status_label.config(text="Fim de Curso: OK", foreground="green", font=("Arial", 10))
+
+def on_motion_finished(event): # ACK_PARADO ou ACK_ANGULO_CONCLUIDO
+    global program_running
+    if program_running: # PARAR aborta o programa sem ACK_PROG_CONCLUIDO
+        program_running = False
+        program_status_label.config(text="Programa: interrompido", foreground="red")
+    limit_switch_status_label.config(text="Fim de Curso: OK", foreground="green", font=("Arial", 10)) # Reset visual
+    home_button.config(state=tk.NORMAL) # Habilita o botão de homing se o motor parou
+    enable_angle_controls_after_move() # Habilita os controles angulares após movimento
+
+def on_scan_started(event):
+    scan_status_label.config(text="Varredura: em andamento...", foreground="orange")
+    home_button.config(state=tk.DISABLED)
+    disable_angle_controls() # A ESP32 executa a varredura sozinha: sem comandos de movimento até o fim
+
+def on_scan_finished(event):
+    scan_status_label.config(text="Varredura: concluída", foreground="green")
+    home_button.config(state=tk.NORMAL)
+    enable_angle_controls_after_move()
+
+def on_program_started(event):
+    global program_running
+    program_running = True
+    program_status_label.config(text=f"Programa: {program_segment_count} segmentos em execução...", foreground="orange")
+    home_button.config(state=tk.DISABLED)
+    disable_angle_controls()
+
+def on_program_finished(event):
+    global program_running
+    program_running = False
+    program_status_label.config(text="Programa: concluído", foreground="green")
+    home_button.config(state=tk.NORMAL)
+    enable_angle_controls_after_move()
+
+def on_homing_started(event):
+    homed_status_label.config(text="Homing: Em Andamento...", foreground="orange")
+    home_button.config(state=tk.DISABLED) # Desabilita o botão de homing durante o processo
+    disable_angle_controls() # Desabilita TODOS os controles de ângulo (incluindo direção) durante homing
+
+def on_homing_finished(event):
+    homed_status_label.config(text="Homing: CONCLUÍDO!", foreground="green", font=("Arial", 10, "bold"))
+    home_button.config(state=tk.NORMAL) # Habilita o botão novamente
+    enable_angle_controls() # Reabilita os controles de ângulo após homing
+
+def on_not_homed(event):
+    homed_status_label.config(text="Homing: NÃO CALIBRADO", foreground="red", font=("Arial", 10))
+    home_button.config(state=tk.NORMAL) # Habilita o botão home
+    enable_angle_controls() # HABILITA CONTROLES DE ÂNGULO MESMO SEM HOMING
+
+def update_homing_report_label(report):
+    degrees = report.delta_steps * DEGREES_PER_PULSE
+    homing_report_label.config(text=f"Repetibilidade: {report.delta_steps:+d} passos ({degrees:+.3f}°)")
+    log_message(f"Homing: sensor em {report.fast_trip_steps} (rápida) e {report.slow_trip_steps} (lenta).")
+
+def on_homing_failed(event): # NACK_HOMING_FAILED_INTERRUPTED
+    limit_switch_status_label.config(text="Fim de Curso: OK", foreground="green", font=("Arial", 10))
+    home_button.config(state=tk.NORMAL) # Habilita o botão home
+    homed_status_label.config(text="Homing: ERRO!", foreground="red") # Indica erro no homing
+    enable_angle_controls() # HABILITA CONTROLES DE ÂNGULO MESMO COM ERRO DE HOMING
+
+def on_nack(event): # NACKs sem assinante específico (ex.: HOME recusado por motor desabilitado)
+    if event.token in GUI_EVENT_HANDLERS:
+        return
+    # Comando recusado: devolve os controles desabilitados no envio, salvo com SCAN/programa/homing em andamento
+    if str(home_button.cget("state")) != tk.DISABLED:
+        enable_angle_controls_after_move()
+
+def on_calibration_complete(event): # Recebido quando a ESP32 termina o cálculo
+    status_label_calibration.config(text="Calibração Concluída!", foreground="green", font=("Arial", 10, "bold"))
+    messagebox.showinfo("Calibração", "Calibração concluída! A correção foi aplicada e gravada no motor.")
+    cal_start_button.config(state=tk.NORMAL) # Reabilita iniciar nova calibração
+    cal_submit_button.config(state=tk.DISABLED) # Desabilita o botão Calcular/Enviar
+    cal_move_button.config(state=tk.DISABLED) # Desabilita mover durante o movimento
+    cal_submit_current_point_button.config(state=tk.DISABLED) # Desabilita o botão de registrar ponto
+    enable_angle_controls() # Reabilita os controles de ângulo se o motor está habilitado
+
+def on_calibration_factor_zero(event): # Erro de fator zero na calibração
+    status_label_calibration.config(text="Calibração falhou: Fator Zero!", foreground="red", font=("Arial", 10, "bold"))
+    messagebox.showerror("Erro de Calibração", "Fator de calibração resultou em zero. Refaça a calibração com medições mais variadas.")
+    cal_start_button.config(state=tk.NORMAL)
+    cal_submit_button.config(state=tk.DISABLED)
+    cal_submit_current_point_button.config(state=tk.DISABLED)
+    enable_angle_controls()
+
+def on_calibration_reset(event): # Calibração zerada
+    status_label_calibration.config(text="Calibração Zerada!", foreground="red", font=("Arial", 10, "bold"))
+    messagebox.showinfo("Calibração", "A calibração foi zerada para os valores padrão.")
+    cal_start_button.config(state=tk.NORMAL)
+    cal_submit_button.config(state=tk.DISABLED)
+    cal_submit_current_point_button.config(state=tk.DISABLED)
+    enable_angle_controls() # Habilita controles de ângulo
+
+# Token ou tipo de evento -> atualização da GUI (sempre na thread do Tk, via drain_gui_events)
+GUI_EVENT_HANDLERS = {
+    "WARNING_LIMIT_SWITCH_ACTIVE": on_limit_switch_active,
+    "WARNING_LIMIT_SWITCH_HIT": on_limit_switch_active,
+    "ACK_LIMIT_SWITCH_RESET": on_limit_switch_reset,
+    "ACK_PARADO": on_motion_finished,
+    "ACK_ANGULO_CONCLUIDO": on_motion_finished,
+    "ACK_SCAN_INICIADO": on_scan_started,
+    "ACK_SCAN_CONCLUIDO": on_scan_finished,
+    "ACK_PROG_INICIADO": on_program_started,
+    "ACK_PROG_CONCLUIDO": on_program_finished,
+    "ACK_HOMING_STARTED": on_homing_started,
+    "ACK_HOMING_CONCLUIDO": on_homing_finished,
+    "ACK_NOT_HOMED": on_not_homed,
+    "NACK_HOMING_FAILED_INTERRUPTED": on_homing_failed,
+    "ACK_CALIBRATION_COMPLETE": on_calibration_complete,
+    "NACK_CALIBRATION_FACTOR_ZERO": on_calibration_factor_zero,
+    "ACK_CALIBRATION_RESET": on_calibration_reset,
+    Nack: on_nack,
+    # Registros: drain_gui_events entrega apenas o último de cada tipo por lote
+    Telemetry: update_position_label,
+    Position: update_position_record_label,
+    ScanPoint: update_scan_label,
+    SegmentDone: update_program_label,
+    FirmwareStats: update_diagnostics_labels,
+    HomingReport: update_homing_report_label,
+}
+GUI_RECORD_TYPES = (Telemetry, Position, ScanPoint, SegmentDone, FirmwareStats, HomingReport)
+gui_dispatcher = EventDispatcher()
+for kind, handler in GUI_EVENT_HANDLERS.items():
+    gui_dispatcher.subscribe(kind, handler)
+
+def log_message(message, line=None):
+    """Adiciona uma mensagem ao log; o Text widget é atualizado em lote por render_log_view()."""
+    record = log_buffer.append(message, line)
+    if log_buffer.accepts(record):
+        log_render_pending.append(message)
+        if len(log_render_pending) > 2 * LOG_VIEW_LINES: # Só a cauda será desenhada
+            del log_render_pending[:-LOG_VIEW_LINES]
+
+def render_log_view():
+    """Desenha as mensagens pendentes e mantém no Text apenas as últimas LOG_VIEW_LINES linhas."""
+    if not log_text or not log_render_pending:
+        return
+    lines = log_render_pending[-LOG_VIEW_LINES:]
+    log_render_pending.clear()
+    log_text.insert(tk.END, "\n".join(lines) + "\n")
+    excess = int(log_text.index("end-1c").split(".")[0]) - 1 - LOG_VIEW_LINES
+    if excess > 0:
+        log_text.delete("1.0", f"{excess + 1}.0")
+    log_text.see(tk.END)
+
+def apply_log_filters():
+    """Aplica nível/prefixos escolhidos e redesenha a cauda a partir do buffer."""
+    hidden = [prefix for name, var in log_prefix_filter_vars.items() if var.get() for prefix in LOG_PREFIX_FILTERS[name]]
+    log_buffer.set_filter(min_level=LOG_LEVELS[log_level_combobox.get()], hidden_prefixes=hidden)
+    log_text.delete("1.0", tk.END)
+    log_render_pending[:] = log_buffer.tail(LOG_VIEW_LINES)
+    render_log_view()
+
+def toggle_log_spill():
+    if log_spill_var.get():
+        log_buffer.open_spill(LOG_SPILL_PATH)
+        log_message(f"Gravando log completo em {LOG_SPILL_PATH}")
+    else:
+        log_buffer.close_spill()
+        log_message("Gravação do log em arquivo encerrada.")
 
 # --- Funções de Controle do Motor ---
 
@@ -154,9 +527,9 @@ def log_message(message):
 def toggle_motor_power():
     global motor_power_state
     if motor_power_state: # Se está ligado, vai desligar
-        send_command("DESABILITAR")
+        send_command("disable")
     else: # Se está desligado, vai ligar
-        send_command("HABILITAR")
+        send_command("enable")
     motor_power_state = not motor_power_state # Inverte o estado
     update_power_button() # Atualiza o texto do botão
 
@@ -170,13 +543,33 @@ def update_power_button():
         disable_angle_controls() # Desabilita TODOS os controles de ângulo se o driver está OFF
 
 def stop_motor(): # Apenas envia o comando PARAR
-    send_command("PARAR")
+    send_command("stop")
 
 def set_direction_forward():
-    send_command("DIR FRENTE")
+    send_command("set_direction", True)
 
 def set_direction_reverse():
-    send_command("DIR RE")
+    send_command("set_direction", False)
+
+# Move até o ângulo absoluto inserido (0 = posição do HOME), pelo caminho mais curto
+def move_to_entered_angle():
+    try:
+        degrees = float(angle_entry.get())
+        frequency_hz = int(angle_frequency_slider.get())
+
+        if degrees < 0 or degrees > 360:
+            messagebox.showwarning("Aviso", "O ângulo deve estar entre 0 e 360 graus.")
+            return
+
+        if not motor_power_state:
+             messagebox.showwarning("Aviso", "Habilite o motor primeiro!")
+             return
+
+        send_command("move_to", degrees, frequency_hz)
+        log_message(f"Comando: MOVER_PARA {degrees} {frequency_hz} enviado.")
+
+    except ValueError:
+        messagebox.showerror("Erro", "Por favor, insira um número válido para o ângulo ou a frequência.")
 
 # Função para mover por um ângulo inserido (AGORA COM FREQUÊNCIA AJUSTÁVEL)
 def move_by_entered_angle():
@@ -193,12 +586,87 @@ def move_by_entered_angle():
              return
         
         # Formato do comando: "MOVER ANGULO <graus> <frequencia_hz>"
-        send_command(f"MOVER ANGULO {degrees} {frequency_hz}")
+        send_command("move", degrees, frequency_hz)
         log_message(f"Comando: MOVER ANGULO {degrees} {frequency_hz} enviado.")
         
     except ValueError:
         messagebox.showerror("Erro", "Por favor, insira um número válido para o ângulo ou a frequência.")
 
+# SCAN (uma passada) ou VARREDURA contínua, executados pelo firmware; PARAR aborta
+def start_scan(continuous=False):
+    try:
+        start_degrees = float(scan_start_entry.get())
+        end_degrees = float(scan_end_entry.get())
+        step_degrees = float(scan_step_entry.get())
+        dwell_ms = int(scan_dwell_entry.get())
+        frequency_hz = int(angle_frequency_slider.get()) # Mesma frequência do movimento por ângulo
+    except ValueError:
+        messagebox.showerror("Erro", "Por favor, insira números válidos para a varredura.")
+        return
+    if not (0 <= start_degrees <= 360 and 0 <= end_degrees <= 360) or step_degrees <= 0 or dwell_ms < 0:
+        messagebox.showwarning("Aviso", "Os ângulos devem estar entre 0 e 360 graus, com passo positivo.")
+        return
+    if not motor_power_state:
+        messagebox.showwarning("Aviso", "Habilite o motor primeiro!")
+        return
+    send_command("sweep" if continuous else "scan", start_degrees, end_degrees, step_degrees, dwell_ms, frequency_hz)
+
+# Programa de movimento (CSV/JSON) executado pela fila da ESP32; PARAR aborta
+def run_program_file():
+    global program_segment_count
+    if not motor_power_state:
+        messagebox.showwarning("Aviso", "Habilite o motor primeiro!")
+        return
+    path = filedialog.askopenfilename(title="Programa de movimento",
+                                      filetypes=[("Programas", "*.csv *.json"), ("Todos os arquivos", "*.*")])
+    if not path:
+        return
+    try:
+        segments = load_program(path)
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Erro", f"Não foi possível carregar o programa:\n{e}")
+        return
+    program_segment_count = len(segments)
+    log_message(f"Programa {path}: {len(segments)} segmentos.")
+    send_command("run_program", segments)
+
+# Configura a rampa (perfil, velocidade máxima, aceleração e jerk) usada nos próximos movimentos
+def apply_ramp():
+    try:
+        max_speed_hz = int(ramp_max_speed_entry.get())
+        acceleration = float(ramp_acceleration_entry.get())
+        jerk = float(ramp_jerk_entry.get())
+    except ValueError:
+        messagebox.showerror("Erro", "Por favor, insira números válidos para a rampa.")
+        return
+    if not 1 <= max_speed_hz <= MAX_STEP_FREQUENCY_HZ or acceleration <= 0 or jerk <= 0:
+        messagebox.showwarning("Aviso", f"A velocidade máxima deve estar entre 1 e {MAX_STEP_FREQUENCY_HZ} Hz "
+                                        "e a aceleração e o jerk devem ser positivos.")
+        return
+    send_command("set_ramp", ramp_profile_combobox.get(), max_speed_hz, acceleration, jerk)
+    angle_frequency_slider.config(to=max_speed_hz) # O firmware limita MOVER ANGULO à velocidade máxima
+    if angle_frequency_slider.get() > max_speed_hz:
+        angle_frequency_slider.set(max_speed_hz)
+
+# Velocidades e recuos do homing em duas passadas (velocidade lenta 0 = uma passada)
+def apply_homing():
+    try:
+        fast_hz = int(homing_fast_entry.get())
+        slow_hz = int(homing_slow_entry.get())
+        backoff_degrees = float(homing_backoff_entry.get())
+        final_backoff_degrees = float(homing_final_backoff_entry.get())
+    except ValueError:
+        messagebox.showerror("Erro", "Por favor, insira números válidos para o homing.")
+        return
+    if (not 1 <= fast_hz <= MAX_STEP_FREQUENCY_HZ or not 0 <= slow_hz <= fast_hz
+            or not 0 < backoff_degrees <= HOMING_MAX_BACKOFF_DEGREES
+            or not 0 < final_backoff_degrees <= HOMING_MAX_BACKOFF_DEGREES):
+        messagebox.showwarning("Aviso", f"A velocidade rápida deve estar entre 1 e {MAX_STEP_FREQUENCY_HZ} Hz, "
+                                        "a lenta entre 0 e a rápida, e os recuos entre 0 e "
+                                        f"{HOMING_MAX_BACKOFF_DEGREES:g} graus.")
+        return
+    send_command("configure_homing", fast_hz, slow_hz, backoff_degrees, final_backoff_degrees)
+
 # REINTRODUZIDO: Função go_home() (Homing agora é opcional e chamado por este botão)
 def go_home():
     if not motor_power_state:
@@ -206,7 +674,7 @@ def go_home():
         return
     # Desabilita controles de movimento durante o homing
     disable_angle_controls() 
-    send_command("HOME")
+    send_command("home")
     log_message("Comando: HOME enviado.")
 
 
@@ -217,6 +685,13 @@ def start_calibration_sequence(): # Inicia a sequência de calibração
         return
 
     # A verificação de motor parado antes da calibração é feita no firmware
+    try:
+        point_count = int(calibration_points_entry.get())
+    except ValueError:
+        point_count = 0
+    if not 2 <= point_count <= CALIBRATION_MAX_GUI_POINTS:
+        messagebox.showerror("Erro de Calibração", f"Use de 2 a {CALIBRATION_MAX_GUI_POINTS} pontos.")
+        return
     
     calibration_step = 0
     calibration_theoretical_inputs = [] # Limpa antes de preencher
@@ -227,20 +702,22 @@ def start_calibration_sequence(): # Inicia a sequência de calibração
     for widget in calibration_entries_frame.winfo_children():
         widget.destroy()
 
-    ttk.Label(calibration_entries_frame, text="Ponto").grid(row=0, column=0, padx=5, pady=5)
-    ttk.Label(calibration_entries_frame, text="Teórico (°)").grid(row=0, column=1, padx=5, pady=5)
-    ttk.Label(calibration_entries_frame, text="Medido (°)").grid(row=0, column=2, padx=5, pady=5)
+    for base in range(0, (point_count - 1) // CALIBRATION_ROWS_PER_COLUMN * 3 + 1, 3): # Cabeçalho de cada coluna
+        ttk.Label(calibration_entries_frame, text="Ponto").grid(row=0, column=base, padx=5, pady=5)
+        ttk.Label(calibration_entries_frame, text="Teórico (°)").grid(row=0, column=base + 1, padx=5, pady=5)
+        ttk.Label(calibration_entries_frame, text="Medido (°)").grid(row=0, column=base + 2, padx=5, pady=5)
     
-    for i in range(3): # Cria 3 pares de campos de entrada
-        ttk.Label(calibration_entries_frame, text=f"Ponto {i+1}").grid(row=i+1, column=0, padx=5, pady=2, sticky="w")
+    for i in range(point_count): # Um par de campos por ponto, em colunas de CALIBRATION_ROWS_PER_COLUMN
+        row, base = i % CALIBRATION_ROWS_PER_COLUMN + 1, i // CALIBRATION_ROWS_PER_COLUMN * 3
+        ttk.Label(calibration_entries_frame, text=f"Ponto {i+1}").grid(row=row, column=base, padx=5, pady=2, sticky="w")
         
         entry_theoretical = ttk.Entry(calibration_entries_frame, width=8)
-        entry_theoretical.grid(row=i+1, column=1, padx=5, pady=2, sticky="ew")
-        entry_theoretical.insert(0, str((i+1)*90.0)) # Sugestão de valores (90, 180, 270)
+        entry_theoretical.grid(row=row, column=base + 1, padx=5, pady=2, sticky="ew")
+        entry_theoretical.insert(0, f"{i * 360.0 / point_count:g}") # Sugestão: pontos igualmente espaçados na volta
         calibration_theoretical_inputs.append(entry_theoretical)
 
         entry_measured = ttk.Entry(calibration_entries_frame, width=8)
-        entry_measured.grid(row=i+1, column=2, padx=5, pady=2, sticky="ew")
+        entry_measured.grid(row=row, column=base + 2, padx=5, pady=2, sticky="ew")
         calibration_measured_inputs.append(entry_measured)
         # Inicialmente desabilita todos os campos medidos
         calibration_measured_inputs[i].config(state=tk.DISABLED) 
@@ -248,7 +725,7 @@ def start_calibration_sequence(): # Inicia a sequência de calibração
     # Configura o estado inicial dos botões da calibração
     status_label_calibration.config(text=f"Pronto para Ponto 1: Insira Teórico e MOVA.", foreground="blue")
     cal_move_button.config(text=f"MOVER PARA PONTO 1", state=tk.NORMAL) # Habilita o primeiro mover
-    cal_submit_button.config(text="CALCULAR CALIBRACAO", state=tk.DISABLED) # Desabilitado até 3 pontos serem enviados
+    cal_submit_button.config(text="CALCULAR CALIBRACAO", state=tk.DISABLED) # Desabilitado até registrar todos os pontos
     cal_submit_current_point_button.config(text="REGISTRAR MEDIÇÃO DO PONTO ATUAL", state=tk.DISABLED) # Habilitado após mover
     disable_angle_controls() # Desabilita controles normais durante calibração
     home_button.config(state=tk.DISABLED) # Desabilita home durante calibração
@@ -273,14 +750,12 @@ def disable_calibration_sequence(): # Função para desabilitar a calibração
 def reset_calibration_gui_and_send_command(): # Função para zerar a calibração
     response = messagebox.askyesno("Confirmar Reset", "Tem certeza que deseja zerar a calibração do motor? Isso redefinirá o fator para 1.0 e o motor para 'Não Calibrado'.")
     if response:
-        send_command("RESET_CALIB")
+        send_command("reset_calibration")
         log_message("Comando: RESET_CALIB enviado.")
         # A GUI será atualizada pelas mensagens de ACK do ESP32
 
 def submit_current_calibration_point(): # NOVO: Envia UM par (teórico, medido) para o ESP32 (apenas para registro na GUI)
-    global calibration_step, calibration_data_for_esp32
-    
-    if calibration_step < 3: # Garante que estamos dentro dos 3 pontos
+    if calibration_step < len(calibration_theoretical_inputs): # Garante que ainda há pontos a registrar
         try:
             theoretical_val = float(calibration_theoretical_inputs[calibration_step].get()) # Pega do campo correto
             measured_val = float(calibration_measured_inputs[calibration_step].get()) # Pega do campo correto
@@ -288,27 +763,14 @@ def submit_current_calibration_point(): # NOVO: Envia UM par (teórico, medido)
             if not (0 <= theoretical_val <= 360) or not (0 <= measured_val <= 360):
                 messagebox.showerror("Erro de Calibração", f"Valores do Ponto {calibration_step+1} fora do range (0-360).")
                 return
-            
-            # Acumula o par na lista local da GUI
-            calibration_data_for_esp32.append( (theoretical_val, measured_val) ) 
-
-            log_message(f"Ponto {calibration_step+1} registrado: Teórico={theoretical_val}°, Medido={measured_val}°")
-            
-            # Desabilita os campos do ponto atual após registrar
-            calibration_theoretical_inputs[calibration_step].config(state=tk.DISABLED)
-            calibration_measured_inputs[calibration_step].config(state=tk.DISABLED)
             cal_submit_current_point_button.config(state=tk.DISABLED) # Desabilita o botão de enviar este ponto
-
-            calibration_step += 1 # Avança para o próximo passo/ponto
-
-            if calibration_step < 3: # Se ainda faltam pontos a mover/registrar
-                cal_move_button.config(text=f"MOVER PARA PONTO {calibration_step+1}", state=tk.NORMAL)
-                status_label_calibration.config(text=f"Pronto para Ponto {calibration_step+1}: Insira Teórico e MOVA.", foreground="blue")
-            else: # Se os 3 pontos foram registrados na GUI
-                cal_move_button.config(text="TODOS OS PONTOS MOVIDOS", state=tk.DISABLED)
-                cal_submit_button.config(text="CALCULAR CALIBRACAO", state=tk.NORMAL) # Habilita o botão FINAL de CALCULAR CALIBRACAO
-                status_label_calibration.config(text="Todos os pontos coletados. Pressione 'CALCULAR CALIBRACAO'.", foreground="green")
-
+            point = (calibration_step, theoretical_val, measured_val)
+            if client is None or not client.is_connected:
+                record_calibration_point(point, None)
+                return
+            # O ajuste usa a posição real do motor (sem correção): POSICAO responde sem bloquear o Tk
+            future = client.query_position(timeout=CALIBRATION_POSITION_TIMEOUT_S)
+            future.add_done_callback(lambda future: on_calibration_position(point, future))
         except ValueError:
             messagebox.showerror("Erro", "Por favor, insira números válidos para a medição do ponto atual.")
         except Exception as e:
@@ -316,30 +778,87 @@ def submit_current_calibration_point(): # NOVO: Envia UM par (teórico, medido)
     else:
         messagebox.showwarning("Calibração", "Todos os pontos já foram registrados na GUI.")
 
+def on_calibration_position(point, future): # Thread de leitura (ou o timer do timeout): o registro fica com o Tk
+    if threading.current_thread() is threading.main_thread():
+        record_calibration_point(point, future) # POSICAO já havia respondido ao registrar o callback
+    else:
+        post_gui_event("calibration_position", (point, future))
 
-def submit_all_calibration_data_to_esp32(): # Envia TODOS os 3 pares para o ESP32 (chamado por CALCULAR CALIBRACAO)
-    if len(calibration_data_for_esp32) != 3:
-        messagebox.showerror("Erro de Calibração", "Dados insuficientes! Colete 3 pontos antes de calcular.")
+def record_calibration_point(point, future):
+    """Registra o ponto com a posição lida por POSICAO no lugar do teórico digitado (sem resposta, mantém o digitado)."""
+    global calibration_step, calibration_data_for_esp32
+    step, theoretical_val, measured_val = point
+    if step != calibration_step: # Calibração reiniciada enquanto POSICAO não respondia
         return
+    position = None
+    if future is not None:
+        try:
+            future.result()
+            position = client.position if client else None
+        except (RadarCommandError, ConnectionError, TimeoutError, FutureTimeoutError) as e:
+            log_message(f"POSICAO sem resposta: {e}")
+    if position is None:
+        log_message(f"Ponto {step+1}: posição do motor indisponível, usando o teórico digitado ({theoretical_val}°).")
+    else:
+        motor_val = round(position.position_steps * DEGREES_PER_PULSE % 360, 4)
+        if motor_val != theoretical_val:
+            log_message(f"Ponto {step+1}: teórico digitado {theoretical_val}° substituído pela "
+                        f"posição do motor, {motor_val}° ({position.position_steps} passos).")
+        theoretical_val = motor_val
+    calibration_data_for_esp32.append( (theoretical_val, measured_val) ) # Acumula o par na lista local da GUI
+    log_message(f"Ponto {step+1} registrado: Teórico={theoretical_val}°, Medido={measured_val}°")
+
+    # Desabilita os campos do ponto atual após registrar
+    calibration_theoretical_inputs[step].config(state=tk.DISABLED)
+    calibration_measured_inputs[step].config(state=tk.DISABLED)
+
+    calibration_step += 1 # Avança para o próximo passo/ponto
+
+    if calibration_step < len(calibration_theoretical_inputs): # Se ainda faltam pontos a mover/registrar
+        cal_move_button.config(text=f"MOVER PARA PONTO {calibration_step+1}", state=tk.NORMAL)
+        status_label_calibration.config(text=f"Pronto para Ponto {calibration_step+1}: Insira Teórico e MOVA.", foreground="blue")
+    else: # Se todos os pontos foram registrados na GUI
+        cal_move_button.config(text="TODOS OS PONTOS MOVIDOS", state=tk.DISABLED)
+        cal_submit_button.config(text="CALCULAR CALIBRACAO", state=tk.NORMAL) # Habilita o botão FINAL de CALCULAR CALIBRACAO
+        status_label_calibration.config(text="Todos os pontos coletados. Pressione 'CALCULAR CALIBRACAO'.", foreground="green")
+
+
+def submit_all_calibration_data_to_esp32(): # Ajusta o modelo escolhido e o envia (botão CALCULAR CALIBRACAO)
+    point_count = len(calibration_data_for_esp32)
+    if point_count < 2 or point_count != len(calibration_theoretical_inputs):
+        messagebox.showerror("Erro de Calibração", "Dados insuficientes! Registre todos os pontos antes de calcular.")
+        return
+    points = [CalibrationPoint(theoretical, measured) for theoretical, measured in calibration_data_for_esp32]
+    method = CALIBRATION_MODELS[calibration_model_combobox.get()]
 
-    calibration_data_string = "CALIBRAR "
-    for i, (theoretical, measured) in enumerate(calibration_data_for_esp32):
-        # Formato: teorico,medido;
-        calibration_data_string += f"{theoretical},{measured}"
-        if i < 2: # Adiciona o ponto e vírgula entre os pares, mas não depois do último
-            calibration_data_string += ";"
-    
-    send_command(calibration_data_string)
-    log_message(f"Comando de CALIBRACAO com 3 pontos enviado para o ESP32: {calibration_data_string}")
+    try:
+        if method is None: # Fator/offset calculados no firmware; aqui só os resíduos para o log
+            if point_count > CALIBRATION_MAX_POINTS:
+                raise ValueError(f"A calibração linear aceita até {CALIBRATION_MAX_POINTS} pontos; use uma tabela.")
+            residuals = fit_linear(points).residuals
+        else:
+            table = fit_table(points, method=method)
+            residuals = table.residuals
+    except ValueError as e:
+        messagebox.showerror("Erro de Calibração", str(e))
+        return
+    stats = residual_stats(residuals)
+    if method is None:
+        # Formato: "CALIBRAR teorico,medido;teorico,medido;..." (montado pelo cliente)
+        send_command("calibrate", calibration_data_for_esp32)
+    else:
+        send_command("upload_calibration_table", table.corrections)
+    log_message(f"Calibração {calibration_model_combobox.get()} com {point_count} pontos enviada para o ESP32: "
+                f"resíduo RMS {stats.rms:.3f}°, máximo {stats.max_abs:.3f}°")
     
     cal_submit_button.config(state=tk.DISABLED) # Desabilita o botão de calcular/enviar
-    status_label_calibration.config(text="Calculando calibração no motor...", foreground="blue")
+    status_label_calibration.config(text=f"Aplicando (resíduo máx. {stats.max_abs:.3f}°)...", foreground="blue")
 
 
 def trigger_calibration_move(): # Move o motor para o ponto teórico do passo atual
     global calibration_step
     
-    if calibration_step < 3: # Limita a 3 movimentos para os 3 pontos
+    if calibration_step < len(calibration_theoretical_inputs): # Um movimento por ponto
         try:
             angle_to_move = float(calibration_theoretical_inputs[calibration_step].get())
             
@@ -351,8 +870,8 @@ def trigger_calibration_move(): # Move o motor para o ponto teórico do passo at
             calibration_measured_inputs[calibration_step].config(state=tk.NORMAL)
             calibration_measured_inputs[calibration_step].focus_set() # Coloca foco no campo
             
-            # Envia o comando para mover o motor para o ângulo teórico, com frequência padrão
-            send_command(f"MOVER ANGULO {angle_to_move} 50") # Frequência padrão 50Hz para calibração
+            # Move para o ângulo teórico absoluto (a partir do HOME), com frequência padrão
+            send_command("move_to", angle_to_move, 50) # Frequência padrão 50Hz para calibração
             status_label_calibration.config(text=f"Movendo para {angle_to_move}°. Meça e insira o valor real.", foreground="blue")
             cal_move_button.config(state=tk.DISABLED) # Desabilita mover durante o movimento
             # O botão de registrar medição será habilitado após o ACK do ESP32 (ACK_ANGULO_CONCLUIDO)
@@ -380,6 +899,7 @@ def disable_controls():
     dir_rev_button.config(state=tk.DISABLED)
     angle_entry.config(state=tk.DISABLED)
     move_angle_button.config(state=tk.DISABLED)
+    move_to_button.config(state=tk.DISABLED)
     angle_frequency_slider.config(state=tk.DISABLED)
     home_button.config(state=tk.DISABLED) # REINTRODUZIDO
     
@@ -413,6 +933,7 @@ def disable_angle_controls():
     dir_rev_button.config(state=tk.DISABLED)
     angle_entry.config(state=tk.DISABLED)
     move_angle_button.config(state=tk.DISABLED)
+    move_to_button.config(state=tk.DISABLED)
     angle_frequency_slider.config(state=tk.DISABLED)
 
 def enable_angle_controls():
@@ -423,6 +944,7 @@ def enable_angle_controls():
         dir_rev_button.config(state=tk.NORMAL)
         angle_entry.config(state=tk.NORMAL)
         move_angle_button.config(state=tk.NORMAL)
+        move_to_button.config(state=tk.NORMAL)
         angle_frequency_slider.config(state=tk.NORMAL)
 
 def enable_angle_controls_after_move(): # Chamado após movimento normal parar (ACK_ANGULO_CONCLUIDO ou ACK_PARADO)
@@ -463,11 +985,18 @@ def set_angle_frequency_from_slider(label_widget):
 def create_gui():
     # Declara todas as variáveis globais de widgets no início de create_gui()
     # Isso garante que elas sejam acessíveis de outras funções após a criação.
-    global root, log_text, port_combobox, connect_button, disconnect_button, status_label
+    global root, log_text, port_combobox, connect_button, disconnect_button, status_label, replay_button
     global motor_power_button, stop_button, dir_fwd_button, dir_rev_button
-    global angle_entry, move_angle_button, angle_frequency_slider, angle_frequency_label
+    global angle_entry, move_angle_button, move_to_button, angle_frequency_slider, angle_frequency_label
+    global ramp_profile_combobox, ramp_max_speed_entry, ramp_acceleration_entry, ramp_jerk_entry
+    global scan_start_entry, scan_end_entry, scan_step_entry, scan_dwell_entry, scan_status_label, program_status_label
     global limit_switch_status_label, homed_status_label, home_button # REINTRODUZIDO: homed_status_label e home_button
+    global homing_fast_entry, homing_slow_entry, homing_backoff_entry, homing_final_backoff_entry, homing_report_label
+    global position_label
     global cal_start_button, cal_move_button, cal_submit_button, status_label_calibration, calibration_entries_frame, cal_disable_button, cal_reset_button, cal_submit_current_point_button
+    global calibration_points_entry, calibration_model_combobox
+    global log_level_combobox, log_spill_var, binary_protocol_var, session_record_var
+    global diagnostics_host_label, diagnostics_firmware_label
 
     root = tk.Tk()
     root.title("Controle de Motor de Passo ESP32")
@@ -513,8 +1042,15 @@ def create_gui():
     disconnect_button = ttk.Button(conn_frame, text="Desconectar", command=disconnect_serial, state=tk.DISABLED)
     disconnect_button.grid(row=0, column=3, padx=5, pady=5)
 
+    binary_protocol_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(conn_frame, text="Protocolo binário", variable=binary_protocol_var).grid(row=1, column=0, columnspan=2, padx=5, sticky="w")
+    session_record_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(conn_frame, text="Gravar sessão", variable=session_record_var, command=toggle_session_recording).grid(row=1, column=2, padx=5, sticky="w")
+    replay_button = ttk.Button(conn_frame, text="REPRODUZIR SESSÃO", command=toggle_session_replay)
+    replay_button.grid(row=1, column=3, padx=5, pady=5)
+
     status_label = ttk.Label(conn_frame, text="Desconectado", foreground="red")
-    status_label.grid(row=1, column=0, columnspan=4, pady=5)
+    status_label.grid(row=2, column=0, columnspan=4, pady=5)
 
     populate_ports()
 
@@ -544,6 +1080,30 @@ def create_gui():
     home_button = ttk.Button(general_control_frame, text="IR PARA PONTO ZERO", command=go_home, style="TButton") # REINTRODUZIDO
     home_button.grid(row=1, column=3, padx=5, pady=5, sticky="ew") 
 
+    position_label = ttk.Label(general_control_frame, text="Posição: --", font=("Arial", 10))
+    position_label.grid(row=4, column=0, columnspan=4, padx=5, pady=5, sticky="w")
+
+    # Homing em duas passadas (comando HOMING)
+    ttk.Label(general_control_frame, text="Homing rápida (Hz):").grid(row=5, column=0, padx=5, pady=5, sticky="w")
+    homing_fast_entry = ttk.Entry(general_control_frame, width=8)
+    homing_fast_entry.grid(row=5, column=1, padx=5, pady=5, sticky="ew")
+    homing_fast_entry.insert(0, "800")
+    ttk.Label(general_control_frame, text="Lenta (Hz):").grid(row=5, column=2, padx=5, pady=5, sticky="w")
+    homing_slow_entry = ttk.Entry(general_control_frame, width=8)
+    homing_slow_entry.grid(row=5, column=3, padx=5, pady=5, sticky="ew")
+    homing_slow_entry.insert(0, "100")
+    ttk.Label(general_control_frame, text="Recuo (°):").grid(row=6, column=0, padx=5, pady=5, sticky="w")
+    homing_backoff_entry = ttk.Entry(general_control_frame, width=8)
+    homing_backoff_entry.grid(row=6, column=1, padx=5, pady=5, sticky="ew")
+    homing_backoff_entry.insert(0, "5.0")
+    ttk.Label(general_control_frame, text="Recuo final (°):").grid(row=6, column=2, padx=5, pady=5, sticky="w")
+    homing_final_backoff_entry = ttk.Entry(general_control_frame, width=8)
+    homing_final_backoff_entry.grid(row=6, column=3, padx=5, pady=5, sticky="ew")
+    homing_final_backoff_entry.insert(0, "2.0")
+    ttk.Button(general_control_frame, text="APLICAR HOMING", command=apply_homing).grid(row=7, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
+    homing_report_label = ttk.Label(general_control_frame, text="Repetibilidade: --", font=("Arial", 10))
+    homing_report_label.grid(row=8, column=0, columnspan=4, padx=5, pady=5, sticky="w")
+
     # Frame para Controle por Ângulo
     angle_control_frame = ttk.LabelFrame(col0_frame, text="Controle por Ângulo (0-360 Graus)", padding=10)
     angle_control_frame.grid(row=2, column=0, sticky="nsew", pady=5) 
@@ -555,7 +1115,7 @@ def create_gui():
     angle_entry.insert(0, "90.0") 
 
     ttk.Label(angle_control_frame, text="Frequência (Hz):").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-    angle_frequency_slider = ttk.Scale(angle_control_frame, from_=1, to=200, orient="horizontal", command=lambda val: set_angle_frequency_from_slider(angle_frequency_label))
+    angle_frequency_slider = ttk.Scale(angle_control_frame, from_=1, to=DEFAULT_MAX_SPEED_HZ, orient="horizontal", command=lambda val: set_angle_frequency_from_slider(angle_frequency_label))
     angle_frequency_slider.set(50) 
     angle_frequency_slider.grid(row=2, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
 
@@ -564,12 +1124,60 @@ def create_gui():
     
     move_angle_button = ttk.Button(angle_control_frame, text="MOVER ÂNGULO", command=move_by_entered_angle, style="TButton")
     move_angle_button.grid(row=0, column=2, columnspan=2, padx=5, pady=5, sticky="ew")
+    move_to_button = ttk.Button(angle_control_frame, text="IR PARA ÂNGULO (ABS)", command=move_to_entered_angle, style="TButton")
+    move_to_button.grid(row=1, column=2, columnspan=2, padx=5, pady=5, sticky="ew")
+
+    # Rampa de aceleração/desaceleração (comando RAMPA)
+    ttk.Label(angle_control_frame, text="Rampa:").grid(row=4, column=0, padx=5, pady=5, sticky="w")
+    ramp_profile_combobox = ttk.Combobox(angle_control_frame, values=RAMP_PROFILES, state="readonly", width=12)
+    ramp_profile_combobox.set(RAMP_TRAPEZOIDAL)
+    ramp_profile_combobox.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
+    ttk.Label(angle_control_frame, text="Vel. máx (Hz):").grid(row=4, column=2, padx=5, pady=5, sticky="w")
+    ramp_max_speed_entry = ttk.Entry(angle_control_frame, width=8)
+    ramp_max_speed_entry.grid(row=4, column=3, padx=5, pady=5, sticky="ew")
+    ramp_max_speed_entry.insert(0, str(DEFAULT_MAX_SPEED_HZ))
+
+    ttk.Label(angle_control_frame, text="Aceleração (passos/s²):").grid(row=5, column=0, padx=5, pady=5, sticky="w")
+    ramp_acceleration_entry = ttk.Entry(angle_control_frame, width=8)
+    ramp_acceleration_entry.grid(row=5, column=1, padx=5, pady=5, sticky="ew")
+    ramp_acceleration_entry.insert(0, "4000")
+    ttk.Label(angle_control_frame, text="Jerk (passos/s³):").grid(row=5, column=2, padx=5, pady=5, sticky="w")
+    ramp_jerk_entry = ttk.Entry(angle_control_frame, width=8)
+    ramp_jerk_entry.grid(row=5, column=3, padx=5, pady=5, sticky="ew")
+    ramp_jerk_entry.insert(0, "40000")
+
+    ttk.Button(angle_control_frame, text="APLICAR RAMPA", command=apply_ramp).grid(row=6, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
+
+    # Frame para Varredura (SCAN / VARREDURA) e programas de movimento, executados pela ESP32
+    scan_frame = ttk.LabelFrame(col0_frame, text="Varredura e Programas", padding=10)
+    scan_frame.grid(row=3, column=0, sticky="ew", pady=5)
+
+    scan_entries = []
+    for column, (text, default) in enumerate((("Início (°):", "0"), ("Fim (°):", "90"), ("Passo (°):", "1"), ("Dwell (ms):", "100"))):
+        ttk.Label(scan_frame, text=text).grid(row=0, column=column, padx=5, pady=2, sticky="w")
+        entry = ttk.Entry(scan_frame, width=8)
+        entry.grid(row=1, column=column, padx=5, pady=2, sticky="ew")
+        entry.insert(0, default)
+        scan_entries.append(entry)
+    scan_start_entry, scan_end_entry, scan_step_entry, scan_dwell_entry = scan_entries
+
+    ttk.Button(scan_frame, text="INICIAR SCAN", command=start_scan).grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
+    ttk.Button(scan_frame, text="VARREDURA CONTÍNUA", command=lambda: start_scan(continuous=True)).grid(row=2, column=2, columnspan=2, padx=5, pady=5, sticky="ew")
+    ttk.Button(scan_frame, text="ABORTAR", command=stop_motor).grid(row=3, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
+
+    scan_status_label = ttk.Label(scan_frame, text="Varredura: --")
+    scan_status_label.grid(row=4, column=0, columnspan=4, padx=5, pady=5, sticky="w")
+
+    ttk.Button(scan_frame, text="EXECUTAR PROGRAMA (CSV/JSON)", command=run_program_file).grid(row=5, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
+    program_status_label = ttk.Label(scan_frame, text="Programa: --")
+    program_status_label.grid(row=6, column=0, columnspan=4, padx=5, pady=5, sticky="w")
 
     # --- Coluna 1: Calibração e Log ---
     col1_frame = ttk.Frame(main_content_frame, padding=5)
     col1_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
     col1_frame.grid_rowconfigure(0, weight=0) # Calibração (não expande)
     col1_frame.grid_rowconfigure(1, weight=1) # Log (expansível)
+    col1_frame.grid_rowconfigure(2, weight=0) # Diagnóstico (não expande)
 
     # Frame para Calibração
     calibration_frame = ttk.LabelFrame(col1_frame, text="Calibração do Motor", padding=10)
@@ -578,6 +1186,18 @@ def create_gui():
     status_label_calibration = ttk.Label(calibration_frame, text="Não Calibrado. Inicie a calibração.", foreground="red")
     status_label_calibration.pack(pady=5, fill="x") 
 
+    calibration_options_frame = ttk.Frame(calibration_frame)
+    calibration_options_frame.pack(pady=5, fill="x")
+    ttk.Label(calibration_options_frame, text="Pontos:").grid(row=0, column=0, padx=5, sticky="w")
+    calibration_points_entry = ttk.Entry(calibration_options_frame, width=5)
+    calibration_points_entry.grid(row=0, column=1, padx=5, sticky="w")
+    calibration_points_entry.insert(0, str(CALIBRATION_DEFAULT_POINTS))
+    ttk.Label(calibration_options_frame, text="Modelo:").grid(row=0, column=2, padx=5, sticky="w")
+    calibration_model_combobox = ttk.Combobox(
+        calibration_options_frame, values=list(CALIBRATION_MODELS), state="readonly", width=10)
+    calibration_model_combobox.grid(row=0, column=3, padx=5, sticky="w")
+    calibration_model_combobox.set("Linear")
+
     cal_start_button = ttk.Button(calibration_frame, text="INICIAR CALIBRAÇÃO", command=start_calibration_sequence)
     cal_start_button.pack(pady=5, fill="x")
 
@@ -604,15 +1224,42 @@ def create_gui():
     log_frame.grid(row=1, column=0, sticky="nsew", pady=5) 
     col1_frame.grid_rowconfigure(1, weight=1) 
 
+    log_filter_frame = ttk.Frame(log_frame)
+    log_filter_frame.pack(side="top", fill="x", pady=(0, 5))
+    ttk.Label(log_filter_frame, text="Nível:").pack(side="left")
+    log_level_combobox = ttk.Combobox(log_filter_frame, values=list(LOG_LEVELS), width=9, state="readonly")
+    log_level_combobox.set("DEBUG")
+    log_level_combobox.bind("<<ComboboxSelected>>", lambda event: apply_log_filters())
+    log_level_combobox.pack(side="left", padx=5)
+    for name in LOG_PREFIX_FILTERS:
+        log_prefix_filter_vars[name] = tk.BooleanVar(value=False)
+        ttk.Checkbutton(log_filter_frame, text=f"Ocultar {name}", variable=log_prefix_filter_vars[name], command=apply_log_filters).pack(side="left", padx=2)
+    log_spill_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(log_filter_frame, text="Gravar em arquivo", variable=log_spill_var, command=toggle_log_spill).pack(side="right")
+
     log_text = tk.Text(log_frame, wrap="word", height=15) 
     log_text.pack(fill="both", expand=True)
     log_scrollbar = ttk.Scrollbar(log_frame, command=log_text.yview)
     log_scrollbar.pack(side="right", fill="y")
     log_text.config(yscrollcommand=log_scrollbar.set)
 
+    # Frame de Diagnóstico (métricas do host e comando STATS da ESP32)
+    diagnostics_frame = ttk.LabelFrame(col1_frame, text="Diagnóstico", padding=10)
+    diagnostics_frame.grid(row=2, column=0, sticky="ew", pady=5)
+    diagnostics_frame.grid_columnconfigure(0, weight=1)
+    diagnostics_frame.grid_columnconfigure(1, weight=1)
+
+    diagnostics_host_label = ttk.Label(diagnostics_frame, text="Host: --", justify="left")
+    diagnostics_host_label.grid(row=0, column=0, columnspan=2, padx=5, pady=2, sticky="w")
+    diagnostics_firmware_label = ttk.Label(diagnostics_frame, text="ESP32: --", justify="left")
+    diagnostics_firmware_label.grid(row=1, column=0, columnspan=2, padx=5, pady=2, sticky="w")
+    ttk.Button(diagnostics_frame, text="ATUALIZAR STATS", command=refresh_diagnostics).grid(row=2, column=0, padx=5, pady=5, sticky="ew")
+    ttk.Button(diagnostics_frame, text="EXPORTAR MÉTRICAS", command=export_metrics).grid(row=2, column=1, padx=5, pady=5, sticky="ew")
+
     disable_controls() 
 
-    root.mainloop()
+    root.after(GUI_DRAIN_INTERVAL_MS, drain_gui_events) # Única via de atualização da GUI pela thread de leitura
 
 if __name__ == "__main__":
-    create_gui()
\ No newline at end of file
+    create_gui()
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""Aquisição de medidas do radar sincronizada com a posição do motor, gravada em blocos NumPy mapeados em memória.
+
+    python radar_acquisition.py --port COM12 --scan 0 360 1 50 800 --sampler meu_radar:ler --out varredura1
+    python radar_acquisition.py --sim --scan 0 90 0.5 0 800 --out teste --sample-shape 256
+    python radar_acquisition.py --summary varredura1
+
+`Acquisition` assina os eventos do cliente que marcam o motor parado em um ponto conhecido: cada ponto de
+SCAN/VARREDURA (SCN, enviado antes do dwell), cada segmento de programa concluído (SEG) e cada MOVER ANGULO/
+MOVER_PARA concluído (ACK_ANGULO_CONCLUIDO, com a posição pedida por POSICAO). A thread de leitura apenas
+enfileira o gatilho; uma thread própria chama o amostrador (`sampler(trigger) -> amostra`) e grava o registro
+(instante, posição em passos, ângulo absoluto, ângulo calibrado, amostra) no `AcquisitionStore`.
+
+O `AcquisitionStore` é um diretório com arquivos .npy de ACQUISITION_CHUNK_RECORDS registros cada, abertos com
+`numpy.lib.format.open_memmap`: só o bloco atual fica mapeado, de modo que varreduras com milhões de amostras
+não ocupam a RAM. `meta.json` guarda o dtype e o número de registros (atualizado a cada bloco e no `close`).
+`load_store` reabre o diretório somente para leitura, bloco a bloco.
+"""
+import argparse
+import importlib
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("A aquisição requer o pacote numpy (pip install numpy).") from e
+
+from radar_calibration import build_step_lookup, position_degrees
+from radar_client import RadarMotorClient
+from radar_protocol import ACK_ANGLE_DONE, BAUD_RATE, DEGREES_PER_PULSE, ScanPoint, SegmentDone
+
+ACQUISITION_CHUNK_RECORDS = 65536 # Registros por arquivo .npy
+ACQUISITION_QUEUE_MAXSIZE = 4096 # Gatilhos aguardando o amostrador; além disso são descartados (contados)
+POSITION_TIMEOUT_S = 2.0 # Espera pelo POS após um movimento concluído
+COMMAND_TIMEOUT_S = 30.0
+META_FILE = "meta.json"
+CHUNK_FILE_PATTERN = "chunk_{:05d}.npy"
+
+# Origem do gatilho
+TRIGGER_SCAN = "scan"
+TRIGGER_SEGMENT = "segment"
+TRIGGER_MOVE = "move"
+
+Trigger = namedtuple("Trigger", "timestamp source position_steps") # timestamp: time.time() na chegada do evento
+
+logger = logging.getLogger(__name__)
+
+
+def record_dtype(sample_shape=(), sample_dtype="f8"):
+    """dtype estruturado de um registro; a amostra pode ser escalar ou um vetor (ex.: (1024,) complex64)."""
+    return np.dtype([
+        ("timestamp", "<f8"),
+        ("position_steps", "<i4"),
+        ("angle", "<f8"), # Graus a partir do HOME, sem calibração e sem voltar a 0 após 360
+        ("calibrated_angle", "<f8"), # Graus em [0, 360) com a calibração, como o POS do firmware
+        ("sample", np.dtype(sample_dtype), tuple(sample_shape)),
+    ])
+
+
+class AcquisitionStore:
+    """Grava registros em blocos .npy mapeados em memória; `append` pode ser chamado de uma única thread."""
+
+    def __init__(self, directory, sample_shape=(), sample_dtype="f8", chunk_records=ACQUISITION_CHUNK_RECORDS):
+        if os.path.exists(os.path.join(directory, META_FILE)):
+            raise FileExistsError(f"{directory} já contém uma aquisição.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtype = record_dtype(sample_shape, sample_dtype)
+        self.sample_shape = tuple(sample_shape)
+        self.sample_dtype = np.dtype(sample_dtype).str
+        self.chunk_records = chunk_records
+        self.count = 0
+        self._chunk = None
+        self._chunk_index = -1
+        self._write_meta()
+
+    def append(self, timestamp, position_steps, angle, calibrated_angle, sample):
+        offset = self.count % self.chunk_records
+        if offset == 0:
+            self._open_chunk(self.count // self.chunk_records)
+        self._chunk[offset] = (timestamp, position_steps, angle, calibrated_angle, sample)
+        self.count += 1
+
+    def _open_chunk(self, index):
+        self._close_chunk()
+        path = os.path.join(self.directory, CHUNK_FILE_PATTERN.format(index))
+        self._chunk = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(self.chunk_records,))
+        self._chunk_index = index
+        self._write_meta()
+
+    def _close_chunk(self):
+        if self._chunk is not None:
+            self._chunk.flush()
+            self._chunk = None
+
+    def _write_meta(self):
+        meta = {"count": self.count, "chunk_records": self.chunk_records, "sample_shape": list(self.sample_shape),
+                "sample_dtype": self.sample_dtype}
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path) # Nunca deixa um meta.json pela metade
+
+    def flush(self):
+        """Grava o bloco atual no disco e atualiza o número de registros em meta.json."""
+        if self._chunk is not None:
+            self._chunk.flush()
+        self._write_meta()
+
+    def close(self):
+        self._close_chunk()
+        self._write_meta()
+
+
+class StoredAcquisition:
+    """Aquisição gravada, aberta somente para leitura; os blocos são mapeados sob demanda."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.count = meta["count"]
+        self.chunk_records = meta["chunk_records"]
+        self.dtype = record_dtype(meta["sample_shape"], meta["sample_dtype"])
+
+    def __len__(self):
+        return self.count
+
+    def chunks(self):
+        """Itera os blocos como arrays estruturados mapeados (sem copiar para a RAM)."""
+        for index in range(math.ceil(self.count / self.chunk_records)):
+            chunk = np.load(os.path.join(self.directory, CHUNK_FILE_PATTERN.format(index)), mmap_mode="r")
+            yield chunk[:min(self.chunk_records, self.count - index * self.chunk_records)]
+
+    def column(self, name):
+        """Um campo de todos os registros, concatenado em memória (use com "sample" apenas se couber na RAM)."""
+        return np.concatenate([chunk[name] for chunk in self.chunks()]) if self.count else np.empty(0, self.dtype[name])
+
+
+def load_store(directory):
+    return StoredAcquisition(directory)
+
+
+class Acquisition:
+    """Dispara `sampler(trigger)` a cada ponto atingido pelo motor e grava o resultado em `store`.
+
+    `factor` e `corrections` (tabela CALTAB) são os da calibração carregada no firmware, usados para o ângulo
+    calibrado. `sources` escolhe os gatilhos (TRIGGER_SCAN, TRIGGER_SEGMENT, TRIGGER_MOVE). O amostrador roda
+    na thread da aquisição; erros nele são registrados no log e o ponto é descartado.
+    """
+
+    def __init__(self, client, store, sampler, factor=1.0, corrections=None,
+                 sources=(TRIGGER_SCAN, TRIGGER_SEGMENT, TRIGGER_MOVE)):
+        self.client = client
+        self.store = store
+        self.sampler = sampler
+        self.factor = factor
+        self.sources = frozenset(sources)
+        self.dropped = 0 # Gatilhos descartados com a fila cheia
+        self.failed = 0 # Pontos sem amostra (erro do amostrador ou sem POS)
+        self._lookup = build_step_lookup(corrections) if corrections else None
+        self._queue = queue.Queue(maxsize=ACQUISITION_QUEUE_MAXSIZE)
+        self._subscriptions = ((ScanPoint, self._on_scan_point), (SegmentDone, self._on_segment_done),
+                               (ACK_ANGLE_DONE, self._on_move_done))
+        self._worker_thread = None
+
+    def start(self):
+        for kind, callback in self._subscriptions:
+            self.client.events.subscribe(kind, callback)
+        self._worker_thread = threading.Thread(target=self._worker, daemon=True)
+        self._worker_thread.start()
+
+    def stop(self):
+        """Deixa de assinar os eventos, processa os gatilhos pendentes e grava o store."""
+        for kind, callback in self._subscriptions:
+            self.client.events.unsubscribe(kind, callback)
+        if self._worker_thread is not None:
+            self._queue.put(None)
+            self._worker_thread.join()
+            self._worker_thread = None
+        self.store.flush()
+
+    # --- Thread de leitura: apenas enfileira ---
+    def _trigger(self, source, position_steps):
+        if source not in self.sources:
+            return
+        try:
+            self._queue.put_nowait(Trigger(time.time(), source, position_steps))
+        except queue.Full:
+            self.dropped += 1
+
+    def _on_scan_point(self, point):
+        self._trigger(TRIGGER_SCAN, point.position_steps)
+
+    def _on_segment_done(self, segment_done):
+        self._trigger(TRIGGER_SEGMENT, segment_done.position_steps)
+
+    def _on_move_done(self, event):
+        self._trigger(TRIGGER_MOVE, None) # A posição é pedida pela thread da aquisição
+
+    # --- Thread da aquisição ---
+    def _worker(self):
+        while True:
+            trigger = self._queue.get()
+            if trigger is None:
+                return
+            try:
+                if trigger.position_steps is None:
+                    self.client.query_position().result(timeout=POSITION_TIMEOUT_S)
+                    trigger = trigger._replace(position_steps=self.client.position.position_steps)
+                sample = self.sampler(trigger)
+                self.store.append(trigger.timestamp, trigger.position_steps, trigger.position_steps * DEGREES_PER_PULSE,
+                                  position_degrees(trigger.position_steps, self.factor, self._lookup), sample)
+            except Exception:
+                self.failed += 1
+                logger.exception("Falha ao adquirir o ponto %r", trigger)
+
+
+def load_sampler(spec):
+    """"modulo:funcao" -> a função amostradora (ex.: "meu_radar:ler")."""
+    module_name, separator, function_name = spec.partition(":")
+    if not separator:
+        raise ValueError(f"Amostrador inválido: {spec!r} (use modulo:funcao)")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def format_summary(stored):
+    """Resumo de uma aquisição gravada, bloco a bloco (sem carregar as amostras)."""
+    if not len(stored):
+        return f"{stored.directory}: vazia"
+    first_time = last_time = None
+    angle_min, angle_max = math.inf, -math.inf
+    for chunk in stored.chunks():
+        first_time = chunk["timestamp"][0] if first_time is None else first_time
+        last_time = chunk["timestamp"][-1]
+        angle_min = min(angle_min, float(chunk["calibrated_angle"].min()))
+        angle_max = max(angle_max, float(chunk["calibrated_angle"].max()))
+    return (f"{stored.directory}: {len(stored)} registros em {last_time - first_time:.1f} s, ângulo calibrado "
+            f"{angle_min:.3f}° a {angle_max:.3f}°, amostra {stored.dtype['sample']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aquisição do radar sincronizada com o motor.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--port", help="Porta serial da ESP32")
+    target.add_argument("--sim", action="store_true", help="Usa o simulador (tempo virtual)")
+    target.add_argument("--summary", metavar="DIRETORIO", help="Apenas resume uma aquisição gravada")
+    parser.add_argument("--scan", nargs=5, type=float, metavar=("INICIO", "FIM", "PASSO", "DWELL_MS", "HZ"),
+                        help="Executa um SCAN e adquire em cada ponto")
+    parser.add_argument("--out", help="Diretório da aquisição (novo)")
+    parser.add_argument("--sampler", help="modulo:funcao chamada com o Trigger; padrão: apenas o instante")
+    parser.add_argument("--sample-shape", type=int, nargs="*", default=[], help="Forma da amostra (ex.: 1024)")
+    parser.add_argument("--sample-dtype", default="f8", help="dtype NumPy da amostra (ex.: complex64)")
+    parser.add_argument("--factor", type=float, default=1.0, help="Fator de calibração carregado no firmware")
+    parser.add_argument("--binary", action="store_true", help="Negocia o protocolo binário")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.summary:
+        print(format_summary(load_store(args.summary)))
+        return
+    if not args.scan or not args.out:
+        parser.error("--scan e --out são obrigatórios para adquirir.")
+    sampler = load_sampler(args.sampler) if args.sampler else (lambda trigger: trigger.timestamp)
+    if args.sim:
+        from radar_sim import SimulatedSerial
+        client = RadarMotorClient(serial_port=SimulatedSerial(baudrate=None, time_scale=None))
+    else:
+        client = RadarMotorClient(args.port, BAUD_RATE)
+    store = AcquisitionStore(args.out, args.sample_shape, args.sample_dtype)
+    acquisition = Acquisition(client, store, sampler, factor=args.factor, sources=(TRIGGER_SCAN,))
+    client.connect()
+    try:
+        if args.binary:
+            client.request_binary_protocol().result(timeout=COMMAND_TIMEOUT_S)
+        client.enable().result(timeout=COMMAND_TIMEOUT_S)
+        acquisition.start()
+        start, end, step, dwell_ms, frequency_hz = args.scan
+        client.scan(start, end, step, int(dwell_ms), int(frequency_hz)).result()
+    finally:
+        acquisition.stop()
+        store.close()
+        client.close()
+    print(format_summary(load_store(args.out)))
+    if acquisition.dropped or acquisition.failed:
+        print(f"{acquisition.dropped} gatilhos descartados, {acquisition.failed} pontos com falha")
+
+
+if __name__ == "__main__":
+    main()
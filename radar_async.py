@@ -0,0 +1,117 @@
+"""Cliente asyncio para o firmware do motor do radar.
+
+Usa o loop de eventos do chamador: as leituras são não bloqueantes e cada comando é
+aguardável, encerrando no instante em que a resposta correspondente chega.
+
+Exemplo:
+    client = await AsyncRadarMotorClient.open("COM12")
+    await client.enable(timeout=2)
+    result = await client.move(90.0, 50, timeout=30) # Cancelar ou expirar envia PARAR
+    await client.close()
+"""
+import asyncio
+
+from radar_client import RadarClientBase, TX
+from radar_protocol import BAUD_RATE, CMD_STOP, OP_PROTO_TEXT, encode_frame
+
+
+async def open_serial_connection(port, baudrate=BAUD_RATE):
+    """Abre a porta serial como (StreamReader, StreamWriter) via pyserial-asyncio."""
+    try:
+        import serial_asyncio
+    except ImportError as e:
+        raise ImportError("O transporte serial asyncio requer o pacote pyserial-asyncio "
+                          "(pip install pyserial-asyncio).") from e
+    return await serial_asyncio.open_serial_connection(url=port, baudrate=baudrate)
+
+
+class AsyncRadarMotorClient(RadarClientBase):
+    """Versão asyncio do RadarMotorClient, sobre qualquer par (StreamReader, StreamWriter).
+
+    Os comandos são corrotinas que retornam um `CommandResult` ou levantam
+    `RadarCommandError` (NACK), `asyncio.TimeoutError` ou `ConnectionError`.
+    """
+
+    def __init__(self, reader, writer):
+        super().__init__()
+        self._reader = reader
+        self._writer = writer
+        self._reader_task = None
+
+    @classmethod
+    async def open(cls, port, baudrate=BAUD_RATE):
+        reader, writer = await open_serial_connection(port, baudrate)
+        client = cls(reader, writer)
+        client.start()
+        return client
+
+    @property
+    def is_connected(self):
+        return self._reader_task is not None and not self._reader_task.done()
+
+    def start(self):
+        """Inicia a leitura no loop em execução."""
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def close(self):
+        if self._reader_task is not None:
+            if self.binary_protocol and not self._reader_task.done():
+                self._writer.write(encode_frame(OP_PROTO_TEXT)) # Deixa a ESP32 em texto para a próxima conexão
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        self._writer.close()
+        self.motor_enabled = False
+        self._tracker.fail_all(ConnectionError("Porta serial fechada."))
+
+    def send_raw(self, command):
+        """Envia uma linha sem aguardar resposta."""
+        if not self.is_connected:
+            raise ConnectionError("Não conectado à porta serial.")
+        self._notify(TX, command) # Antes da escrita, para o TX nunca aparecer depois da resposta
+        if self.recorder is not None:
+            self.recorder.record_tx(command)
+        data = self._codec.encode(command)
+        self._writer.write(data)
+        self.metrics.observe_sent(data)
+
+    async def send(self, command, responses, stop_on_cancel=False, timeout=None):
+        """Envia `command` e aguarda uma das `responses` (sucesso, falha).
+
+        Com `stop_on_cancel`, cancelamento da tarefa ou timeout enviam PARAR ao firmware.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def on_result(result):
+            if not future.done():
+                future.set_result(result)
+
+        def on_error(exc):
+            if not future.done():
+                future.set_exception(exc)
+
+        pending = self._tracker.register(command, responses, on_result, on_error)
+        try:
+            self.send_raw(command)
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if stop_on_cancel and self.is_connected:
+                self.send_raw(CMD_STOP)
+            raise
+        finally:
+            self._tracker.discard(pending)
+
+    async def _read_loop(self):
+        """Lê as linhas assim que chegam e despacha cada uma."""
+        try:
+            while True:
+                data = await self._reader.read(4096)
+                if not data: # EOF: porta fechada pelo outro lado
+                    raise ConnectionError("Porta serial encerrada.")
+                self._handle_data(data)
+        except (ConnectionError, OSError) as e:
+            self._connection_lost(e)
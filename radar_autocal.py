@@ -0,0 +1,316 @@
+"""Calibração automática: percorre ângulos teóricos, lê o ângulo real de uma fonte externa e aplica o ajuste.
+
+    python radar_autocal.py --port COM12 --source encoder:COM5 --angles 0:360:10 --model spline --history cal.jsonl
+    python radar_autocal.py --port COM12 --source csv:medidas.csv --model linear --label "após troca da correia"
+    python radar_autocal.py --compare cal.jsonl
+    python radar_autocal.py --port COM12 --source encoder:COM5 --backlash
+
+Fontes do ângulo medido (`read(angulo_teorico)` -> graus): `SerialEncoderSource` (encoder ou transferidor
+digital em outra porta serial, uma leitura por linha), `CsvAngleSource` (medições feitas à parte, colunas
+teorico,medido) e `CallbackAngleSource` (qualquer função). Cada execução é acrescentada a um arquivo JSON
+Lines com os pontos, o modelo e os resíduos, para comparar calibrações ao longo do tempo. Com `--backlash`,
+mede a folga da transmissão (`measure_backlash`) e a grava no firmware (FOLGA) em vez de calibrar.
+"""
+import argparse
+import csv
+import json
+import logging
+import math
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from radar_calibration import (
+    CalibrationPoint, FIT_METHODS, fit_linear, fit_table, residual_stats, wrap_degrees,
+)
+from radar_client import RadarMotorClient
+from radar_protocol import BAUD_RATE, BACKLASH_MAX_STEPS, CALIBRATION_MAX_POINTS, DEGREES_PER_PULSE
+
+MODEL_LINEAR = "linear" # CALIBRAR (fator/offset no firmware)
+MODELS = (MODEL_LINEAR,) + FIT_METHODS # Os demais geram a tabela CALTAB
+DEFAULT_ANGLES = "0:360:30" # inicio:fim:passo (fim exclusivo)
+DEFAULT_FREQUENCY_HZ = 400
+DEFAULT_SETTLE_S = 0.2 # Espera após o movimento, antes da leitura (vibração, filtro do encoder)
+DEFAULT_SAMPLES = 1 # Leituras da fonte por ponto (média)
+ENCODER_TIMEOUT_S = 1.0
+CSV_ANGLE_TOLERANCE = 0.01 # Graus entre o ângulo pedido e o do CSV
+COMMAND_TIMEOUT_S = 30.0
+HOME_TIMEOUT_S = 120.0
+BACKLASH_ANGLE = 180.0 # Ângulo onde a folga é medida (longe do fim de curso)
+BACKLASH_SPAN_DEGREES = 10.0 # Quanto o motor passa do ângulo antes de voltar (maior que a folga)
+BACKLASH_REPEATS = 3
+
+CalibrationRun = namedtuple(
+    "CalibrationRun", "label timestamp model points residual_rms residual_max factor offset corrections")
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackAngleSource:
+    """Fonte a partir de uma função `callback(angulo_teorico)` -> ângulo medido (graus)."""
+
+    def __init__(self, callback):
+        self._callback = callback
+
+    def read(self, theoretical):
+        return float(self._callback(theoretical))
+
+    def close(self):
+        pass
+
+
+class CsvAngleSource:
+    """Medições já feitas, colunas `teorico,medido`; cada ângulo pedido precisa ter a sua linha."""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8", newline="") as f:
+            self._rows = [(float(row["teorico"]), float(row["medido"])) for row in csv.DictReader(f)]
+        self.path = path
+
+    def read(self, theoretical):
+        for angle, measured in self._rows:
+            if abs(wrap_degrees(angle - theoretical)) <= CSV_ANGLE_TOLERANCE:
+                return measured
+        raise ValueError(f"{self.path}: sem medição para {theoretical}°.")
+
+    def close(self):
+        pass
+
+
+class SerialEncoderSource:
+    """Encoder em outra porta serial: usa o primeiro número de cada linha (graus, ou contagens com `scale`).
+
+    Com `request`, envia esse texto antes de cada leitura (encoders que respondem a consulta); sem ele,
+    descarta o que já chegou e usa a próxima linha completa.
+    """
+
+    def __init__(self, port, baudrate=BAUD_RATE, request=None, scale=1.0, timeout=ENCODER_TIMEOUT_S, serial_port=None):
+        if serial_port is None:
+            import serial
+            serial_port = serial.Serial(port, baudrate, timeout=timeout)
+        self._port = serial_port
+        self._request = request
+        self._scale = scale
+        self._timeout = timeout
+
+    def read(self, theoretical):
+        self._port.reset_input_buffer()
+        if self._request:
+            self._port.write((self._request + "\n").encode("utf-8"))
+        deadline = time.monotonic() + self._timeout
+        if not self._request:
+            self._port.readline() # Linha possivelmente incompleta
+        while time.monotonic() < deadline:
+            match = _NUMBER.search(self._port.readline().decode("utf-8", errors="replace"))
+            if match:
+                return float(match.group()) * self._scale
+        raise TimeoutError("Encoder não respondeu.")
+
+    def close(self):
+        self._port.close()
+
+
+def parse_angles(text):
+    """"inicio:fim:passo" (fim exclusivo) ou lista "0,45,90"."""
+    if ":" in text:
+        start, end, step = (float(value) for value in text.split(":"))
+        if step <= 0:
+            raise ValueError("O passo dos ângulos deve ser positivo.")
+        return [start + index * step for index in range(math.ceil((end - start) / step - 1e-9))]
+    return [float(value) for value in text.split(",")]
+
+
+def _read_source(source, theoretical, samples):
+    """Média de `samples` leituras, desdobradas em torno da primeira (evita 359.9 + 0.1 = 180)."""
+    first = source.read(theoretical)
+    total = first
+    for _ in range(samples - 1):
+        total += first + wrap_degrees(source.read(theoretical) - first)
+    return (total / samples) % 360.0
+
+
+def capture_points(client, source, angles, frequency_hz=DEFAULT_FREQUENCY_HZ, settle_s=DEFAULT_SETTLE_S,
+                   samples=DEFAULT_SAMPLES, zero_source=False, on_point=None):
+    """Move para cada ângulo (absoluto, a partir do HOME) e lê a fonte; retorna [CalibrationPoint].
+
+    O teórico registrado é a posição real do motor (POS, sem correção), de modo que uma calibração já
+    aplicada não distorce o novo ajuste. Com `zero_source`, a leitura no HOME vira o zero da fonte
+    (encoders montados com outra origem). `on_point(CalibrationPoint)` é chamado a cada ponto.
+    """
+    zero = 0.0
+    if zero_source:
+        client.move_to(0.0, frequency_hz).result(timeout=COMMAND_TIMEOUT_S)
+        time.sleep(settle_s)
+        zero = _read_source(source, 0.0, samples)
+    points = []
+    for angle in angles:
+        client.move_to(angle % 360.0, frequency_hz).result(timeout=COMMAND_TIMEOUT_S)
+        time.sleep(settle_s)
+        client.query_position().result(timeout=COMMAND_TIMEOUT_S)
+        theoretical = round(client.position.position_steps * DEGREES_PER_PULSE % 360.0, 4)
+        measured = round((_read_source(source, angle, samples) - zero) % 360.0, 4)
+        point = CalibrationPoint(theoretical, measured)
+        points.append(point)
+        logger.info("Ponto %d: teórico %.4f°, medido %.4f°", len(points), theoretical, measured)
+        if on_point is not None:
+            on_point(point)
+    return points
+
+
+def apply_calibration(client, points, model=MODEL_LINEAR, label=""):
+    """Ajusta o modelo, envia ao firmware (CALIBRAR ou CALTAB) e retorna o CalibrationRun."""
+    if model == MODEL_LINEAR:
+        if len(points) > CALIBRATION_MAX_POINTS:
+            raise ValueError(f"A calibração linear aceita até {CALIBRATION_MAX_POINTS} pontos; use uma tabela.")
+        fit = fit_linear(points)
+        factor, offset, corrections, residuals = fit.factor, fit.offset, None, fit.residuals
+        client.calibrate(points).result(timeout=COMMAND_TIMEOUT_S)
+    else:
+        table = fit_table(points, method=model)
+        factor, offset, corrections, residuals = None, None, table.corrections, table.residuals
+        client.upload_calibration_table(corrections).result(timeout=COMMAND_TIMEOUT_S)
+    stats = residual_stats(residuals)
+    return CalibrationRun(label, datetime.now().isoformat(timespec="seconds"), model, [list(point) for point in points],
+                          stats.rms, stats.max_abs, factor, offset, corrections)
+
+
+def run_calibration(client, source, angles, model=MODEL_LINEAR, home=True, label="", **capture_options):
+    """HOME (opcional), captura dos pontos e aplicação do ajuste, sem intervenção do operador."""
+    if model not in MODELS:
+        raise ValueError(f"Modelo de calibração desconhecido: {model!r}")
+    if model == MODEL_LINEAR and len(angles) > CALIBRATION_MAX_POINTS: # Antes de mover, não depois
+        raise ValueError(f"A calibração linear aceita até {CALIBRATION_MAX_POINTS} pontos; use uma tabela.")
+    if home:
+        client.home().result(timeout=HOME_TIMEOUT_S)
+    points = capture_points(client, source, angles, **capture_options)
+    return apply_calibration(client, points, model, label)
+
+
+def _settled_reading(client, source, angle, frequency_hz, settle_s, samples):
+    client.move_to(angle % 360.0, frequency_hz).result(timeout=COMMAND_TIMEOUT_S)
+    time.sleep(settle_s)
+    return _read_source(source, angle, samples)
+
+
+def measure_backlash(client, source, angle=BACKLASH_ANGLE, span_degrees=BACKLASH_SPAN_DEGREES,
+                     repeats=BACKLASH_REPEATS, frequency_hz=DEFAULT_FREQUENCY_HZ, settle_s=DEFAULT_SETTLE_S,
+                     samples=DEFAULT_SAMPLES, apply=True):
+    """Mede a folga (passos) chegando ao mesmo ângulo pelos dois sentidos; com `apply`, grava-a com FOLGA.
+
+    A compensação é desligada durante a medição. Cada repetição chega ao ângulo no sentido FRENTE (vindo de
+    `angle - span_degrees`) e depois no sentido RE (vindo de `angle + span_degrees`); a diferença entre as
+    leituras da fonte é a folga. Retorna a média arredondada para passos.
+    """
+    client.set_backlash(0).result(timeout=COMMAND_TIMEOUT_S)
+    differences = []
+    for repeat in range(repeats):
+        client.move_to((angle - span_degrees) % 360.0, frequency_hz).result(timeout=COMMAND_TIMEOUT_S)
+        forward = _settled_reading(client, source, angle, frequency_hz, settle_s, samples)
+        client.move_to((angle + span_degrees) % 360.0, frequency_hz).result(timeout=COMMAND_TIMEOUT_S)
+        reverse = _settled_reading(client, source, angle, frequency_hz, settle_s, samples)
+        differences.append(wrap_degrees(reverse - forward))
+        logger.info("Folga %d: %.4f° (%.1f passos)", repeat + 1, differences[-1], differences[-1] / DEGREES_PER_PULSE)
+    steps = max(0, round(sum(differences) / len(differences) / DEGREES_PER_PULSE))
+    if steps > BACKLASH_MAX_STEPS:
+        raise ValueError(f"Folga medida de {steps} passos excede o limite de {BACKLASH_MAX_STEPS}.")
+    if apply:
+        client.set_backlash(steps).result(timeout=COMMAND_TIMEOUT_S)
+    return steps
+
+
+def append_run(path, run):
+    """Acrescenta a execução ao histórico (uma linha JSON por calibração)."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run._asdict(), ensure_ascii=False) + "\n")
+
+
+def load_runs(path):
+    with open(path, encoding="utf-8") as f:
+        return [CalibrationRun(**json.loads(line)) for line in f if line.strip()]
+
+
+def format_runs(runs):
+    """Tabela de texto com uma calibração por linha, para comparar execuções."""
+    lines = [f"{'data':<20}{'rótulo':<24}{'modelo':<11}{'pontos':>7}{'RMS (°)':>10}{'máx (°)':>10}  fator"]
+    for run in runs:
+        factor = "--" if run.factor is None else f"{run.factor:.6f}"
+        lines.append(f"{run.timestamp:<20}{run.label[:23]:<24}{run.model:<11}{len(run.points):>7}"
+                     f"{run.residual_rms:>10.4f}{run.residual_max:>10.4f}  {factor}")
+    return "\n".join(lines)
+
+
+def open_source(spec, sim_link=None, request=None, scale=1.0):
+    """"encoder:PORTA", "csv:ARQUIVO" ou "sim" (posição real do eixo no simulador)."""
+    kind, _, value = spec.partition(":")
+    if kind == "encoder":
+        return SerialEncoderSource(value, request=request, scale=scale)
+    if kind == "csv":
+        return CsvAngleSource(value)
+    if kind == "sim" and sim_link is not None:
+        return CallbackAngleSource(lambda _: sim_link.firmware.shaft_position() * DEGREES_PER_PULSE % 360.0)
+    raise ValueError(f"Fonte de ângulo inválida: {spec!r} (use encoder:PORTA, csv:ARQUIVO ou sim com --sim)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibração automática do motor do radar.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--port", help="Porta serial da ESP32")
+    target.add_argument("--sim", action="store_true", help="Usa o simulador (tempo virtual)")
+    target.add_argument("--compare", metavar="HISTORICO", help="Apenas lista as calibrações do histórico")
+    parser.add_argument("--source", default="sim", help="encoder:PORTA, csv:ARQUIVO ou sim")
+    parser.add_argument("--encoder-request", help="Texto enviado ao encoder antes de cada leitura")
+    parser.add_argument("--encoder-scale", type=float, default=1.0, help="Graus por unidade lida do encoder")
+    parser.add_argument("--zero", action="store_true", help="Usa a leitura no HOME como zero da fonte")
+    parser.add_argument("--angles", default=DEFAULT_ANGLES, help="inicio:fim:passo (fim exclusivo) ou lista 0,90,180")
+    parser.add_argument("--model", choices=MODELS, default=MODEL_LINEAR)
+    parser.add_argument("--frequency", type=int, default=DEFAULT_FREQUENCY_HZ, help="Frequência dos movimentos (Hz)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_S, help="Espera antes de cada leitura (s)")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="Leituras por ponto (média)")
+    parser.add_argument("--no-home", action="store_true", help="Não faz HOME antes da captura")
+    parser.add_argument("--binary", action="store_true", help="Negocia o protocolo binário")
+    parser.add_argument("--label", default="", help="Rótulo da execução")
+    parser.add_argument("--history", help="Arquivo JSON Lines acumulado entre execuções")
+    parser.add_argument("--backlash", action="store_true", help="Mede e grava a folga em vez de calibrar")
+    parser.add_argument("--backlash-angle", type=float, default=BACKLASH_ANGLE, help="Ângulo da medição da folga")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.compare:
+        print(format_runs(load_runs(args.compare)))
+        return
+    sim_link = None
+    if args.sim:
+        from radar_sim import SimulatedSerial
+        sim_link = SimulatedSerial(baudrate=None, time_scale=None)
+        client = RadarMotorClient(serial_port=sim_link)
+    else:
+        client = RadarMotorClient(args.port, BAUD_RATE)
+    source = open_source(args.source, sim_link, args.encoder_request, args.encoder_scale)
+    client.connect()
+    try:
+        if args.binary:
+            client.request_binary_protocol().result(timeout=COMMAND_TIMEOUT_S)
+        client.enable().result(timeout=COMMAND_TIMEOUT_S)
+        if args.backlash:
+            if not args.no_home:
+                client.home().result(timeout=HOME_TIMEOUT_S)
+            steps = measure_backlash(client, source, args.backlash_angle, frequency_hz=args.frequency,
+                                     settle_s=args.settle, samples=args.samples)
+            print(f"Folga: {steps} passos ({steps * DEGREES_PER_PULSE:.3f}°), gravada no firmware.")
+            return
+        run = run_calibration(client, source, parse_angles(args.angles), args.model, home=not args.no_home,
+                              label=args.label, frequency_hz=args.frequency, settle_s=args.settle,
+                              samples=args.samples, zero_source=args.zero or args.source == "sim")
+    finally:
+        source.close()
+        client.close()
+    print(format_runs([run]))
+    if args.history:
+        append_run(args.history, run)
+
+
+if __name__ == "__main__":
+    main()
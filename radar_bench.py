@@ -0,0 +1,383 @@
+"""Benchmark do link de controle: latência comando -> ACK, movimentos/s, saturação do link e atraso da GUI.
+
+    python radar_bench.py --sim --json resultado.json --csv historico.csv
+    python radar_bench.py --port COM12 --binary --label "fw 2024-05" --csv historico.csv
+
+Cada cenário gera um `BenchmarkResult` com percentis (p50/p95/p99, em ms) e taxas. O CSV é
+acrescentado a cada execução, para comparar protocolos (texto x binário) e versões do firmware.
+Atenção: o cenário "calibrar" grava na NVS da ESP32 a calibração de `--calibration-points`.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from radar_client import RadarMotorClient, RX
+from radar_protocol import (
+    BAUD_RATE, ACK_MOVE_STARTED, ACK_HOMING_STARTED, DEFAULT_MAX_SPEED_HZ, SCAN_PREFIX, TELEMETRY_PREFIX,
+    TELEMETRY_EVERY_N_PULSES, TELEMETRY_EVERY_T_MS, RadarCommandError,
+)
+
+SCENARIOS = ("habilitar", "mover", "home", "calibrar", "scan", "telemetria", "gui")
+DEFAULT_REPEAT = 20
+DEFAULT_HOME_REPEAT = 3 # O HOME é lento (busca a 50 Hz)
+MOVE_DEGREES = 5.0 # Movimentos curtos, alternando a direção para não sair da faixa
+MOVE_FREQUENCY_HZ = DEFAULT_MAX_SPEED_HZ
+SCAN_ARGS = (0.0, 45.0, 0.5, 0, DEFAULT_MAX_SPEED_HZ) # inicio, fim, passo, dwell_ms, hz: 91 pontos
+FLOOD_DEGREES = 90.0 # Movimento com TELEMETRIA PULSOS 1 (um registro por pulso)
+DEFAULT_CALIBRATION_POINTS = ((0.0, 0.0), (90.0, 90.0), (180.0, 180.0)) # Identidade
+COMMAND_TIMEOUT_S = 5.0
+HOME_TIMEOUT_S = 120.0
+GUI_TICK_MS = 10 # Período do root.after usado para medir o atraso do loop do Tk
+BITS_PER_BYTE = 10 # 8N1
+
+BenchmarkResult = namedtuple(
+    "BenchmarkResult",
+    "scenario count errors p50_ms p95_ms p99_ms mean_ms max_ms rate_per_s rx_bytes_per_s link_utilization")
+
+_COMMAND_ERRORS = (RadarCommandError, FutureTimeoutError, TimeoutError, ConnectionError)
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, fraction):
+    """Percentil com interpolação linear (`fraction` entre 0 e 1); None sem amostras."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(scenario, latencies_s, errors=0, rate_per_s=None, rx_bytes_per_s=None, link_utilization=None):
+    latencies_ms = [latency * 1000 for latency in latencies_s]
+    return BenchmarkResult(
+        scenario, len(latencies_ms), errors, percentile(latencies_ms, 0.50), percentile(latencies_ms, 0.95),
+        percentile(latencies_ms, 0.99), statistics.fmean(latencies_ms) if latencies_ms else None,
+        max(latencies_ms, default=None), rate_per_s, rx_bytes_per_s, link_utilization)
+
+
+class ByteCountingPort:
+    """Envolve uma porta pyserial (ou SimulatedSerial) contando os bytes trafegados."""
+
+    def __init__(self, port):
+        self._port = port
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+
+    def read(self, size=1):
+        data = self._port.read(size)
+        self.rx_bytes += len(data)
+        return data
+
+    def write(self, data):
+        self.tx_bytes += len(data)
+        return self._port.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._port, name)
+
+
+class RxRecorder:
+    """Assinante do cliente que guarda (instante, linha) de cada linha recebida."""
+
+    def __init__(self):
+        self.lines = []
+
+    def __call__(self, direction, line):
+        if direction == RX:
+            self.lines.append((time.perf_counter(), line))
+
+    def clear(self):
+        self.lines = []
+
+    def first(self, token, since):
+        """Instante da primeira linha `token` recebida após `since`, ou None."""
+        return next((t for t, line in self.lines if t >= since and line == token), None)
+
+    def times(self, prefix, since):
+        return [t for t, line in self.lines if t >= since and line.startswith(prefix)]
+
+
+def _run_command(make_future, timeout=COMMAND_TIMEOUT_S):
+    """Executa um comando; retorna (instante de envio, CommandResult) ou (instante, None) em erro."""
+    sent_at = time.perf_counter()
+    try:
+        return sent_at, make_future().result(timeout=timeout)
+    except _COMMAND_ERRORS:
+        return sent_at, None
+
+
+def bench_enable(client, recorder, repeat):
+    latencies = []
+    for _ in range(repeat):
+        _, result = _run_command(client.enable)
+        if result is not None:
+            latencies.append(result.latency)
+    return [summarize("HABILITAR", latencies, repeat - len(latencies))]
+
+
+def bench_move(client, recorder, repeat):
+    """MOVER ANGULO curtos: latência até ACK_MOVIMENTO_INICIADO, até o fim do movimento e movimentos/s."""
+    ack_latencies, done_latencies = [], []
+    started = time.perf_counter()
+    for i in range(repeat):
+        _run_command(lambda: client.set_direction(i % 2 == 0))
+        sent_at, result = _run_command(lambda: client.move(MOVE_DEGREES, MOVE_FREQUENCY_HZ))
+        ack_at = recorder.first(ACK_MOVE_STARTED, sent_at)
+        if ack_at is not None:
+            ack_latencies.append(ack_at - sent_at)
+        if result is not None:
+            done_latencies.append(result.latency)
+    elapsed = time.perf_counter() - started
+    return [
+        summarize("MOVER ANGULO (ACK)", ack_latencies, repeat - len(ack_latencies)),
+        summarize("MOVER ANGULO (concluído)", done_latencies, repeat - len(done_latencies),
+                  rate_per_s=len(done_latencies) / elapsed),
+    ]
+
+
+def bench_home(client, recorder, repeat):
+    ack_latencies, done_latencies = [], []
+    for _ in range(repeat):
+        sent_at, result = _run_command(client.home, HOME_TIMEOUT_S)
+        ack_at = recorder.first(ACK_HOMING_STARTED, sent_at)
+        if ack_at is not None:
+            ack_latencies.append(ack_at - sent_at)
+        if result is not None:
+            done_latencies.append(result.latency)
+    return [
+        summarize("HOME (ACK)", ack_latencies, repeat - len(ack_latencies)),
+        summarize("HOME (concluído)", done_latencies, repeat - len(done_latencies)),
+    ]
+
+
+def bench_calibrate(client, recorder, repeat, points=DEFAULT_CALIBRATION_POINTS):
+    latencies = []
+    for _ in range(repeat):
+        _, result = _run_command(lambda: client.calibrate(points))
+        if result is not None:
+            latencies.append(result.latency)
+    return [summarize("CALIBRAR", latencies, repeat - len(latencies))]
+
+
+def bench_scan(client, recorder, repeat):
+    """SCAN executado pela ESP32: intervalo entre pontos SCN consecutivos e pontos/s sustentados."""
+    intervals, errors, points, elapsed = [], 0, 0, 0.0
+    for _ in range(max(1, repeat // 10)):
+        sent_at, result = _run_command(lambda: client.scan(*SCAN_ARGS), HOME_TIMEOUT_S)
+        times = recorder.times(SCAN_PREFIX, sent_at)
+        if result is None or len(times) < 2:
+            errors += 1
+            continue
+        intervals.extend(b - a for a, b in zip(times, times[1:]))
+        points += len(times) - 1
+        elapsed += times[-1] - times[0]
+    return [summarize("SCAN (intervalo entre pontos)", intervals, errors,
+                      rate_per_s=points / elapsed if elapsed else None)]
+
+
+def bench_telemetry_flood(client, recorder, port):
+    """Movimento com um TLM por pulso: ocupação do link, TLM/s entregues e latência de DIR sob carga."""
+    latencies, errors = [], 0
+    _run_command(lambda: client.set_direction(True)) # Para longe do fim de curso
+    _run_command(lambda: client.set_telemetry(TELEMETRY_EVERY_N_PULSES, 1))
+    rx_bytes_before = port.rx_bytes
+    started = time.perf_counter()
+    move = client.move(FLOOD_DEGREES, MOVE_FREQUENCY_HZ)
+    while not move.done():
+        _, result = _run_command(lambda: client.set_direction(True))
+        if result is None:
+            errors += 1
+        else:
+            latencies.append(result.latency)
+    try:
+        move.result()
+    except _COMMAND_ERRORS:
+        errors += 1
+    elapsed = time.perf_counter() - started
+    rx_bytes_per_s = (port.rx_bytes - rx_bytes_before) / elapsed
+    baudrate = getattr(port, "baudrate", None)
+    telemetry_records = len(recorder.times(TELEMETRY_PREFIX, started))
+    _run_command(lambda: client.set_telemetry(TELEMETRY_EVERY_T_MS, 100)) # Padrão do firmware
+    return [summarize("TELEMETRIA PULSOS 1 (DIR sob carga)", latencies, errors,
+                      rate_per_s=telemetry_records / elapsed, rx_bytes_per_s=rx_bytes_per_s,
+                      link_utilization=rx_bytes_per_s * BITS_PER_BYTE / baudrate if baudrate else None)]
+
+
+def bench_gui_lag(open_port, repeat):
+    """Atraso do loop do Tk (root.after de GUI_TICK_MS) com a GUI conectada durante movimentos e telemetria intensa."""
+    import tkinter
+    import Motor_radar as gui
+
+    try:
+        gui.create_gui()
+    except tkinter.TclError as e:
+        logger.warning("GUI indisponível (%s): cenário gui ignorado.", e)
+        return []
+    gui.connect_serial(open_port())
+    lags = []
+    finished = threading.Event()
+    expected = [time.perf_counter() + GUI_TICK_MS / 1000]
+
+    def tick():
+        now = time.perf_counter()
+        lags.append(max(0.0, now - expected[0]))
+        if finished.is_set():
+            gui.root.quit()
+            return
+        expected[0] = now + GUI_TICK_MS / 1000
+        gui.root.after(GUI_TICK_MS, tick)
+
+    def workload():
+        try:
+            client = gui.client
+            _run_command(client.enable)
+            _run_command(lambda: client.set_telemetry(TELEMETRY_EVERY_N_PULSES, 1))
+            for i in range(repeat):
+                _run_command(lambda: client.set_direction(i % 2 == 0))
+                _run_command(lambda: client.move(FLOOD_DEGREES / 4, MOVE_FREQUENCY_HZ))
+            _run_command(lambda: client.set_telemetry(TELEMETRY_EVERY_T_MS, 100))
+        finally:
+            finished.set()
+
+    gui.root.after(GUI_TICK_MS, tick)
+    threading.Thread(target=workload, daemon=True).start()
+    gui.root.mainloop()
+    gui.client.close() # Sem PARAR/DESABILITAR do disconnect_serial: o workload já terminou
+    gui.root.destroy()
+    return [summarize("GUI (atraso do loop Tk)", lags)]
+
+
+def run_benchmarks(open_port, scenarios=SCENARIOS, repeat=DEFAULT_REPEAT, home_repeat=DEFAULT_HOME_REPEAT,
+                   binary=False, calibration_points=DEFAULT_CALIBRATION_POINTS, on_result=None):
+    """Executa os cenários na ordem de SCENARIOS; `open_port()` retorna uma porta pyserial nova a cada chamada."""
+    results = []
+    port = ByteCountingPort(open_port())
+    recorder = RxRecorder()
+    client = RadarMotorClient(serial_port=port)
+    client.add_listener(recorder)
+    client.connect()
+    try:
+        if binary:
+            client.request_binary_protocol().result(timeout=COMMAND_TIMEOUT_S)
+        client.enable().result(timeout=COMMAND_TIMEOUT_S)
+        steps = {
+            "habilitar": lambda: bench_enable(client, recorder, repeat),
+            "mover": lambda: bench_move(client, recorder, repeat),
+            "home": lambda: bench_home(client, recorder, home_repeat),
+            "calibrar": lambda: bench_calibrate(client, recorder, repeat, calibration_points),
+            "scan": lambda: bench_scan(client, recorder, repeat),
+            "telemetria": lambda: bench_telemetry_flood(client, recorder, port),
+        }
+        for name in SCENARIOS:
+            if name in scenarios and name in steps:
+                recorder.clear()
+                for result in steps[name]():
+                    results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+    finally:
+        client.close()
+    if "gui" in scenarios:
+        for result in bench_gui_lag(open_port, repeat):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
+
+
+def _rounded(result):
+    return {field: round(value, 3) if isinstance(value, float) else value for field, value in result._asdict().items()}
+
+
+def write_json(path, run, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"run": run, "results": [_rounded(result) for result in results]}, f, indent=2, ensure_ascii=False)
+
+
+def append_csv(path, run, results):
+    """Acrescenta uma linha por cenário (com os dados da execução) ao CSV, criando o cabeçalho se necessário."""
+    fields = list(run) + list(BenchmarkResult._fields)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        if new_file:
+            writer.writeheader()
+        for result in results:
+            writer.writerow({**run, **_rounded(result)})
+
+
+def format_result(result):
+    def ms(value):
+        return "-" if value is None else f"{value:9.2f}"
+    line = (f"{result.scenario:38} n={result.count:<5} err={result.errors:<3} p50={ms(result.p50_ms)} "
+            f"p95={ms(result.p95_ms)} p99={ms(result.p99_ms)} ms")
+    if result.rate_per_s is not None:
+        line += f"  {result.rate_per_s:.1f}/s"
+    if result.link_utilization is not None:
+        line += f"  link {result.link_utilization:.0%}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do link de controle do motor do radar.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--port", help="Porta serial da ESP32 (ex.: COM12, /dev/ttyUSB0)")
+    target.add_argument("--sim", action="store_true", help="Usa o simulador (radar_sim) em tempo real")
+    parser.add_argument("--sim-instant", action="store_true",
+                        help="Simulador em tempo virtual e sem limite de baud (mede só o overhead do host)")
+    parser.add_argument("--binary", action="store_true", help="Negocia o protocolo binário antes dos cenários")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repetições por cenário")
+    parser.add_argument("--home-repeat", type=int, default=DEFAULT_HOME_REPEAT)
+    parser.add_argument("--calibration-points", default=";".join(f"{t},{m}" for t, m in DEFAULT_CALIBRATION_POINTS),
+                        help="Pontos do cenário calibrar, no formato do CALIBRAR (gravados na NVS!)")
+    parser.add_argument("--label", default="", help="Rótulo da execução (versão do firmware, etc.)")
+    parser.add_argument("--json", help="Arquivo JSON de saída")
+    parser.add_argument("--csv", help="Arquivo CSV acumulado entre execuções")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+
+    if args.port:
+        import serial
+
+        def open_port():
+            return serial.Serial(args.port, BAUD_RATE, timeout=0.1)
+        transport = args.port
+    else:
+        from radar_sim import SimulatedSerial
+
+        def open_port():
+            if args.sim_instant:
+                return SimulatedSerial(baudrate=None, time_scale=None)
+            return SimulatedSerial()
+        transport = "sim-instant" if args.sim_instant else "sim"
+
+    calibration_points = [tuple(float(value) for value in point.split(","))
+                          for point in args.calibration_points.split(";")]
+    run = {
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "transport": transport,
+        "protocol": "binario" if args.binary else "texto",
+    }
+    results = run_benchmarks(open_port, args.scenarios, args.repeat, args.home_repeat, args.binary,
+                             calibration_points, on_result=lambda result: print(format_result(result)))
+    if args.json:
+        write_json(args.json, run, results)
+    if args.csv:
+        append_csv(args.csv, run, results)
+
+
+if __name__ == "__main__":
+    main()
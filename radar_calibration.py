@@ -0,0 +1,297 @@
+"""Calibração com vários pontos: ajuste linear ou tabela de correção não linear.
+
+Cada ponto medido é um par (ângulo teórico, ângulo medido): o teórico é a posição do motor em graus a partir
+do HOME (passos * DEGREES_PER_PULSE, sem correção) e o medido é o ângulo real da saída (transferidor, encoder).
+`fit_linear` ajusta fator/offset por mínimos quadrados (comando CALIBRAR). `fit_table` interpola o erro
+E(θ) = medido - θ ao longo da volta (por partes ou spline periódico) e calcula a correção, em passos, para
+pontos igualmente espaçados da saída; o firmware a expande em uma tabela por passo (CALTAB). As funções
+`build_step_lookup`, `corrected_steps` e `nominal_steps` reproduzem essa expansão do firmware, de modo que os
+resíduos informados são os do dispositivo, incluindo o arredondamento para passos inteiros. `StepConverter`
+reproduz a conversão de ângulos comandados em passos (ponto fixo, com o resto carregado entre movimentos relativos).
+
+Exemplo:
+    points = [CalibrationPoint(theoretical, measured) for theoretical, measured in samples]
+    table = fit_table(points, method=METHOD_SPLINE)
+    print(residual_stats(table.residuals))
+    client.upload_calibration_table(table.corrections).result(timeout=5)
+"""
+import math
+import struct
+from collections import namedtuple
+
+from radar_protocol import (
+    PULSES_PER_REVOLUTION, DEGREES_PER_PULSE, CAL_TABLE_MAX_POINTS, CAL_TABLE_MAX_CORRECTION_STEPS,
+    ANGLE_UNITS_PER_DEGREE, STEP_FIXED_SHIFT,
+)
+
+METHOD_PIECEWISE = "piecewise" # Interpolação linear entre os pontos medidos
+METHOD_SPLINE = "spline" # Spline cúbico periódico (exige ao menos 3 pontos)
+FIT_METHODS = (METHOD_PIECEWISE, METHOD_SPLINE)
+INVERSION_ITERATIONS = 20 # Iterações de ponto fixo para inverter o erro (converge se o erro não reverte a saída)
+
+CalibrationPoint = namedtuple("CalibrationPoint", "theoretical measured")
+LinearFit = namedtuple("LinearFit", "factor offset residuals")
+TableFit = namedtuple("TableFit", "corrections method residuals errors")
+ResidualStats = namedtuple("ResidualStats", "rms max_abs")
+
+
+def wrap_degrees(degrees):
+    """Ângulo em (-180, 180]."""
+    wrapped = math.fmod(degrees, 360.0)
+    if wrapped > 180.0:
+        wrapped -= 360.0
+    elif wrapped <= -180.0:
+        wrapped += 360.0
+    return wrapped
+
+
+def residual_stats(residuals):
+    """RMS e maior resíduo absoluto (graus)."""
+    if not residuals:
+        return ResidualStats(0.0, 0.0)
+    return ResidualStats(math.sqrt(sum(r * r for r in residuals) / len(residuals)), max(abs(r) for r in residuals))
+
+
+def fit_linear(points):
+    """Mínimos quadrados de medido = fator * teórico + offset, como calibrate_motor_min_squares no firmware.
+
+    O medido é desdobrado para perto do teórico (ex.: 359.5 medido para 0.2 teórico vira -0.5).
+    """
+    points = list(points)
+    if len(points) < 2:
+        raise ValueError("A calibração linear exige ao menos 2 pontos.")
+    xs = [float(point.theoretical) for point in points]
+    ys = [x + wrap_degrees(float(point.measured) - x) for x, point in zip(xs, points)]
+    count = len(points)
+    mean_x, mean_y = sum(xs) / count, sum(ys) / count
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        raise ValueError("Os ângulos teóricos da calibração linear devem ser diferentes.")
+    factor = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+    offset = mean_y - factor * mean_x
+    return LinearFit(factor, offset, [y - (factor * x + offset) for x, y in zip(xs, ys)])
+
+
+def _error_samples(points):
+    """Pares (θ em [0, 360), erro em graus) ordenados, sem ângulos teóricos repetidos."""
+    samples = sorted((float(point.theoretical) % 360.0, wrap_degrees(float(point.measured) - float(point.theoretical)))
+                     for point in points)
+    for (first, _), (second, _) in zip(samples, samples[1:]):
+        if second - first < DEGREES_PER_PULSE:
+            raise ValueError(f"Pontos teóricos repetidos na calibração ({first:.3f}° e {second:.3f}°).")
+    return samples
+
+
+def _piecewise_model(samples):
+    xs = [x for x, _ in samples]
+    ys = [y for _, y in samples]
+    count = len(xs)
+
+    def error(theta):
+        theta %= 360.0
+        index = _interval(xs, theta)
+        x0, y0 = xs[index], ys[index]
+        x1, y1 = (xs[index + 1], ys[index + 1]) if index + 1 < count else (xs[0] + 360.0, ys[0])
+        if theta < x0:
+            theta += 360.0
+        return y0 + (y1 - y0) * (theta - x0) / (x1 - x0)
+
+    return error
+
+
+def _spline_model(samples):
+    """Spline cúbico periódico: resolve as segundas derivadas (sistema cíclico pequeno, eliminação direta)."""
+    xs = [x for x, _ in samples]
+    ys = [y for _, y in samples]
+    count = len(xs)
+    spacing = [(xs[(i + 1) % count] + (360.0 if i + 1 == count else 0.0)) - xs[i] for i in range(count)]
+    matrix = [[0.0] * count for _ in range(count)]
+    rhs = [0.0] * count
+    for i in range(count):
+        previous = spacing[i - 1]
+        matrix[i][(i - 1) % count] += previous
+        matrix[i][i] += 2.0 * (previous + spacing[i])
+        matrix[i][(i + 1) % count] += spacing[i]
+        rhs[i] = 6.0 * ((ys[(i + 1) % count] - ys[i]) / spacing[i] - (ys[i] - ys[i - 1]) / previous)
+    second = _solve(matrix, rhs)
+
+    def error(theta):
+        theta %= 360.0
+        index = _interval(xs, theta)
+        if theta < xs[index]:
+            theta += 360.0
+        h = spacing[index]
+        t0 = theta - xs[index]
+        t1 = h - t0
+        next_index = (index + 1) % count
+        return (second[index] * t1 ** 3 / (6 * h) + second[next_index] * t0 ** 3 / (6 * h)
+                + (ys[index] / h - second[index] * h / 6) * t1 + (ys[next_index] / h - second[next_index] * h / 6) * t0)
+
+    return error
+
+
+def _interval(xs, theta):
+    """Índice do ponto que inicia o intervalo de θ (o último ponto, antes da volta, cobre também θ < xs[0])."""
+    index = len(xs) - 1
+    for position, x in enumerate(xs):
+        if x > theta:
+            index = position - 1
+            break
+    return index % len(xs)
+
+
+def _solve(matrix, rhs):
+    """Eliminação de Gauss com pivotamento parcial (o sistema tem no máximo algumas dezenas de linhas)."""
+    count = len(rhs)
+    rows = [row[:] + [value] for row, value in zip(matrix, rhs)]
+    for column in range(count):
+        pivot = max(range(column, count), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, count):
+            ratio = rows[row][column] / rows[column][column]
+            for k in range(column, count + 1):
+                rows[row][k] -= ratio * rows[column][k]
+    solution = [0.0] * count
+    for row in reversed(range(count)):
+        known = sum(rows[row][k] * solution[k] for k in range(row + 1, count))
+        solution[row] = (rows[row][count] - known) / rows[row][row]
+    return solution
+
+
+def validate_table(corrections):
+    """Mesmas verificações do CALTAB APLICAR: limite de correção e posição corrigida sempre crescente."""
+    count = len(corrections)
+    if not 2 <= count <= CAL_TABLE_MAX_POINTS:
+        raise ValueError(f"A tabela de correção deve ter de 2 a {CAL_TABLE_MAX_POINTS} pontos.")
+    spacing_steps = PULSES_PER_REVOLUTION / count
+    for index, correction in enumerate(corrections):
+        if abs(correction) > CAL_TABLE_MAX_CORRECTION_STEPS:
+            raise ValueError(f"Correção de {correction:.1f} passos em {index * 360.0 / count:.1f}° excede o limite.")
+        if corrections[(index + 1) % count] - correction <= -spacing_steps:
+            raise ValueError(f"A correção reverte o movimento perto de {index * 360.0 / count:.1f}°.")
+
+
+def fit_table(points, table_points=CAL_TABLE_MAX_POINTS, method=METHOD_PIECEWISE):
+    """Tabela de correção (passos em k * 360 / table_points da saída) a partir dos pontos medidos.
+
+    Para cada ângulo de saída a procura a posição do motor θ com θ + E(θ) = a; a correção é (θ - a) em passos.
+    """
+    if method not in FIT_METHODS:
+        raise ValueError(f"Método de ajuste desconhecido: {method!r}")
+    samples = _error_samples(points)
+    if len(samples) < (3 if method == METHOD_SPLINE else 2):
+        raise ValueError(f"O ajuste {method} exige ao menos {3 if method == METHOD_SPLINE else 2} pontos.")
+    error = _spline_model(samples) if method == METHOD_SPLINE else _piecewise_model(samples)
+    corrections = []
+    for index in range(table_points):
+        target = index * 360.0 / table_points
+        theta = target
+        for _ in range(INVERSION_ITERATIONS):
+            theta = target - error(theta)
+        corrections.append((theta - target) / DEGREES_PER_PULSE)
+    validate_table(corrections)
+    lookup = build_step_lookup(corrections)
+    residuals = [] # Ângulo medido menos o que o firmware informaria (POS) para a mesma posição do motor
+    for point in points:
+        reported_steps = nominal_steps(round(float(point.theoretical) / DEGREES_PER_PULSE), lookup)
+        residuals.append(wrap_degrees(float(point.measured) - reported_steps * DEGREES_PER_PULSE))
+    return TableFit(corrections, method, residuals, [y for _, y in samples])
+
+
+def _round_half_away(value):
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1) # roundf do firmware
+
+
+def build_step_lookup(corrections):
+    """Correção (passos inteiros) para cada passo da volta, como cal_table_build_lut no firmware."""
+    count = len(corrections)
+    lookup = []
+    for step in range(PULSES_PER_REVOLUTION):
+        position = step * count / PULSES_PER_REVOLUTION
+        index = int(position)
+        start, end = corrections[index], corrections[(index + 1) % count]
+        lookup.append(_round_half_away(start + (end - start) * (position - index)))
+    return lookup
+
+
+def corrected_steps(nominal, lookup):
+    """Posição do motor que leva a saída à posição nominal (calibrated_steps no firmware)."""
+    return nominal + lookup[nominal % PULSES_PER_REVOLUTION] if lookup else nominal
+
+
+def nominal_steps(motor, lookup):
+    """Inverso de `corrected_steps` (duas iterações de ponto fixo, como no firmware)."""
+    if not lookup:
+        return motor
+    nominal = motor - lookup[motor % PULSES_PER_REVOLUTION]
+    return motor - lookup[nominal % PULSES_PER_REVOLUTION]
+
+
+def _float32(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+class StepConverter:
+    """Ângulo comandado -> passos nominais, como o firmware (update_step_conversion e movimentos relativos).
+
+    O ângulo é quantizado em 1/ANGLE_UNITS_PER_DEGREE grau e multiplicado pelos passos por unidade em ponto fixo,
+    calculados uma vez por fator de calibração. Os movimentos relativos carregam o resto (fração de passo) para o
+    próximo: 1000 movimentos de 0.5° somam exatamente os passos de 500°. Como no firmware, `reset` zera o resto
+    (HOME, MOVER_PARA, SCAN, PARAR, fim de curso) e `set_factor` o zera ao trocar a calibração. Não inclui a
+    tabela de correção.
+    """
+
+    def __init__(self, factor=1.0):
+        self.set_factor(factor)
+
+    def set_factor(self, factor):
+        factor = _float32(factor)
+        self.steps_per_unit_q = _round_half_away(
+            PULSES_PER_REVOLUTION / (360.0 * ANGLE_UNITS_PER_DEGREE * factor) * (1 << STEP_FIXED_SHIFT))
+        self.remainder_q = 0
+
+    def reset(self):
+        self.remainder_q = 0
+
+    @staticmethod
+    def units(degrees):
+        """Ângulo recebido pelo firmware (float32) em unidades inteiras (lroundf)."""
+        return _round_half_away(_float32(_float32(degrees) * ANGLE_UNITS_PER_DEGREE))
+
+    def units_to_steps(self, units):
+        return (units * self.steps_per_unit_q + (1 << (STEP_FIXED_SHIFT - 1))) >> STEP_FIXED_SHIFT
+
+    def steps(self, degrees):
+        """Posição absoluta (MOVER_PARA, pontos do SCAN), sem resto."""
+        return self.units_to_steps(self.units(degrees))
+
+    def relative(self, forward, units):
+        """(deslocamento em ponto fixo com o resto, pulsos) de um movimento relativo, sem consumir o resto."""
+        move_q = units * self.steps_per_unit_q
+        total_q = (move_q if forward else -move_q) + self.remainder_q
+        steps = (total_q + (1 << (STEP_FIXED_SHIFT - 1))) >> STEP_FIXED_SHIFT
+        return total_q, steps if forward else -steps
+
+    def carry(self, total_q, forward, pulses):
+        """Guarda o que o movimento de `pulses` passos não cobriu de `total_q`."""
+        self.remainder_q = total_q - (pulses if forward else -pulses) * (1 << STEP_FIXED_SHIFT)
+
+    def move(self, forward, degrees):
+        """Pulsos de um MOVER ANGULO; 0 abaixo de um passo (o firmware só acumula o resto e responde concluído)."""
+        units = self.units(degrees)
+        if units <= 0:
+            return 0 # NACK_ANGULO_INVALIDO: resto mantido
+        total_q, pulses = self.relative(forward, units)
+        self.carry(total_q, forward, pulses)
+        return pulses
+
+    def segment(self, forward, degrees):
+        """Pulsos de um segmento de programa; 0 quando o resto já o cobre (o firmware executa só o dwell)."""
+        total_q, pulses = self.relative(forward, self.units(degrees))
+        self.carry(total_q, forward, pulses)
+        return pulses
+
+
+def position_degrees(motor, factor=1.0, lookup=None):
+    """Ângulo calibrado em [0, 360) de uma posição do motor, como o POS do firmware (só o fator, sem o offset)."""
+    return math.fmod((nominal_steps(motor, lookup) % PULSES_PER_REVOLUTION) * DEGREES_PER_PULSE * factor, 360.0)
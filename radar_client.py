@@ -0,0 +1,407 @@
+"""Cliente headless (sem Tk) para o firmware do motor do radar.
+
+Exemplo:
+    client = RadarMotorClient("COM12")
+    client.connect()
+    client.enable().result(timeout=2)
+    result = client.move(90.0, 50).result(timeout=30)
+    print(result.response, result.latency)
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from radar_protocol import (
+    BAUD_RATE, CMD_ENABLE, CMD_DISABLE, CMD_STOP, CMD_DIR_FORWARD, CMD_DIR_REVERSE, CMD_HOME, CMD_RESET_CALIB,
+    CMD_PROTO_BINARY, CMD_POSITION, ACK_ENABLED, ACK_DISABLED, OP_PROTO_TEXT,
+    ENABLE_RESPONSES, DISABLE_RESPONSES, STOP_RESPONSES, DIR_FORWARD_RESPONSES, DIR_REVERSE_RESPONSES,
+    MOVE_RESPONSES, HOME_RESPONSES, CALIBRATE_RESPONSES, RESET_CALIB_RESPONSES, PROTO_BINARY_RESPONSES,
+    TELEMETRY_RESPONSES, RAMP_RESPONSES, SCAN_RESPONSES, SWEEP_RESPONSES, PROGRAM_RESPONSES, CMD_PROGRAM_START,
+    MOVE_TO_RESPONSES, POSITION_RESPONSES, DEGREES_PER_PULSE, CMD_STATS, STATS_RESPONSES, DEBOUNCE_RESPONSES,
+    HOMING_CONFIG_RESPONSES, CAL_TABLE_ADD_RESPONSES, CAL_TABLE_APPLY_RESPONSES, BACKLASH_RESPONSES, CommandTracker, SerialCodec, Telemetry,
+    ScanPoint, SegmentDone, Position, FirmwareStats, LimitSwitchTrip, HomingReport,
+    encode_frame, format_move_command, format_calibration_command, format_telemetry_command, format_ramp_command,
+    format_scan_command, format_move_to_command, format_debounce_command, format_homing_command,
+    format_cal_table_commands, format_backlash_command,
+)
+from radar_events import EventDispatcher, parse_event
+from radar_metrics import HostMetrics
+from radar_program import ProgramStream
+
+TX = "TX"
+RX = "RX"
+
+_PROGRAM_END_LINES = PROGRAM_RESPONSES[0] | PROGRAM_RESPONSES[1]
+# Registro -> atributo do cliente com o último recebido
+_LATEST_RECORD_ATTRIBUTES = {
+    Telemetry: "telemetry", ScanPoint: "scan_point", Position: "position", FirmwareStats: "firmware_stats",
+    LimitSwitchTrip: "limit_switch_trip", HomingReport: "homing_report",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class RadarClientBase:
+    """Estado, assinantes e comandos comuns aos clientes síncrono e assíncrono.
+
+    As subclasses implementam `send(command, responses, stop_on_cancel=False, timeout=None)`.
+    """
+
+    def __init__(self):
+        self.motor_enabled = False # Atualizado pelos ACK_HABILITADO / ACK_DESABILITADO
+        self.telemetry = None # Último registro TLM (Telemetry) recebido
+        self.scan_point = None # Último ponto SCN (ScanPoint) de SCAN/VARREDURA
+        self.position = None # Última resposta POS (Position) de query_position
+        self.firmware_stats = None # Último registro STATS (FirmwareStats) de query_stats
+        self.limit_switch_trip = None # Último LSW (LimitSwitchTrip): passo em que o fim de curso disparou
+        self.homing_report = None # Último HOM (HomingReport): repetibilidade do homing em duas passadas
+        self.metrics = HostMetrics()
+        self.recorder = None # radar_record.SessionRecorder opcional: grava os bytes recebidos e os comandos enviados
+        self._program = None # (ProgramStream, on_segment) do programa em execução
+        self._tracker = CommandTracker(on_resolved=self.metrics.observe_command)
+        self._codec = SerialCodec()
+        self.metrics.add_gauge("host_pending_commands", "Comandos aguardando resposta", lambda: self.pending_count)
+        self.metrics.add_gauge("host_crc_errors", "Quadros binários descartados por CRC",
+                               lambda: self._codec.crc_errors)
+        self._listeners = []
+        self._connection_lost_listeners = []
+        self.events = EventDispatcher() # Eventos tipados de cada linha recebida (chamados na thread de leitura)
+        for record_type, attribute in _LATEST_RECORD_ATTRIBUTES.items():
+            self.events.subscribe(record_type, lambda record, attribute=attribute: setattr(self, attribute, record))
+        self.events.subscribe(SegmentDone, self._program_segment_done)
+        for token in _PROGRAM_END_LINES:
+            self.events.subscribe(token, self._program_ended)
+        self.events.subscribe(ACK_ENABLED, lambda event: setattr(self, "motor_enabled", True))
+        self.events.subscribe(ACK_DISABLED, lambda event: setattr(self, "motor_enabled", False))
+
+    # --- Assinantes ---
+    def add_listener(self, callback):
+        """Registra callback(direcao, linha) chamado para cada linha enviada (TX) ou recebida (RX)."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def add_connection_lost_listener(self, callback):
+        """Registra callback(exc) chamado quando a leitura serial falha."""
+        self._connection_lost_listeners.append(callback)
+
+    def _notify(self, direction, line):
+        for callback in list(self._listeners):
+            callback(direction, line)
+
+    @property
+    def position_degrees(self):
+        """Posição absoluta em graus (0 = HOME, ou a energização se ainda não houve HOME) pela última telemetria."""
+        return None if self.telemetry is None else self.telemetry.position_steps * DEGREES_PER_PULSE
+
+    @property
+    def pending_count(self):
+        """Comandos enviados ainda sem ACK/NACK."""
+        return len(self._tracker)
+
+    def _handle_line(self, line):
+        self.events.dispatch(parse_event(line))
+        self._tracker.feed(line)
+        self._notify(RX, line)
+
+    @property
+    def binary_protocol(self):
+        """True quando o link está no protocolo binário (após request_binary_protocol)."""
+        return self._codec.binary
+
+    def _handle_data(self, data):
+        """Decodifica bytes recebidos e despacha cada linha; assinantes com erro não interrompem a leitura."""
+        start = time.perf_counter()
+        if self.recorder is not None:
+            self.recorder.record_rx(data)
+        lines = self._codec.feed(data)
+        for line in lines:
+            try:
+                self._handle_line(line)
+            except Exception:
+                logger.exception("Erro inesperado ao processar a linha %r", line)
+        self.metrics.observe_received(len(data), len(lines), time.perf_counter() - start)
+
+    def _program_segment_done(self, segment_done):
+        if self._program is None:
+            return
+        stream, on_segment = self._program
+        for command in stream.on_segment_done(segment_done): # Repõe a fila da ESP32
+            self.send_raw(command)
+        if stream.finished:
+            self._program = None
+        if on_segment is not None:
+            on_segment(segment_done)
+
+    def _program_ended(self, event):
+        self._program = None
+
+    def _connection_lost(self, exc):
+        self._tracker.fail_all(ConnectionError(f"Erro de leitura serial: {exc}"))
+        for callback in list(self._connection_lost_listeners):
+            callback(exc)
+
+    # --- Comandos do motor ---
+    def request_binary_protocol(self, **options):
+        """Negocia o protocolo binário; falha com NACK_UNKNOWN_COMMAND em firmwares só-texto (o link continua em texto)."""
+        return self.send(CMD_PROTO_BINARY, PROTO_BINARY_RESPONSES, **options)
+
+    def enable(self, **options):
+        return self.send(CMD_ENABLE, ENABLE_RESPONSES, **options)
+
+    def disable(self, **options):
+        return self.send(CMD_DISABLE, DISABLE_RESPONSES, **options)
+
+    def stop(self, **options):
+        return self.send(CMD_STOP, STOP_RESPONSES, **options)
+
+    def set_direction(self, forward, **options):
+        if forward:
+            return self.send(CMD_DIR_FORWARD, DIR_FORWARD_RESPONSES, **options)
+        return self.send(CMD_DIR_REVERSE, DIR_REVERSE_RESPONSES, **options)
+
+    def move(self, degrees, frequency_hz=50, **options):
+        """Move `degrees` graus na direção atual; resolve em ACK_ANGULO_CONCLUIDO (ou ACK_PARADO)."""
+        return self.send(format_move_command(degrees, frequency_hz), MOVE_RESPONSES, stop_on_cancel=True, **options)
+
+    def move_to(self, degrees, frequency_hz=50, **options):
+        """Move até o ângulo absoluto `degrees` (0 = HOME) pelo caminho mais curto; resolve como `move`."""
+        return self.send(format_move_to_command(degrees, frequency_hz), MOVE_TO_RESPONSES, stop_on_cancel=True,
+                         **options)
+
+    def query_position(self, **options):
+        """Pede a posição absoluta; resolve em ACK_POSICAO, com a resposta já disponível em `position`."""
+        return self.send(CMD_POSITION, POSITION_RESPONSES, **options)
+
+    def query_stats(self, **options):
+        """Pede os contadores do firmware; resolve em ACK_STATS, com o registro já disponível em `firmware_stats`.
+
+        Os mínimos/máximos (período do loop, jitter, tempo de comando) são zerados pelo firmware a cada STATS.
+        """
+        return self.send(CMD_STATS, STATS_RESPONSES, **options)
+
+    def home(self, **options):
+        """Homing com a configuração de `configure_homing`; em duas passadas, o HOM chega antes do ACK final."""
+        return self.send(CMD_HOME, HOME_RESPONSES, stop_on_cancel=True, **options)
+
+    def configure_homing(self, fast_hz, slow_hz=None, backoff_degrees=None, final_backoff_degrees=None, **options):
+        """Velocidades (Hz) da aproximação rápida e da lenta e os recuos (graus) entre elas e até a origem.
+
+        `slow_hz` 0 volta ao homing de uma passada; valores omitidos mantêm a configuração atual do firmware.
+        """
+        command = format_homing_command(fast_hz, slow_hz, backoff_degrees, final_backoff_degrees)
+        return self.send(command, HOMING_CONFIG_RESPONSES, **options)
+
+    def calibrate(self, points, **options):
+        """Envia os pares (teórico, medido) para o ajuste por mínimos quadrados no firmware."""
+        return self.send(format_calibration_command(points), CALIBRATE_RESPONSES, **options)
+
+    def upload_calibration_table(self, corrections, **options):
+        """Envia a tabela de correção (passos, ver radar_calibration.fit_table) em blocos e a aplica.
+
+        Cada CALTAB ADD espera o próprio ACK_CALTAB antes do próximo (um ACK encerraria todos os blocos pendentes);
+        um bloco recusado faz o Future falhar com o NACK dele, sem enviar o APLICAR. Resolve no
+        ACK_CALIBRATION_COMPLETE do CALTAB APLICAR; o firmware a grava na NVS e zera o fator linear.
+        """
+        commands = format_cal_table_commands(corrections)
+        future = Future()
+
+        def send_step(index):
+            responses = CAL_TABLE_APPLY_RESPONSES if index == len(commands) - 1 else CAL_TABLE_ADD_RESPONSES
+            self.send(commands[index], responses, **options).add_done_callback(lambda step: on_step(index, step))
+
+        def on_step(index, step):
+            if future.done(): # Cancelado pelo chamador: o resto da tabela não é enviado
+                return
+            if step.exception() is not None:
+                future.set_exception(step.exception())
+            elif index == len(commands) - 1:
+                future.set_result(step.result())
+            else:
+                try:
+                    send_step(index + 1)
+                except Exception as exc: # Porta fechada entre os blocos
+                    future.set_exception(exc)
+
+        send_step(0)
+        return future
+
+    def reset_calibration(self, **options):
+        return self.send(CMD_RESET_CALIB, RESET_CALIB_RESPONSES, **options)
+
+    def set_telemetry(self, mode, interval=None, **options):
+        """Configura a telemetria: TELEMETRY_OFF, (TELEMETRY_EVERY_N_PULSES, n) ou (TELEMETRY_EVERY_T_MS, t)."""
+        return self.send(format_telemetry_command(mode, interval), TELEMETRY_RESPONSES, **options)
+
+    def scan(self, start_degrees, end_degrees, step_degrees, dwell_ms=0, frequency_hz=50, **options):
+        """Percorre início..fim em incrementos de `step_degrees`, parando `dwell_ms` em cada ponto.
+
+        Cada ponto gera uma linha "SCN <passada> <indice> <posicao>" (ver `scan_point` e os assinantes RX).
+        Resolve em ACK_SCAN_CONCLUIDO (ou ACK_PARADO); cancelar o Future aborta a varredura.
+        """
+        command = format_scan_command(start_degrees, end_degrees, step_degrees, dwell_ms, frequency_hz)
+        return self.send(command, SCAN_RESPONSES, stop_on_cancel=True, **options)
+
+    def sweep(self, start_degrees, end_degrees, step_degrees, dwell_ms=0, frequency_hz=50, **options):
+        """Como `scan`, mas vai e volta entre as extremidades até PARAR (stop() ou cancelar o Future)."""
+        command = format_scan_command(start_degrees, end_degrees, step_degrees, dwell_ms, frequency_hz, continuous=True)
+        return self.send(command, SWEEP_RESPONSES, stop_on_cancel=True, **options)
+
+    def run_program(self, segments, on_segment=None, **options):
+        """Executa uma lista de ProgramSegment na fila da ESP32, sem ida e volta por segmento.
+
+        Programas maiores que a fila são enviados em blocos conforme os segmentos terminam.
+        `on_segment(SegmentDone)` é chamado a cada segmento concluído (na thread de leitura).
+        Resolve em ACK_PROG_CONCLUIDO (ou ACK_PARADO); cancelar o Future aborta o programa.
+        """
+        self._queue_program(segments, on_segment)
+        return self.start_program(**options)
+
+    def load_program(self, segments, on_segment=None, **options):
+        """Carrega o início do programa na fila da ESP32 sem iniciá-lo (ver `start_program`).
+
+        Resolve quando a ESP32 já processou os blocos: um POSICAO enviado em seguida serve de marcador,
+        pois o firmware responde aos comandos na ordem de chegada.
+        """
+        self._queue_program(segments, on_segment)
+        return self.query_position(**options)
+
+    def start_program(self, **options):
+        """Inicia o programa carregado por `load_program`; resolve como `run_program`."""
+        return self.send(CMD_PROGRAM_START, PROGRAM_RESPONSES, stop_on_cancel=True, **options)
+
+    def _queue_program(self, segments, on_segment):
+        stream = ProgramStream(segments)
+        self._program = (stream, on_segment)
+        for command in stream.initial_commands():
+            self.send_raw(command)
+
+    def set_limit_switch_debounce(self, debounce_us, **options):
+        """Janela de debounce (µs) da interrupção do fim de curso; bordas mais próximas que isso são ignoradas."""
+        return self.send(format_debounce_command(debounce_us), DEBOUNCE_RESPONSES, **options)
+
+    def set_backlash(self, steps, **options):
+        """Folga (passos) acrescentada a cada inversão de sentido; gravada na NVS. Refaça o HOME em seguida."""
+        return self.send(format_backlash_command(steps), BACKLASH_RESPONSES, **options)
+
+    def set_ramp(self, profile, max_speed_hz=None, acceleration=None, jerk=None, **options):
+        """Configura a rampa dos próximos movimentos: RAMP_CONSTANT, RAMP_TRAPEZOIDAL ou RAMP_SCURVE.
+
+        `max_speed_hz` limita a frequência de MOVER ANGULO; `acceleration` em passos/s² e `jerk` em passos/s³.
+        """
+        return self.send(format_ramp_command(profile, max_speed_hz, acceleration, jerk), RAMP_RESPONSES, **options)
+
+
+class RadarMotorClient(RadarClientBase):
+    """Controla o motor pela porta serial; cada comando retorna um Future resolvido pelo ACK/NACK correspondente.
+
+    Os Futures resolvem com um `CommandResult` ou falham com `RadarCommandError`
+    (NACK), `TimeoutError` ou `ConnectionError` (porta fechada ou perdida). Cancelar
+    o Future de um movimento (move/home) envia PARAR. Os callbacks RX dos assinantes
+    são chamados na thread de leitura.
+    """
+
+    def __init__(self, port=None, baudrate=BAUD_RATE, serial_port=None):
+        super().__init__()
+        self.port = port
+        self.baudrate = baudrate
+        self._ser = serial_port # Permite injetar uma porta já aberta (ou compatível com pyserial)
+        self._write_lock = threading.Lock()
+        self._reader_thread = None
+        self._running = False
+
+    # --- Conexão ---
+    @property
+    def is_connected(self):
+        return self._running and self._ser is not None and self._ser.is_open
+
+    def connect(self):
+        if self._ser is None:
+            import serial # Só para abrir a porta: com `serial_port` (ex.: SimulatedSerial) o pyserial é dispensável
+            self._ser = serial.Serial(self.port, self.baudrate, timeout=0.1)
+        self._running = True
+        self._reader_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader_thread.start()
+
+    def close(self):
+        if self.is_connected and self.binary_protocol:
+            with self._write_lock:
+                self._ser.write(encode_frame(OP_PROTO_TEXT)) # Deixa a ESP32 em texto para a próxima conexão
+        self._running = False
+        if self._reader_thread and self._reader_thread is not threading.current_thread():
+            self._reader_thread.join(timeout=1.0)
+        self._reader_thread = None
+        if self._ser is not None:
+            self._ser.close()
+            self._ser = None
+        self.motor_enabled = False
+        self._tracker.fail_all(ConnectionError("Porta serial fechada."))
+
+    # --- Envio ---
+    def send_raw(self, command):
+        """Envia uma linha sem aguardar resposta."""
+        if not self.is_connected:
+            raise ConnectionError("Não conectado à porta serial.")
+        self._notify(TX, command) # Antes da escrita, para o TX nunca aparecer depois da resposta
+        if self.recorder is not None:
+            self.recorder.record_tx(command)
+        data = self._codec.encode(command)
+        with self._write_lock:
+            self._ser.write(data)
+        self.metrics.observe_sent(data)
+
+    def send(self, command, responses, stop_on_cancel=False, timeout=None):
+        """Envia `command` e retorna um Future encerrado por uma das `responses` (sucesso, falha).
+
+        Com `timeout` (s) o Future falha com TimeoutError se a resposta não chegar a tempo.
+        Com `stop_on_cancel`, cancelamento ou timeout enviam PARAR ao firmware.
+        """
+        future = Future()
+
+        def on_result(result):
+            if not future.done(): # O chamador pode ter cancelado o Future
+                future.set_result(result)
+
+        def on_error(exc):
+            if not future.done():
+                future.set_exception(exc)
+
+        pending = self._tracker.register(command, responses, on_result, on_error)
+        try:
+            self.send_raw(command)
+        except Exception:
+            self._tracker.discard(pending)
+            raise
+
+        if timeout is not None:
+            timer = threading.Timer(timeout, on_error, args=(TimeoutError(f"{command!r} sem resposta em {timeout} s"),))
+            timer.daemon = True
+            timer.start()
+            future.add_done_callback(lambda _: timer.cancel())
+
+        def on_done(done_future):
+            # Cancelado pelo chamador ou expirado: o comando não será mais aguardado
+            if done_future.cancelled() or isinstance(done_future.exception(), TimeoutError):
+                self._tracker.discard(pending)
+                if stop_on_cancel and self.is_connected:
+                    self.send_raw(CMD_STOP)
+
+        future.add_done_callback(on_done)
+        return future
+
+    # --- Leitura ---
+    def _read_loop(self):
+        """Lê continuamente da porta serial e despacha cada linha recebida."""
+        while self._running:
+            try:
+                # Retorna assim que houver bytes (ou após o timeout da porta, para checar _running)
+                data = self._ser.read(self._ser.in_waiting or 1)
+            except OSError as e: # Inclui serial.SerialException
+                if self._running:
+                    self._running = False
+                    self._connection_lost(e)
+                break
+            if data:
+                self._handle_data(data)
@@ -0,0 +1,242 @@
+"""Vários posicionadores (uma ESP32 por porta serial) controlados em conjunto.
+
+Cada dispositivo é um `RadarMotorClient` com sua própria thread de leitura, de modo que a latência de um
+não depende de quantos outros estão conectados. Os comandos sincronizados passam por uma barreira comum:
+cada dispositivo tem uma thread já pronta que, liberada a barreira, só escreve o comando na sua porta.
+
+Exemplo:
+    manager = RadarDeviceManager()
+    manager.add("azimute", "COM12")
+    manager.add("elevacao", "COM13")
+    manager.connect_all()
+    results = manager.wait_all(manager.move_to_all({"azimute": 90.0, "elevacao": 30.0}, 400), timeout=30)
+    print(format_status_table(manager.status()))
+
+Linha de comando: `python radar_devices.py azimute=COM12 elevacao=COM13` (ou `--sim 2`) mostra o estado
+agregado.
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from radar_client import RadarMotorClient
+from radar_protocol import BAUD_RATE, MOTOR_STATES
+
+STATUS_REFRESH_INTERVAL_S = 1.0 # Período da tabela de estado na linha de comando
+BARRIER_TIMEOUT_S = 5.0 # Tempo máximo para todas as threads chegarem à barreira
+
+DeviceStatus = namedtuple(
+    "DeviceStatus", "name port connected motor_enabled position_degrees referenced state pending")
+
+logger = logging.getLogger(__name__)
+
+
+def _failed_future(exc):
+    future = Future()
+    future.set_exception(exc)
+    return future
+
+
+class RadarDeviceManager:
+    """Conjunto de clientes endereçados por nome; os métodos *_all retornam {nome: Future}."""
+
+    def __init__(self):
+        self._clients = {} # Nome -> RadarMotorClient, na ordem de inclusão
+
+    def add(self, name, port=None, baudrate=BAUD_RATE, serial_port=None):
+        """Registra um dispositivo (ainda não conectado); `serial_port` injeta uma porta já aberta."""
+        if name in self._clients:
+            raise ValueError(f"Dispositivo {name!r} já registrado.")
+        client = RadarMotorClient(port if serial_port is None else serial_port.port, baudrate, serial_port=serial_port)
+        self._clients[name] = client
+        return client
+
+    def remove(self, name):
+        self._clients.pop(name).close()
+
+    def __getitem__(self, name):
+        return self._clients[name]
+
+    def __iter__(self):
+        return iter(self._clients)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def items(self):
+        return self._clients.items()
+
+    # --- Conexão ---
+    def connect_all(self, binary=False, timeout=2.0):
+        """Conecta todos; com `binary`, negocia o protocolo binário em paralelo (quem não suporta fica em texto)."""
+        for client in self._clients.values():
+            if not client.is_connected:
+                client.connect()
+        if binary:
+            futures = {name: client.request_binary_protocol(timeout=timeout) for name, client in self._clients.items()}
+            for name, error in self.wait_all(futures).items():
+                if isinstance(error, Exception):
+                    logger.warning("%s: protocolo binário indisponível (%s); usando texto.", name, error)
+
+    def close_all(self):
+        for client in self._clients.values():
+            client.close()
+
+    # --- Comandos ---
+    def broadcast(self, action, *args, **options):
+        """Chama o método `action` do cliente (ex.: "enable") em todos, sem sincronização."""
+        return {name: self._call(client, lambda c: getattr(c, action)(*args, **options))
+                for name, client in self._clients.items()}
+
+    def synchronized(self, actions):
+        """Executa `actions[nome](cliente)` em todos os dispositivos citados a partir de uma barreira comum.
+
+        As threads são criadas e postas na barreira antes do envio; liberada a barreira, cada uma apenas
+        escreve o comando na sua porta. Retorna {nome: Future} com o Future de cada comando.
+        """
+        barrier = threading.Barrier(len(actions))
+        futures = {}
+
+        def run(name, action):
+            try:
+                barrier.wait(BARRIER_TIMEOUT_S)
+            except threading.BrokenBarrierError as exc:
+                futures[name] = _failed_future(exc)
+                return
+            futures[name] = self._call(self._clients[name], action)
+
+        threads = [threading.Thread(target=run, args=item, daemon=True) for item in actions.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {name: futures[name] for name in actions}
+
+    def move_to_all(self, targets, frequency_hz=50, **options):
+        """Move cada dispositivo de {nome: graus absolutos} com partida simultânea."""
+        return self.synchronized({
+            name: lambda client, degrees=degrees: client.move_to(degrees, frequency_hz, **options)
+            for name, degrees in targets.items()})
+
+    def move_all(self, targets, frequency_hz=50, **options):
+        """Como `move_to_all`, com {nome: graus relativos} na direção atual de cada dispositivo."""
+        return self.synchronized({
+            name: lambda client, degrees=degrees: client.move(degrees, frequency_hz, **options)
+            for name, degrees in targets.items()})
+
+    def scan_all(self, scans, **options):
+        """Inicia juntos os SCAN de {nome: (início, fim, passo, dwell_ms, hz)}."""
+        return self.synchronized({name: lambda client, args=tuple(args): client.scan(*args, **options)
+                                  for name, args in scans.items()})
+
+    def run_programs(self, programs, on_segment=None, load_timeout=5.0, **options):
+        """Carrega os programas de {nome: [ProgramSegment]} em todas as filas e só então os inicia juntos.
+
+        `on_segment(nome, SegmentDone)` é chamado na thread de leitura de cada dispositivo. Um dispositivo
+        que falhe no carregamento recebe o erro no seu Future e não participa da partida.
+        """
+        loads = {}
+        for name, segments in programs.items():
+            callback = None if on_segment is None else (lambda segment, name=name: on_segment(name, segment))
+            loads[name] = self._call(self._clients[name],
+                                     lambda client: client.load_program(segments, callback, timeout=load_timeout))
+        loaded = self.wait_all(loads)
+        futures = {name: _failed_future(error) for name, error in loaded.items() if isinstance(error, Exception)}
+        ready = [name for name in programs if name not in futures]
+        if ready:
+            futures.update(self.synchronized({name: lambda client: client.start_program(**options) for name in ready}))
+        return futures
+
+    def stop_all(self):
+        return self.broadcast("stop")
+
+    @staticmethod
+    def wait_all(futures, timeout=None):
+        """Aguarda {nome: Future}; retorna {nome: CommandResult ou a exceção}. `timeout` vale para o conjunto."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = {}
+        for name, future in futures.items():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                results[name] = future.result(remaining)
+            except Exception as exc:
+                results[name] = exc
+        return results
+
+    @staticmethod
+    def _call(client, action):
+        try:
+            return action(client)
+        except Exception as exc: # Ex.: ConnectionError de um dispositivo desconectado
+            return _failed_future(exc)
+
+    # --- Estado agregado ---
+    def status(self):
+        """Um DeviceStatus por dispositivo, a partir da última telemetria/POS recebida (sem consultar a ESP32)."""
+        statuses = []
+        for name, client in self._clients.items():
+            telemetry, position = client.telemetry, client.position
+            if telemetry is not None:
+                degrees = client.position_degrees % 360
+                state = MOTOR_STATES.get(telemetry.state, str(telemetry.state)).replace("STATE_", "")
+            else:
+                degrees = position.degrees if position is not None else None
+                state = None
+            referenced = position.referenced if position is not None else None
+            statuses.append(DeviceStatus(name, client.port, client.is_connected, client.motor_enabled, degrees,
+                                         referenced, state, client.pending_count))
+        return statuses
+
+
+def format_status_table(statuses):
+    """Tabela de texto com um dispositivo por linha."""
+    lines = [f"{'dispositivo':<14}{'porta':<16}{'conectado':<11}{'habilitado':<12}{'posição':>10}  "
+             f"{'HOME':<6}{'estado':<18}pendentes"]
+    for status in statuses:
+        position = "--" if status.position_degrees is None else f"{status.position_degrees:.2f}°"
+        referenced = "--" if status.referenced is None else ("sim" if status.referenced else "não")
+        lines.append(f"{status.name:<14}{str(status.port):<16}{'sim' if status.connected else 'não':<11}"
+                     f"{'sim' if status.motor_enabled else 'não':<12}{position:>10}  {referenced:<6}"
+                     f"{status.state or '--':<18}{status.pending}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estado agregado de vários posicionadores do radar.")
+    parser.add_argument("devices", nargs="*", metavar="NOME=PORTA", help="Dispositivos (ex.: azimute=COM12)")
+    parser.add_argument("--sim", type=int, default=0, metavar="N", help="Acrescenta N dispositivos simulados")
+    parser.add_argument("--binary", action="store_true", help="Negocia o protocolo binário em todos")
+    parser.add_argument("--interval", type=float, default=STATUS_REFRESH_INTERVAL_S, help="Período da tabela (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+
+    manager = RadarDeviceManager()
+    for device in args.devices:
+        name, separator, port = device.partition("=")
+        if not separator:
+            parser.error(f"Dispositivo {device!r} fora do formato NOME=PORTA.")
+        manager.add(name, port)
+    if args.sim:
+        from radar_sim import SimulatedSerial
+        for index in range(args.sim):
+            manager.add(f"sim{index}", serial_port=SimulatedSerial())
+    if not len(manager):
+        parser.error("Informe ao menos um dispositivo (NOME=PORTA ou --sim N).")
+
+    manager.connect_all(binary=args.binary)
+    try:
+        while True:
+            manager.broadcast("query_position", timeout=args.interval)
+            time.sleep(args.interval)
+            print(format_status_table(manager.status()), end="\n\n", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Eventos tipados do protocolo e despacho por tabela para assinantes.
+
+Cada linha recebida é convertida uma única vez por `parse_event`: registros (TLM, SCN, SEG, POS, STATS,
+LSW, HOM) viram os namedtuples de radar_protocol; tokens viram `Ack`, `Nack` ou `FirmwareWarning`; o resto
+(eco dos comandos, mensagens de depuração) vira `Log`. O `EventDispatcher` entrega cada evento aos
+assinantes do token exato e aos do tipo, por consulta a dicionário, sem cadeia de comparações.
+
+Exemplo:
+    client.events.subscribe("ACK_HOMING_CONCLUIDO", lambda event: print("homing ok"))
+    client.events.subscribe(Nack, lambda event: print("recusado:", event.token))
+"""
+import logging
+from collections import namedtuple
+
+from radar_protocol import (
+    TELEMETRY_PREFIX, SCAN_PREFIX, SEGMENT_PREFIX, POSITION_PREFIX, STATS_PREFIX, LIMIT_SWITCH_PREFIX, HOMING_PREFIX,
+    STATUS_CODES, parse_telemetry, parse_scan_point, parse_segment_done, parse_position, parse_stats,
+    parse_limit_switch_trip, parse_homing_report,
+)
+
+Ack = namedtuple("Ack", "token")
+Nack = namedtuple("Nack", "token")
+FirmwareWarning = namedtuple("FirmwareWarning", "token") # WARNING_* (fim de curso, backoff)
+Log = namedtuple("Log", "text") # Eco de comandos, depuração e linhas desconhecidas
+
+# Primeira palavra da linha -> parser do registro
+RECORD_PARSERS = {
+    TELEMETRY_PREFIX.strip(): parse_telemetry,
+    SCAN_PREFIX.strip(): parse_scan_point,
+    SEGMENT_PREFIX.strip(): parse_segment_done,
+    POSITION_PREFIX.strip(): parse_position,
+    STATS_PREFIX.strip(): parse_stats,
+    LIMIT_SWITCH_PREFIX.strip(): parse_limit_switch_trip,
+    HOMING_PREFIX.strip(): parse_homing_report,
+}
+# Prefixo do token -> tipo do evento
+TOKEN_TYPES = {"ACK": Ack, "NACK": Nack, "WARNING": FirmwareWarning}
+
+logger = logging.getLogger(__name__)
+
+
+def _token_event(line):
+    if " " in line:
+        return None
+    event_type = TOKEN_TYPES.get(line.partition("_")[0])
+    return event_type(line) if event_type is not None else None
+
+
+# Vocabulário conhecido do firmware, classificado uma vez; tokens novos caem na classificação pelo prefixo
+_KNOWN_TOKENS = {token: _token_event(token) for token in STATUS_CODES.values()}
+
+
+def parse_event(line):
+    """Converte uma linha recebida no evento correspondente (nunca None)."""
+    event = _KNOWN_TOKENS.get(line)
+    if event is not None:
+        return event
+    parser = RECORD_PARSERS.get(line.partition(" ")[0])
+    if parser is not None:
+        record = parser(line)
+        if record is not None:
+            return record
+        return Log(line) # Registro malformado: apenas para o log
+    return _token_event(line) or Log(line)
+
+
+class EventDispatcher:
+    """Assinantes por token exato (ex.: "ACK_PARADO"), por tipo de evento (ex.: Nack) ou de todos (None).
+
+    Cada evento chama, nesta ordem, os assinantes do token, do tipo e os de todos os eventos. Um assinante
+    com erro é registrado no log e não impede os demais. `subscribe` pode ser chamado de qualquer thread.
+    """
+
+    def __init__(self):
+        self._subscribers = {} # Token, tipo ou None -> tupla de callbacks (substituída, nunca alterada)
+
+    def subscribe(self, kind, callback):
+        self._subscribers[kind] = self._subscribers.get(kind, ()) + (callback,)
+
+    def unsubscribe(self, kind, callback):
+        callbacks = list(self._subscribers.get(kind, ()))
+        callbacks.remove(callback)
+        self._subscribers[kind] = tuple(callbacks)
+
+    def dispatch(self, event):
+        subscribers = self._subscribers
+        token = getattr(event, "token", None)
+        callbacks = subscribers.get(token, ()) if token is not None else ()
+        callbacks += subscribers.get(type(event), ()) + subscribers.get(None, ())
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Erro no assinante de %r", event)
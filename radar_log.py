@@ -0,0 +1,106 @@
+"""Buffer circular do log de comunicação, com filtros e gravação opcional em arquivo rotativo.
+
+Não depende de Tk: a GUI desenha apenas a cauda filtrada (`LogBuffer.tail`), enquanto o
+buffer guarda as últimas `capacity` linhas e o arquivo (se habilitado) guarda tudo.
+"""
+import logging
+import logging.handlers
+from collections import deque, namedtuple
+
+LOG_BUFFER_CAPACITY = 20000 # Linhas mantidas em memória
+LOG_SPILL_MAX_BYTES = 10 * 1024 * 1024 # Tamanho de cada arquivo antes de rotacionar
+LOG_SPILL_BACKUP_COUNT = 5 # Arquivos antigos mantidos (motor_radar.log.1 ... .5)
+LOG_SPILL_FLUSH_RECORDS = 200 # Registros acumulados antes de escrever no disco
+
+LogRecord = namedtuple("LogRecord", "level prefix text")
+
+
+def classify_line(line):
+    """Retorna (nível, prefixo) de uma linha recebida do firmware.
+
+    ACK_* são INFO, WARNING_* são WARNING, NACK_* são ERROR e as mensagens de depuração
+    ("PULSE_COUNT: 12", "MOTOR_CTRL_TASK: ...", "HOME: ...") são DEBUG com o prefixo antes de ':'.
+    """
+    if line.startswith("NACK_"):
+        return logging.ERROR, line
+    if line.startswith("WARNING_"):
+        return logging.WARNING, line
+    if line.startswith("ACK_"):
+        return logging.INFO, line
+    return logging.DEBUG, line.split(":", 1)[0]
+
+
+class LogBuffer:
+    """Guarda as últimas `capacity` mensagens e aplica filtros de nível e prefixo."""
+
+    def __init__(self, capacity=LOG_BUFFER_CAPACITY):
+        self._records = deque(maxlen=capacity)
+        self.min_level = logging.DEBUG
+        self.hidden_prefixes = frozenset()
+        self._spill_logger = None
+        self._spill_handler = None
+        self._spill_file_handler = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, text, line=None):
+        """Adiciona uma mensagem; `line` é a linha original do firmware, usada para classificá-la."""
+        if line is not None:
+            level, prefix = classify_line(line)
+        else: # Mensagens da própria GUI/cliente
+            level, prefix = (logging.ERROR if text.startswith("Erro") else logging.INFO), ""
+        record = LogRecord(level, prefix, text)
+        self._records.append(record)
+        if self._spill_logger is not None:
+            self._spill_logger.log(level, text)
+        return record
+
+    def accepts(self, record):
+        return record.level >= self.min_level and record.prefix not in self.hidden_prefixes
+
+    def set_filter(self, min_level=None, hidden_prefixes=None):
+        if min_level is not None:
+            self.min_level = min_level
+        if hidden_prefixes is not None:
+            self.hidden_prefixes = frozenset(hidden_prefixes)
+
+    def tail(self, count):
+        """Textos das últimas `count` mensagens aceitas pelo filtro, em ordem cronológica."""
+        lines = []
+        for record in reversed(self._records):
+            if self.accepts(record):
+                lines.append(record.text)
+                if len(lines) >= count:
+                    break
+        lines.reverse()
+        return lines
+
+    # --- Gravação em arquivo ---
+    @property
+    def spill_path(self):
+        return self._spill_file_handler.baseFilename if self._spill_file_handler else None
+
+    def open_spill(self, path, max_bytes=LOG_SPILL_MAX_BYTES, backup_count=LOG_SPILL_BACKUP_COUNT):
+        """Grava todas as mensagens (sem filtro) em `path`, rotacionando por tamanho."""
+        self.close_spill()
+        self._spill_file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes,
+                                                                        backupCount=backup_count, encoding="utf-8")
+        self._spill_file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        # Escrita em lotes: só vai ao disco a cada LOG_SPILL_FLUSH_RECORDS registros (ou num erro)
+        self._spill_handler = logging.handlers.MemoryHandler(LOG_SPILL_FLUSH_RECORDS, flushLevel=logging.ERROR,
+                                                             target=self._spill_file_handler)
+        self._spill_logger = logging.getLogger(f"{__name__}.spill.{id(self)}")
+        self._spill_logger.setLevel(logging.DEBUG)
+        self._spill_logger.propagate = False
+        self._spill_logger.addHandler(self._spill_handler)
+
+    def close_spill(self):
+        if self._spill_handler is None:
+            return
+        self._spill_logger.removeHandler(self._spill_handler)
+        self._spill_handler.close() # Descarrega o que falta
+        self._spill_file_handler.close()
+        self._spill_handler = None
+        self._spill_file_handler = None
+        self._spill_logger = None
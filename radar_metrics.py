@@ -0,0 +1,180 @@
+"""Métricas do host (cliente serial e GUI) e exportação no formato texto do Prometheus.
+
+`HostMetrics` é preenchido pelo cliente (bytes e linhas recebidos, tempo de processamento
+por linha, latência comando -> resposta) e aceita medidores registrados por quem tem filas
+(ex.: a fila de eventos da GUI). `render_prometheus` inclui também o último `FirmwareStats`
+recebido em resposta ao STATS, de modo que um único texto mostra os dois lados do link.
+"""
+import bisect
+import threading
+
+# Limites superiores (s) dos histogramas; +Inf é implícito
+LATENCY_BUCKETS_S = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+LINE_BUCKETS_S = (0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01)
+METRIC_PREFIX = "radar"
+
+# Campos de FirmwareStats: (nome da métrica, tipo, descrição)
+FIRMWARE_METRICS = {
+    "loops": ("firmware_loops_total", "counter", "Iterações do loop() desde o reset"),
+    "loop_min_us": ("firmware_loop_period_min_us", "gauge", "Menor período do loop() desde o STATS anterior"),
+    "loop_max_us": ("firmware_loop_period_max_us", "gauge", "Maior período do loop() desde o STATS anterior"),
+    "step_jitter_max_us": ("firmware_step_jitter_max_us", "gauge",
+                           "Maior desvio entre o intervalo programado e o medido na ISR de passos"),
+    "rx_bytes": ("firmware_rx_bytes_total", "counter", "Bytes recebidos pela ESP32"),
+    "tx_bytes": ("firmware_tx_bytes_total", "counter", "Bytes enviados pela ESP32"),
+    "commands": ("firmware_commands_total", "counter", "Comandos processados"),
+    "command_total_us": ("firmware_command_time_us_total", "counter", "Tempo total em process_serial_command"),
+    "command_max_us": ("firmware_command_time_max_us", "gauge", "Maior tempo de um comando desde o STATS anterior"),
+}
+
+
+def command_name(command):
+    """Rótulo de um comando para as métricas: até duas palavras, sem os argumentos numéricos."""
+    words = []
+    for word in command.split()[:2]:
+        if any(character.isdigit() for character in word):
+            break
+        words.append(word)
+    return " ".join(words) or command
+
+
+class Histogram:
+    """Histograma cumulativo no estilo Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_S):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Último = acima do maior limite
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        """Estimativa do quantil pelo limite superior do bucket; None sem amostras."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def cumulative(self):
+        """Pares (limite, contagem acumulada), terminando em +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class HostMetrics:
+    """Contadores e histogramas do lado do host; seguro para a thread de leitura e a thread da GUI."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.lines_received = 0
+        self.commands_sent = 0
+        self.line_processing = Histogram(LINE_BUCKETS_S) # Decodificação + despacho, por linha
+        self.command_latency = {} # Rótulo do comando -> Histogram (envio até a resposta final)
+        self.command_failures = {} # Rótulo do comando -> NACKs/avisos recebidos
+        self._gauges = {} # Nome -> (descrição, callback sem argumentos)
+
+    def add_gauge(self, name, description, callback):
+        """Registra um medidor lido no momento da exportação (ex.: profundidade de uma fila)."""
+        self._gauges[name] = (description, callback)
+
+    def observe_sent(self, data):
+        with self._lock:
+            self.bytes_sent += len(data)
+            self.commands_sent += 1
+
+    def observe_received(self, byte_count, line_count, seconds):
+        """Um bloco lido da porta: `seconds` é o tempo para decodificar e despachar suas linhas."""
+        with self._lock:
+            self.bytes_received += byte_count
+            self.lines_received += line_count
+            for _ in range(line_count):
+                self.line_processing.observe(seconds / line_count)
+
+    def observe_command(self, command, response, latency, failed=False):
+        name = command_name(command)
+        with self._lock:
+            self.command_latency.setdefault(name, Histogram()).observe(latency)
+            if failed:
+                self.command_failures[name] = self.command_failures.get(name, 0) + 1
+
+    def latency_summary(self, fraction=0.95):
+        """{rótulo: (amostras, quantil em s)} dos comandos, do mais frequente para o menos."""
+        with self._lock:
+            items = [(name, (histogram.count, histogram.quantile(fraction)))
+                     for name, histogram in self.command_latency.items()]
+        return dict(sorted(items, key=lambda item: -item[1][0]))
+
+    def gauges(self):
+        values = {}
+        for name, (_, callback) in list(self._gauges.items()):
+            try:
+                values[name] = callback()
+            except Exception: # Fonte já fechada: o medidor apenas some da exportação
+                continue
+        return values
+
+    def render_prometheus(self, firmware_stats=None):
+        """Texto no formato de exposição do Prometheus (host e, se houver, o último STATS do firmware)."""
+        lines = []
+
+        def metric(name, kind, description, samples):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {description}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{full_name}{labels} {_format_value(value)}")
+
+        with self._lock:
+            metric("host_rx_bytes_total", "counter", "Bytes lidos da porta serial", [("", self.bytes_received)])
+            metric("host_tx_bytes_total", "counter", "Bytes escritos na porta serial", [("", self.bytes_sent)])
+            metric("host_rx_lines_total", "counter", "Linhas/quadros recebidos", [("", self.lines_received)])
+            metric("host_commands_sent_total", "counter", "Comandos enviados", [("", self.commands_sent)])
+            metric("host_line_processing_seconds", "histogram", "Decodificação e despacho por linha recebida",
+                   _histogram_samples(self.line_processing, ""))
+            latency_samples = []
+            for name, histogram in sorted(self.command_latency.items()):
+                latency_samples += _histogram_samples(histogram, f'command="{name}"')
+            metric("host_command_latency_seconds", "histogram", "Envio do comando até a resposta final",
+                   latency_samples)
+            metric("host_command_failures_total", "counter", "Comandos encerrados por NACK ou aviso",
+                   [(f'{{command="{name}"}}', count) for name, count in sorted(self.command_failures.items())])
+        for name, value in self.gauges().items():
+            metric(name, "gauge", self._gauges[name][0], [("", value)])
+        if firmware_stats is not None:
+            for field, value in firmware_stats._asdict().items():
+                name, kind, description = FIRMWARE_METRICS[field]
+                metric(name, kind, description, [("", value)])
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _histogram_samples(histogram, labels):
+    separator = "," if labels else ""
+    samples = [(f'_bucket{{{labels}{separator}le="{_format_value(bound)}"}}', count)
+               for bound, count in histogram.cumulative()]
+    wrapped = f"{{{labels}}}" if labels else ""
+    samples.append((f"_sum{wrapped}", histogram.sum))
+    samples.append((f"_count{wrapped}", histogram.count))
+    return samples
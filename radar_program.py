@@ -0,0 +1,132 @@
+"""Programas de movimento: leitura de arquivos CSV/JSON e envio em blocos para a fila da ESP32.
+
+Um programa é uma lista de `ProgramSegment(forward, degrees, frequency_hz, dwell_ms)`. Nos
+arquivos cada segmento tem as colunas/chaves `direcao` (FRENTE ou RE), `graus`,
+`frequencia_hz` e `dwell_ms`:
+
+    direcao,graus,frequencia_hz,dwell_ms
+    FRENTE,90,400,100
+    RE,45,400,0
+
+    [{"direcao": "FRENTE", "graus": 90, "frequencia_hz": 400, "dwell_ms": 100}]
+"""
+import csv
+import json
+import os
+
+from radar_calibration import StepConverter
+from radar_protocol import (
+    CMD_PROGRAM_CLEAR, DIRECTION_FORWARD, DIRECTION_REVERSE, MAX_STEP_FREQUENCY_HZ, PROGRAM_MAX_SEGMENTS_PER_COMMAND,
+    PROGRAM_QUEUE_SIZE, ProgramSegment, format_program_add_command,
+)
+
+PROGRAM_FIELDS = ("direcao", "graus", "frequencia_hz", "dwell_ms")
+
+
+def make_segment(direction, degrees, frequency_hz, dwell_ms=0):
+    """Cria um ProgramSegment validado; `direction` é FRENTE/RE (texto) ou um bool (True = FRENTE)."""
+    if isinstance(direction, str):
+        name = direction.strip().upper()
+        if name not in (DIRECTION_FORWARD, DIRECTION_REVERSE):
+            raise ValueError(f"Direção inválida: {direction!r} (use {DIRECTION_FORWARD} ou {DIRECTION_REVERSE})")
+        forward = name == DIRECTION_FORWARD
+    else:
+        forward = bool(direction)
+    segment = ProgramSegment(forward, float(degrees), int(frequency_hz), int(dwell_ms))
+    if not 0 < segment.degrees <= 360:
+        raise ValueError(f"Ângulo fora do intervalo (0, 360]: {segment.degrees}")
+    if not 1 <= segment.frequency_hz <= MAX_STEP_FREQUENCY_HZ:
+        raise ValueError(f"Frequência fora do intervalo [1, {MAX_STEP_FREQUENCY_HZ}]: {segment.frequency_hz}")
+    if not 0 <= segment.dwell_ms < 2 ** 32:
+        raise ValueError(f"Dwell inválido: {segment.dwell_ms}")
+    return segment
+
+
+def _segments_from_rows(rows, path):
+    segments = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            segments.append(make_segment(*(row[field] for field in PROGRAM_FIELDS)))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: segmento {number} inválido: {e}") from e
+    return segments
+
+
+def load_program(path):
+    """Lê um programa de um arquivo .csv ou .json."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            return _segments_from_rows(csv.DictReader(f), path)
+        if extension == ".json":
+            return _segments_from_rows(json.load(f), path)
+    raise ValueError(f"Formato de programa não suportado: {path} (use .csv ou .json)")
+
+
+def save_program(path, segments):
+    """Grava um programa em .csv ou .json, no mesmo formato aceito por load_program."""
+    rows = [dict(zip(PROGRAM_FIELDS, (DIRECTION_FORWARD if s.forward else DIRECTION_REVERSE, s.degrees,
+                                      s.frequency_hz, s.dwell_ms)))
+            for s in segments]
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            writer = csv.DictWriter(f, fieldnames=PROGRAM_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        elif extension == ".json":
+            json.dump(rows, f, indent=2)
+        else:
+            raise ValueError(f"Formato de programa não suportado: {path} (use .csv ou .json)")
+
+
+def predict_steps(segments, converter=None):
+    """Pulsos de cada segmento como o firmware os calcula (ponto fixo com resto, sem a tabela de correção).
+
+    `converter` (StepConverter) informa o fator de calibração e o resto deixado por movimentos anteriores; o padrão
+    é o estado após HOME. A soma com sinal dos pulsos é o deslocamento total previsto do programa.
+    """
+    converter = converter if converter is not None else StepConverter()
+    return [converter.segment(segment.forward, segment.degrees) for segment in segments]
+
+
+class ProgramStream:
+    """Divide um programa em comandos PROG ADD sem exceder a fila da ESP32.
+
+    `initial_commands()` limpa a fila e a preenche; depois, a cada registro SEG
+    (`on_segment_done`) retorna os PROG ADD que cabem no espaço liberado. Se os
+    segmentos forem mais curtos que a latência serial, a fila pode esvaziar antes
+    da reposição e o firmware encerra o programa (ACK_PROG_CONCLUIDO) mais cedo.
+    """
+
+    def __init__(self, segments, capacity=PROGRAM_QUEUE_SIZE, chunk_size=PROGRAM_MAX_SEGMENTS_PER_COMMAND):
+        self.segments = list(segments)
+        if not self.segments:
+            raise ValueError("Programa vazio.")
+        self.capacity = capacity
+        self.chunk_size = min(chunk_size, capacity)
+        self.sent = 0 # Segmentos já enviados à fila
+        self.completed = 0 # Segmentos concluídos (registros SEG)
+
+    @property
+    def finished(self):
+        return self.completed >= len(self.segments)
+
+    def initial_commands(self):
+        self.sent = 0
+        self.completed = 0
+        return [CMD_PROGRAM_CLEAR] + self._top_up()
+
+    def on_segment_done(self, segment_done):
+        self.completed = max(self.completed, segment_done.index + 1)
+        return self._top_up()
+
+    def _top_up(self):
+        commands = []
+        while self.sent < len(self.segments):
+            count = min(self.chunk_size, len(self.segments) - self.sent)
+            if self.capacity - (self.sent - self.completed) < count:
+                break # Espera liberar espaço para um bloco inteiro
+            commands.append(format_program_add_command(self.segments[self.sent:self.sent + count]))
+            self.sent += count
+        return commands
@@ -0,0 +1,681 @@
+"""Protocolo serial entre o host e o firmware do motor (programa_radar_controle.txt).
+
+Este módulo não depende de Tk nem de pyserial: contém os nomes dos comandos, os tokens
+de resposta da ESP32, a correlação comando -> ACK/NACK usada pelos clientes e a
+codificação dos modos texto e binário.
+"""
+import binascii
+import struct
+import threading
+import time
+from collections import namedtuple
+from dataclasses import dataclass
+
+BAUD_RATE = 115200
+PULSES_PER_REVOLUTION = 3200 # Igual ao firmware
+DEGREES_PER_PULSE = 360.0 / PULSES_PER_REVOLUTION
+ANGLE_UNITS_PER_DEGREE = 1000 # Resolução dos ângulos comandados na conversão em passos do firmware
+STEP_FIXED_SHIFT = 32 # Bits fracionários dos passos em ponto fixo (update_step_conversion)
+MAX_STEP_FREQUENCY_HZ = 20000 # Maior velocidade máxima aceita pelo comando RAMPA
+DEFAULT_MAX_SPEED_HZ = 2000 # Velocidade máxima do firmware após o reset
+
+# Estados da máquina de estados do firmware (MotorControlState)
+MOTOR_STATES = {
+    0: "STATE_IDLE",
+    1: "STATE_MOVING_ANGULAR",
+    2: "STATE_HOMING_SEARCHING",
+    3: "STATE_HOMING_PAUSE",
+    4: "STATE_HOMING_BACKTRACK",
+    5: "STATE_AUTO_BACKOFF",
+    6: "STATE_STOPPING_REQUESTED",
+    7: "STATE_SCAN_MOVING",
+    8: "STATE_SCAN_DWELL",
+    9: "STATE_PROGRAM_MOVING",
+    10: "STATE_PROGRAM_DWELL",
+}
+
+# --- Comandos aceitos pelo firmware (process_serial_command) ---
+CMD_ENABLE = "HABILITAR"
+CMD_DISABLE = "DESABILITAR"
+CMD_STOP = "PARAR"
+CMD_DIR_FORWARD = "DIR FRENTE"
+CMD_DIR_REVERSE = "DIR RE"
+CMD_MOVE_ANGLE = "MOVER ANGULO"
+CMD_HOME = "HOME"
+CMD_CALIBRATE = "CALIBRAR"
+CMD_RESET_CALIB = "RESET_CALIB"
+CMD_PROTO_BINARY = "PROTO BIN"
+CMD_TELEMETRY = "TELEMETRIA"
+CMD_RAMP = "RAMPA"
+CMD_SCAN = "SCAN"
+CMD_SWEEP = "VARREDURA"
+CMD_PROGRAM_ADD = "PROG ADD"
+CMD_PROGRAM_START = "PROG INICIAR"
+CMD_PROGRAM_CLEAR = "PROG LIMPAR"
+CMD_MOVE_TO = "MOVER_PARA"
+CMD_POSITION = "POSICAO"
+CMD_STATS = "STATS"
+CMD_DEBOUNCE = "DEBOUNCE"
+CMD_HOMING_CONFIG = "HOMING"
+CMD_CAL_TABLE_ADD = "CALTAB ADD"
+CMD_CAL_TABLE_APPLY = "CALTAB APLICAR"
+CMD_BACKLASH = "FOLGA"
+
+# Modos do comando TELEMETRIA
+TELEMETRY_OFF = "OFF"
+TELEMETRY_EVERY_N_PULSES = "PULSOS"
+TELEMETRY_EVERY_T_MS = "MS"
+
+# Perfis do comando RAMPA
+RAMP_CONSTANT = "CONSTANTE"
+RAMP_TRAPEZOIDAL = "TRAPEZIO"
+RAMP_SCURVE = "SCURVE"
+RAMP_PROFILES = (RAMP_CONSTANT, RAMP_TRAPEZOIDAL, RAMP_SCURVE)
+
+# Fila de segmentos do firmware (PROG ADD / PROG INICIAR)
+PROGRAM_QUEUE_SIZE = 64 # Igual ao firmware
+PROGRAM_MAX_SEGMENTS_PER_COMMAND = 11 # Segmentos por PROG ADD (cabem em um quadro binário)
+DIRECTION_FORWARD = "FRENTE"
+DIRECTION_REVERSE = "RE"
+
+# --- Respostas enviadas pelo firmware ---
+ACK_UART_READY = "ACK_UART_READY"
+ACK_ENABLED = "ACK_HABILITADO"
+ACK_DISABLED = "ACK_DESABILITADO"
+ACK_STOPPED = "ACK_PARADO"
+ACK_DIR_FORWARD = "ACK_DIR_FRENTE"
+ACK_DIR_REVERSE = "ACK_DIR_RE"
+ACK_MOVE_STARTED = "ACK_MOVIMENTO_INICIADO"
+ACK_ANGLE_DONE = "ACK_ANGULO_CONCLUIDO"
+ACK_HOMING_STARTED = "ACK_HOMING_STARTED"
+ACK_HOMING_DONE = "ACK_HOMING_CONCLUIDO"
+ACK_NOT_HOMED = "ACK_NOT_HOMED"
+ACK_LIMIT_SWITCH_RESET = "ACK_LIMIT_SWITCH_RESET"
+ACK_AUTO_BACKOFF_COMPLETE = "ACK_AUTO_BACKOFF_COMPLETE"
+ACK_CALIBRATION_COMPLETE = "ACK_CALIBRATION_COMPLETE"
+ACK_CALIBRATION_RESET = "ACK_CALIBRATION_RESET"
+ACK_PROTO_BINARY = "ACK_PROTO_BIN"
+ACK_PROTO_TEXT = "ACK_PROTO_TEXT"
+ACK_TELEMETRY = "ACK_TELEMETRIA"
+ACK_RAMP = "ACK_RAMPA"
+ACK_SCAN_STARTED = "ACK_SCAN_INICIADO"
+ACK_SCAN_DONE = "ACK_SCAN_CONCLUIDO"
+ACK_PROGRAM_ADDED = "ACK_PROG_ADICIONADO"
+ACK_PROGRAM_STARTED = "ACK_PROG_INICIADO"
+ACK_PROGRAM_DONE = "ACK_PROG_CONCLUIDO"
+ACK_PROGRAM_CLEARED = "ACK_PROG_LIMPO"
+ACK_POSITION = "ACK_POSICAO"
+ACK_STATS = "ACK_STATS"
+ACK_DEBOUNCE = "ACK_DEBOUNCE"
+ACK_HOMING_CONFIG = "ACK_HOMING_CONFIG"
+ACK_CAL_TABLE = "ACK_CALTAB"
+ACK_BACKLASH = "ACK_FOLGA"
+
+NACK_MOTOR_DISABLED = "NACK_MOTOR_DESABILITADO"
+NACK_MOTOR_BUSY = "NACK_MOTOR_OCUPADO"
+NACK_ANGLE_RANGE = "NACK_ANGULO_RANGE_INVALIDO"
+NACK_ANGLE_INVALID = "NACK_ANGULO_INVALIDO"
+NACK_HOMING_INTERRUPTED = "NACK_HOMING_FAILED_INTERRUPTED"
+NACK_CALIBRATION_INCOMPLETE = "NACK_CALIBRATION_DATA_INCOMPLETE"
+NACK_CALIBRATION_ERROR = "NACK_CALIBRATION_ERROR"
+NACK_CALIBRATION_FACTOR_ZERO = "NACK_CALIBRATION_FACTOR_ZERO"
+NACK_UNKNOWN_COMMAND = "NACK_UNKNOWN_COMMAND"
+NACK_FRAME_CRC = "NACK_FRAME_CRC"
+NACK_FRAME_MALFORMED = "NACK_FRAME_MALFORMED"
+NACK_TELEMETRY_INVALID = "NACK_TELEMETRIA_INVALIDA"
+NACK_RAMP_INVALID = "NACK_RAMPA_INVALIDA"
+NACK_SCAN_INVALID = "NACK_SCAN_INVALIDO"
+NACK_PROGRAM_INVALID = "NACK_PROG_INVALIDO"
+NACK_PROGRAM_FULL = "NACK_PROG_CHEIO"
+NACK_PROGRAM_EMPTY = "NACK_PROG_VAZIO"
+NACK_DEBOUNCE_INVALID = "NACK_DEBOUNCE_INVALIDO"
+NACK_HOMING_INVALID = "NACK_HOMING_INVALIDO"
+NACK_CAL_TABLE_INVALID = "NACK_CALTAB_INVALIDA"
+NACK_BACKLASH_INVALID = "NACK_FOLGA_INVALIDA"
+
+# Registro de progresso: "TLM <posicao_passos> <pulsos_restantes> <estado>"
+TELEMETRY_PREFIX = "TLM "
+# Registro de cada ponto de SCAN/VARREDURA: "SCN <passada> <indice> <posicao_passos>"
+SCAN_PREFIX = "SCN "
+# Segmento do programa concluído: "SEG <indice> <posicao_passos>"
+SEGMENT_PREFIX = "SEG "
+# Resposta ao POSICAO: "POS <posicao_passos> <graus_0_360> <referenciado>" (referenciado = HOME desde a energização)
+POSITION_PREFIX = "POS "
+# Resposta ao STATS (contadores do firmware; mín./máx. desde o STATS anterior):
+# "STATS <loops> <loop_min_us> <loop_max_us> <step_jitter_max_us> <rx_bytes> <tx_bytes> <comandos> <comandos_total_us> <comando_max_us>"
+STATS_PREFIX = "STATS "
+# Passo em que o fim de curso disparou (travado pela interrupção), antes do WARNING_LIMIT_SWITCH_HIT ou do homing:
+# "LSW <posicao_passos>"
+LIMIT_SWITCH_PREFIX = "LSW "
+LIMIT_SWITCH_MAX_DEBOUNCE_US = 100000 # Igual ao firmware
+# Repetibilidade do homing em duas passadas, antes do ACK_HOMING_CONCLUIDO (posição do sensor em cada aproximação):
+# "HOM <posicao_rapida> <posicao_lenta> <delta_passos>" (delta = lenta - rápida)
+HOMING_PREFIX = "HOM "
+HOMING_MAX_BACKOFF_DEGREES = 90.0 # Igual ao firmware
+
+# Calibração: CALIBRAR ajusta fator/offset linear; CALTAB envia a tabela de correção (passos em pontos
+# igualmente espaçados de uma volta, a partir do HOME) que o firmware expande em uma tabela por passo
+CALIBRATION_MAX_POINTS = 15 # Pares por CALIBRAR (cabem em um quadro binário)
+CAL_TABLE_MAX_POINTS = 72 # Igual ao firmware (um ponto a cada 5°)
+CAL_TABLE_MAX_VALUES_PER_COMMAND = 12 # Valores por CALTAB ADD (cabem em um quadro binário)
+CAL_TABLE_MAX_CORRECTION_STEPS = 400.0 # Igual ao firmware
+BACKLASH_MAX_STEPS = 400 # Folga compensada nas inversões de sentido (FOLGA), igual ao firmware
+
+WARNING_LIMIT_SWITCH_ACTIVE = "WARNING_LIMIT_SWITCH_ACTIVE"
+WARNING_LIMIT_SWITCH_HIT = "WARNING_LIMIT_SWITCH_HIT"
+WARNING_AUTO_BACKOFF_STUCK = "WARNING_AUTO_BACKOFF_STUCK"
+
+# NACKs emitidos de forma síncrona por process_serial_command: pertencem ao comando
+# que acabou de ser enviado, e não a um movimento que já estava em andamento.
+IMMEDIATE_NACKS = frozenset({
+    NACK_MOTOR_DISABLED,
+    NACK_MOTOR_BUSY,
+    NACK_ANGLE_RANGE,
+    NACK_ANGLE_INVALID,
+    NACK_CALIBRATION_INCOMPLETE,
+    NACK_TELEMETRY_INVALID,
+    NACK_RAMP_INVALID,
+    NACK_SCAN_INVALID,
+    NACK_PROGRAM_INVALID,
+    NACK_PROGRAM_FULL,
+    NACK_PROGRAM_EMPTY,
+    NACK_DEBOUNCE_INVALID,
+    NACK_HOMING_INVALID,
+    NACK_CAL_TABLE_INVALID,
+    NACK_BACKLASH_INVALID,
+    NACK_UNKNOWN_COMMAND,
+    NACK_FRAME_CRC,
+    NACK_FRAME_MALFORMED,
+})
+# Falhas aceitas por qualquer comando: o firmware não reconheceu ou não recebeu o comando
+COMMON_FAILURES = frozenset({NACK_UNKNOWN_COMMAND, NACK_FRAME_CRC, NACK_FRAME_MALFORMED})
+
+# Respostas que encerram cada comando: (sucesso, falha)
+ENABLE_RESPONSES = ({ACK_ENABLED}, set())
+DISABLE_RESPONSES = ({ACK_DISABLED}, set())
+STOP_RESPONSES = ({ACK_STOPPED, NACK_HOMING_INTERRUPTED}, set())
+DIR_FORWARD_RESPONSES = ({ACK_DIR_FORWARD}, set())
+DIR_REVERSE_RESPONSES = ({ACK_DIR_REVERSE}, set())
+MOVE_RESPONSES = (
+    {ACK_ANGLE_DONE, ACK_STOPPED},
+    {NACK_MOTOR_DISABLED, NACK_MOTOR_BUSY, NACK_ANGLE_RANGE, NACK_ANGLE_INVALID, WARNING_LIMIT_SWITCH_HIT},
+)
+HOME_RESPONSES = ({ACK_HOMING_DONE}, {NACK_MOTOR_DISABLED, NACK_MOTOR_BUSY, NACK_HOMING_INTERRUPTED})
+CALIBRATE_RESPONSES = (
+    {ACK_CALIBRATION_COMPLETE},
+    {NACK_CALIBRATION_INCOMPLETE, NACK_CALIBRATION_ERROR, NACK_CALIBRATION_FACTOR_ZERO},
+)
+RESET_CALIB_RESPONSES = ({ACK_CALIBRATION_RESET}, set())
+PROTO_BINARY_RESPONSES = ({ACK_PROTO_BINARY}, set())
+TELEMETRY_RESPONSES = ({ACK_TELEMETRY}, {NACK_TELEMETRY_INVALID})
+RAMP_RESPONSES = ({ACK_RAMP}, {NACK_RAMP_INVALID})
+SCAN_FAILURES = {NACK_MOTOR_DISABLED, NACK_MOTOR_BUSY, NACK_SCAN_INVALID, WARNING_LIMIT_SWITCH_HIT}
+SCAN_RESPONSES = ({ACK_SCAN_DONE, ACK_STOPPED}, SCAN_FAILURES)
+SWEEP_RESPONSES = ({ACK_STOPPED}, SCAN_FAILURES) # A varredura só termina com PARAR
+PROGRAM_RESPONSES = (
+    {ACK_PROGRAM_DONE, ACK_STOPPED},
+    {NACK_MOTOR_DISABLED, NACK_MOTOR_BUSY, NACK_PROGRAM_INVALID, NACK_PROGRAM_FULL, NACK_PROGRAM_EMPTY,
+     WARNING_LIMIT_SWITCH_HIT},
+)
+MOVE_TO_RESPONSES = MOVE_RESPONSES
+POSITION_RESPONSES = ({ACK_POSITION}, set())
+STATS_RESPONSES = ({ACK_STATS}, set())
+DEBOUNCE_RESPONSES = ({ACK_DEBOUNCE}, {NACK_DEBOUNCE_INVALID})
+HOMING_CONFIG_RESPONSES = ({ACK_HOMING_CONFIG}, {NACK_HOMING_INVALID, NACK_MOTOR_BUSY})
+CAL_TABLE_ADD_RESPONSES = ({ACK_CAL_TABLE}, {NACK_CAL_TABLE_INVALID})
+CAL_TABLE_APPLY_RESPONSES = ({ACK_CALIBRATION_COMPLETE}, {NACK_CAL_TABLE_INVALID, NACK_MOTOR_BUSY})
+BACKLASH_RESPONSES = ({ACK_BACKLASH}, {NACK_BACKLASH_INVALID, NACK_MOTOR_BUSY})
+
+Telemetry = namedtuple("Telemetry", "position_steps remaining_pulses state")
+ScanPoint = namedtuple("ScanPoint", "pass_number index position_steps")
+SegmentDone = namedtuple("SegmentDone", "index position_steps")
+ProgramSegment = namedtuple("ProgramSegment", "forward degrees frequency_hz dwell_ms")
+Position = namedtuple("Position", "position_steps degrees referenced")
+LimitSwitchTrip = namedtuple("LimitSwitchTrip", "position_steps")
+HomingReport = namedtuple("HomingReport", "fast_trip_steps slow_trip_steps delta_steps")
+FirmwareStats = namedtuple(
+    "FirmwareStats",
+    "loops loop_min_us loop_max_us step_jitter_max_us rx_bytes tx_bytes commands command_total_us command_max_us")
+
+
+def format_move_command(degrees, frequency_hz):
+    """Formato do comando: "MOVER ANGULO <graus> <frequencia_hz>"."""
+    return f"{CMD_MOVE_ANGLE} {float(degrees)} {int(frequency_hz)}"
+
+
+def format_move_to_command(degrees, frequency_hz):
+    """Formato do comando: "MOVER_PARA <graus_absolutos> <frequencia_hz>" (0 = posição do HOME)."""
+    return f"{CMD_MOVE_TO} {float(degrees)} {int(frequency_hz)}"
+
+
+def parse_position(line):
+    """Converte "POS <posicao> <graus> <referenciado>" em Position; None se a linha não for uma posição."""
+    if not line.startswith(POSITION_PREFIX):
+        return None
+    try:
+        position, degrees, referenced = line[len(POSITION_PREFIX):].split()
+        return Position(int(position), float(degrees), referenced == "1")
+    except ValueError:
+        return None
+
+
+def parse_stats(line):
+    """Converte a resposta "STATS ..." em FirmwareStats; None se a linha não for uma resposta ao STATS."""
+    if not line.startswith(STATS_PREFIX):
+        return None
+    try:
+        return FirmwareStats(*(int(value) for value in line[len(STATS_PREFIX):].split()))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_limit_switch_trip(line):
+    """Converte "LSW <posicao>" em LimitSwitchTrip; None se a linha não for um registro do fim de curso."""
+    if not line.startswith(LIMIT_SWITCH_PREFIX):
+        return None
+    try:
+        return LimitSwitchTrip(int(line[len(LIMIT_SWITCH_PREFIX):]))
+    except ValueError:
+        return None
+
+
+def parse_homing_report(line):
+    """Converte "HOM <rapida> <lenta> <delta>" em HomingReport; None se a linha não for um registro do homing."""
+    if not line.startswith(HOMING_PREFIX):
+        return None
+    try:
+        return HomingReport(*(int(value) for value in line[len(HOMING_PREFIX):].split()))
+    except (TypeError, ValueError):
+        return None
+
+
+def format_homing_command(fast_hz, slow_hz=None, backoff_degrees=None, final_backoff_degrees=None):
+    """Formato do comando: "HOMING <rapida_hz> [lenta_hz] [recuo_graus] [recuo_final_graus]".
+
+    `slow_hz` 0 faz o homing em uma única passada. Valores omitidos mantêm a configuração atual do firmware;
+    só é possível omitir a partir do final.
+    """
+    fields = [CMD_HOMING_CONFIG, str(int(fast_hz))]
+    for value in (slow_hz, backoff_degrees, final_backoff_degrees):
+        if value is None:
+            break
+        fields.append(str(int(value)) if value == int(value) else str(float(value)))
+    return " ".join(fields)
+
+
+def format_debounce_command(debounce_us):
+    """Formato do comando: "DEBOUNCE <us>" (janela de debounce do fim de curso, 0 = sem debounce)."""
+    return f"{CMD_DEBOUNCE} {int(debounce_us)}"
+
+
+def format_backlash_command(steps):
+    """Formato do comando: "FOLGA <passos>" (folga acrescentada nas inversões de sentido, 0 = sem compensação)."""
+    return f"{CMD_BACKLASH} {int(steps)}"
+
+
+def format_telemetry_command(mode, interval=None):
+    """Formato do comando: "TELEMETRIA OFF", "TELEMETRIA PULSOS <n>" ou "TELEMETRIA MS <t>"."""
+    if mode == TELEMETRY_OFF:
+        return f"{CMD_TELEMETRY} {TELEMETRY_OFF}"
+    return f"{CMD_TELEMETRY} {mode} {int(interval)}"
+
+
+def format_ramp_command(profile, max_speed_hz=None, acceleration=None, jerk=None):
+    """Formato do comando: "RAMPA <perfil> [vel_max_hz] [acel_passos_s2] [jerk_passos_s3]".
+
+    Valores omitidos mantêm a configuração atual do firmware; só é possível omitir a partir do final.
+    """
+    if profile not in RAMP_PROFILES:
+        raise ValueError(f"Perfil de rampa desconhecido: {profile!r}")
+    fields = [CMD_RAMP, profile]
+    for value in (max_speed_hz, acceleration, jerk):
+        if value is None:
+            break
+        fields.append(str(int(value)) if value == int(value) else str(float(value)))
+    return " ".join(fields)
+
+
+def format_scan_command(start_degrees, end_degrees, step_degrees, dwell_ms, frequency_hz, continuous=False):
+    """Formato do comando: "SCAN|VARREDURA <inicio> <fim> <passo> <dwell_ms> <frequencia_hz>"."""
+    command = CMD_SWEEP if continuous else CMD_SCAN
+    return (f"{command} {float(start_degrees)} {float(end_degrees)} {float(step_degrees)} "
+            f"{int(dwell_ms)} {int(frequency_hz)}")
+
+
+def parse_scan_point(line):
+    """Converte "SCN <passada> <indice> <posicao>" em ScanPoint; None se a linha não for um ponto de varredura."""
+    if not line.startswith(SCAN_PREFIX):
+        return None
+    try:
+        pass_number, index, position = line[len(SCAN_PREFIX):].split()
+        return ScanPoint(int(pass_number), int(index), int(position))
+    except ValueError:
+        return None
+
+
+def format_program_add_command(segments):
+    """Formato do comando: "PROG ADD <FRENTE|RE> <graus> <frequencia_hz> <dwell_ms>;..." (ProgramSegment)."""
+    return f"{CMD_PROGRAM_ADD} " + ";".join(
+        f"{DIRECTION_FORWARD if s.forward else DIRECTION_REVERSE} {float(s.degrees)} {int(s.frequency_hz)} {int(s.dwell_ms)}"
+        for s in segments
+    )
+
+
+def parse_segment_done(line):
+    """Converte "SEG <indice> <posicao>" em SegmentDone; None se a linha não for um segmento concluído."""
+    if not line.startswith(SEGMENT_PREFIX):
+        return None
+    try:
+        index, position = line[len(SEGMENT_PREFIX):].split()
+        return SegmentDone(int(index), int(position))
+    except ValueError:
+        return None
+
+
+def parse_telemetry(line):
+    """Converte "TLM <posicao> <restantes> <estado>" em Telemetry; None se a linha não for telemetria."""
+    if not line.startswith(TELEMETRY_PREFIX):
+        return None
+    try:
+        position, remaining, state = line[len(TELEMETRY_PREFIX):].split()
+        return Telemetry(int(position), int(remaining), int(state))
+    except ValueError:
+        return None
+
+
+def format_calibration_command(points):
+    """Formato do comando: "CALIBRAR <teorico1>,<medido1>;<teorico2>,<medido2>;..."."""
+    points = list(points)
+    if not 2 <= len(points) <= CALIBRATION_MAX_POINTS:
+        raise ValueError(f"A calibração linear aceita de 2 a {CALIBRATION_MAX_POINTS} pontos.")
+    return f"{CMD_CALIBRATE} " + ";".join(f"{theoretical},{measured}" for theoretical, measured in points)
+
+
+def format_cal_table_commands(corrections):
+    """Comandos "CALTAB ADD <indice> <c0> <c1> ..." que enviam a tabela em ordem, seguidos de "CALTAB APLICAR <n>"."""
+    values = [f"{float(correction):.2f}" for correction in corrections]
+    commands = [f"{CMD_CAL_TABLE_ADD} {start} " + " ".join(values[start:start + CAL_TABLE_MAX_VALUES_PER_COMMAND])
+                for start in range(0, len(values), CAL_TABLE_MAX_VALUES_PER_COMMAND)]
+    return commands + [f"{CMD_CAL_TABLE_APPLY} {len(values)}"]
+
+
+class RadarCommandError(Exception):
+    """O firmware recusou ou interrompeu um comando (NACK_* ou aviso de fim de curso)."""
+
+    def __init__(self, command, response):
+        super().__init__(f"{command!r} -> {response}")
+        self.command = command
+        self.response = response
+
+
+@dataclass
+class CommandResult:
+    command: str
+    response: str # Token que encerrou o comando (ex.: ACK_ANGULO_CONCLUIDO)
+    latency: float # Segundos entre o envio e a resposta
+
+
+class PendingCommand:
+    """Comando enviado aguardando sua resposta final."""
+
+    def __init__(self, command, done, fail, on_result, on_error):
+        self.command = command
+        self.done = frozenset(done)
+        self.fail = frozenset(fail) | COMMON_FAILURES
+        self.on_result = on_result
+        self.on_error = on_error
+        self.sent_at = time.perf_counter()
+
+    def matches(self, line):
+        return line in self.done or line in self.fail
+
+    def resolve(self, line, now):
+        if line in self.done:
+            self.on_result(CommandResult(self.command, line, now - self.sent_at))
+        else:
+            self.on_error(RadarCommandError(self.command, line))
+
+
+class CommandTracker:
+    """Correlaciona as linhas recebidas com os comandos pendentes.
+
+    Um NACK imediato encerra apenas o comando mais recente que o aceita; as demais
+    respostas (conclusões assíncronas do loop() do firmware) encerram todos os
+    comandos pendentes que as esperam, na ordem de envio.
+    """
+
+    def __init__(self, on_resolved=None):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._on_resolved = on_resolved # callback(comando, resposta, latência, falhou) para as métricas
+
+    def __len__(self):
+        return len(self._pending)
+
+    def register(self, command, responses, on_result, on_error):
+        done, fail = responses
+        pending = PendingCommand(command, done, fail, on_result, on_error)
+        with self._lock:
+            self._pending.append(pending)
+        return pending
+
+    def discard(self, pending):
+        with self._lock:
+            if pending in self._pending:
+                self._pending.remove(pending)
+
+    def feed(self, line):
+        """Resolve os comandos encerrados por `line`. Retorna quantos foram resolvidos."""
+        now = time.perf_counter()
+        with self._lock:
+            if line in IMMEDIATE_NACKS:
+                matched = [p for p in reversed(self._pending) if p.matches(line)][:1]
+            else:
+                matched = [p for p in self._pending if p.matches(line)]
+            for pending in matched:
+                self._pending.remove(pending)
+        for pending in matched:
+            if self._on_resolved is not None:
+                self._on_resolved(pending.command, line, now - pending.sent_at, line not in pending.done)
+            pending.resolve(line, now)
+        return len(matched)
+
+    def fail_all(self, exc):
+        """Falha todos os comandos pendentes (ex.: conexão perdida)."""
+        with self._lock:
+            pending_list, self._pending = self._pending, []
+        for pending in pending_list:
+            pending.on_error(exc)
+
+
+# --- Protocolo binário (opcional, negociado com "PROTO BIN") ---
+# Quadro: SOF | LEN | TIPO | PAYLOAD (LEN-1 bytes) | CRC16 (little-endian)
+# CRC-16/CCITT-FALSE (polinômio 0x1021, início 0xFFFF) sobre LEN, TIPO e PAYLOAD.
+FRAME_SOF = 0xA5
+FRAME_MAX_PAYLOAD = 128
+FRAME_OVERHEAD = 4 # SOF + LEN + CRC16
+
+# Tipos de quadro: opcodes host -> ESP32 (< 0x80) e respostas ESP32 -> host (>= 0x80)
+OP_ENABLE = 0x01
+OP_DISABLE = 0x02
+OP_STOP = 0x03
+OP_DIR = 0x04 # uint8 direção (0 = FRENTE, 1 = RE)
+OP_MOVE_ANGLE = 0x05 # float32 graus, uint16 frequência
+OP_HOME = 0x06
+OP_CALIBRATE = 0x07 # uint8 n, n x (float32 teórico, float32 medido)
+OP_RESET_CALIB = 0x08
+OP_PROGRAM_ADD = 0x09 # uint8 n, n x (uint8 direção, float32 graus, uint16 frequência, uint32 dwell_ms)
+OP_MOVE_TO = 0x0A # float32 graus absolutos, uint16 frequência
+OP_TEXT_COMMAND = 0x7E # Qualquer comando de texto sem opcode próprio
+OP_PROTO_TEXT = 0x7F # Volta ao protocolo de texto
+FRAME_STATUS = 0x80 # uint8 código de status
+FRAME_TEXT = 0x81 # Mensagem de texto sem código
+FRAME_TELEMETRY = 0x82 # int32 posição, int32 pulsos restantes, uint8 estado
+FRAME_SCAN_POINT = 0x83 # uint32 passada, uint32 índice, int32 posição
+FRAME_SEGMENT_DONE = 0x84 # uint32 índice, int32 posição
+FRAME_POSITION = 0x85 # int32 posição, float32 graus, uint8 referenciado
+FRAME_STATS = 0x86 # uint64 loops, 8 x uint32 (na ordem do registro STATS)
+FRAME_LIMIT_SWITCH = 0x87 # int32 posição em que o fim de curso disparou
+FRAME_HOMING = 0x88 # int32 posição rápida, int32 posição lenta, int32 delta
+
+# Códigos numéricos dos tokens (devem coincidir com STATUS_CODES no firmware)
+STATUS_CODES = {
+    1: ACK_UART_READY, 2: ACK_ENABLED, 3: ACK_DISABLED, 4: ACK_STOPPED,
+    5: ACK_DIR_FORWARD, 6: ACK_DIR_REVERSE, 7: ACK_MOVE_STARTED, 8: ACK_ANGLE_DONE,
+    9: ACK_HOMING_STARTED, 10: ACK_HOMING_DONE, 11: ACK_NOT_HOMED, 12: ACK_LIMIT_SWITCH_RESET,
+    13: ACK_AUTO_BACKOFF_COMPLETE, 14: ACK_CALIBRATION_COMPLETE, 15: ACK_CALIBRATION_RESET,
+    16: ACK_PROTO_BINARY, 17: ACK_PROTO_TEXT, 18: ACK_TELEMETRY, 19: ACK_RAMP, 20: ACK_SCAN_STARTED, 21: ACK_SCAN_DONE,
+    22: ACK_PROGRAM_ADDED, 23: ACK_PROGRAM_STARTED, 24: ACK_PROGRAM_DONE, 25: ACK_PROGRAM_CLEARED, 26: ACK_POSITION,
+    27: ACK_STATS, 28: ACK_DEBOUNCE, 29: ACK_HOMING_CONFIG, 30: ACK_CAL_TABLE, 31: ACK_BACKLASH,
+    64: NACK_MOTOR_DISABLED, 65: NACK_MOTOR_BUSY, 66: NACK_ANGLE_RANGE, 67: NACK_ANGLE_INVALID,
+    68: NACK_HOMING_INTERRUPTED, 69: NACK_CALIBRATION_INCOMPLETE, 70: NACK_CALIBRATION_ERROR,
+    71: NACK_CALIBRATION_FACTOR_ZERO, 72: NACK_UNKNOWN_COMMAND, 73: NACK_FRAME_CRC, 74: NACK_FRAME_MALFORMED,
+    75: NACK_TELEMETRY_INVALID, 76: NACK_RAMP_INVALID, 77: NACK_SCAN_INVALID, 78: NACK_PROGRAM_INVALID, 79: NACK_PROGRAM_FULL,
+    80: NACK_PROGRAM_EMPTY, 81: NACK_DEBOUNCE_INVALID, 82: NACK_HOMING_INVALID, 83: NACK_CAL_TABLE_INVALID,
+    84: NACK_BACKLASH_INVALID,
+    128: WARNING_LIMIT_SWITCH_ACTIVE, 129: WARNING_LIMIT_SWITCH_HIT, 130: WARNING_AUTO_BACKOFF_STUCK,
+}
+
+_SIMPLE_OPCODES = {
+    CMD_ENABLE: OP_ENABLE,
+    CMD_DISABLE: OP_DISABLE,
+    CMD_STOP: OP_STOP,
+    CMD_HOME: OP_HOME,
+    CMD_RESET_CALIB: OP_RESET_CALIB,
+}
+
+
+def crc16_ccitt(data, crc=0xFFFF):
+    return binascii.crc_hqx(data, crc)
+
+
+def encode_frame(frame_type, payload=b""):
+    if len(payload) > FRAME_MAX_PAYLOAD:
+        raise ValueError(f"Payload de {len(payload)} bytes excede o máximo de {FRAME_MAX_PAYLOAD}.")
+    body = bytes((len(payload) + 1, frame_type)) + payload
+    return bytes((FRAME_SOF,)) + body + struct.pack("<H", crc16_ccitt(body))
+
+
+def encode_binary_command(command):
+    """Converte um comando de texto no quadro binário equivalente."""
+    if command in _SIMPLE_OPCODES:
+        return encode_frame(_SIMPLE_OPCODES[command])
+    if command in (CMD_DIR_FORWARD, CMD_DIR_REVERSE):
+        return encode_frame(OP_DIR, bytes((0 if command == CMD_DIR_FORWARD else 1,)))
+    if command.startswith(CMD_MOVE_ANGLE + " "):
+        args = command[len(CMD_MOVE_ANGLE) + 1:].split()
+        frequency_hz = int(args[1]) if len(args) > 1 else 50
+        return encode_frame(OP_MOVE_ANGLE, struct.pack("<fH", float(args[0]), frequency_hz))
+    if command.startswith(CMD_MOVE_TO + " "):
+        args = command[len(CMD_MOVE_TO) + 1:].split()
+        frequency_hz = int(args[1]) if len(args) > 1 else 50
+        return encode_frame(OP_MOVE_TO, struct.pack("<fH", float(args[0]), frequency_hz))
+    if command.startswith(CMD_CALIBRATE + " "):
+        pairs = [point.split(",") for point in command[len(CMD_CALIBRATE) + 1:].split(";")]
+        payload = bytes((len(pairs),)) + b"".join(struct.pack("<ff", float(t), float(m)) for t, m in pairs)
+        return encode_frame(OP_CALIBRATE, payload)
+    if command.startswith(CMD_PROGRAM_ADD + " "):
+        segments = [segment.split() for segment in command[len(CMD_PROGRAM_ADD) + 1:].split(";")]
+        payload = bytes((len(segments),)) + b"".join(
+            struct.pack("<BfHI", 0 if direction == DIRECTION_FORWARD else 1, float(degrees), int(frequency_hz), int(dwell_ms))
+            for direction, degrees, frequency_hz, dwell_ms in segments
+        )
+        return encode_frame(OP_PROGRAM_ADD, payload)
+    return encode_frame(OP_TEXT_COMMAND, command.encode('utf-8'))
+
+
+class SerialCodec:
+    """Codifica comandos e decodifica bytes recebidos em linhas/tokens, nos modos texto e binário.
+
+    Começa em texto; passa ao binário ao receber ACK_PROTO_BIN e volta ao texto com
+    ACK_PROTO_TEXT ou se a ESP32 reiniciar (ACK_UART_READY em texto no meio do fluxo binário).
+    Em ambos os modos o resultado são as mesmas linhas de texto, de modo que a correlação
+    de respostas e os assinantes não dependem do modo.
+    """
+
+    def __init__(self):
+        self.binary = False
+        self.crc_errors = 0
+        self._buffer = bytearray()
+
+    def encode(self, command):
+        if self.binary:
+            return encode_binary_command(command)
+        return f"{command}\n".encode('utf-8')
+
+    def feed(self, data):
+        """Recebe bytes brutos e retorna as linhas completas decodificadas."""
+        self._buffer += data
+        lines = []
+        while True:
+            line = self._next_binary() if self.binary else self._next_text()
+            if line is None:
+                return lines
+            if line:
+                lines.append(line)
+            if line == ACK_PROTO_BINARY:
+                self.binary = True
+            elif line in (ACK_PROTO_TEXT, ACK_UART_READY):
+                self.binary = False
+
+    def _next_text(self):
+        end = self._buffer.find(b"\n")
+        if end < 0:
+            return None
+        raw = bytes(self._buffer[:end])
+        del self._buffer[:end + 1]
+        return raw.decode('utf-8', errors='ignore').strip()
+
+    def _next_binary(self):
+        buffer = self._buffer
+        start = buffer.find(bytes((FRAME_SOF,)))
+        if start != 0:
+            # Bytes fora de quadro: uma linha de texto completa aqui indica que a ESP32 reiniciou
+            stray_end = buffer.find(b"\n", 0, start if start > 0 else len(buffer))
+            if stray_end >= 0 and bytes(buffer[:stray_end]).strip() == ACK_UART_READY.encode():
+                del buffer[:stray_end + 1]
+                return ACK_UART_READY
+            if start < 0:
+                if stray_end >= 0:
+                    del buffer[:stray_end + 1]
+                    return ""
+                return None
+            del buffer[:start]
+        if len(buffer) < 2:
+            return None
+        length = buffer[1]
+        if length == 0 or length > FRAME_MAX_PAYLOAD + 1:
+            del buffer[:1] # LEN inválido: procura o próximo SOF
+            return ""
+        total = length + FRAME_OVERHEAD
+        if len(buffer) < total:
+            return None
+        body = bytes(buffer[1:2 + length])
+        (received_crc,) = struct.unpack_from("<H", buffer, 2 + length)
+        if crc16_ccitt(body) != received_crc:
+            self.crc_errors += 1
+            del buffer[:1]
+            return ""
+        del buffer[:total]
+        frame_type, payload = body[1], body[2:]
+        if frame_type == FRAME_STATUS and payload:
+            return STATUS_CODES.get(payload[0], f"STATUS_{payload[0]}")
+        if frame_type == FRAME_TELEMETRY and len(payload) >= 9:
+            position, remaining, state = struct.unpack_from("<iiB", payload)
+            return f"{TELEMETRY_PREFIX}{position} {remaining} {state}"
+        if frame_type == FRAME_SCAN_POINT and len(payload) >= 12:
+            pass_number, index, position = struct.unpack_from("<IIi", payload)
+            return f"{SCAN_PREFIX}{pass_number} {index} {position}"
+        if frame_type == FRAME_SEGMENT_DONE and len(payload) >= 8:
+            index, position = struct.unpack_from("<Ii", payload)
+            return f"{SEGMENT_PREFIX}{index} {position}"
+        if frame_type == FRAME_POSITION and len(payload) >= 9:
+            position, degrees, referenced = struct.unpack_from("<ifB", payload)
+            return f"{POSITION_PREFIX}{position} {degrees:.3f} {referenced}"
+        if frame_type == FRAME_STATS and len(payload) >= 40:
+            return STATS_PREFIX + " ".join(str(value) for value in struct.unpack_from("<Q8I", payload))
+        if frame_type == FRAME_LIMIT_SWITCH and len(payload) >= 4:
+            return f"{LIMIT_SWITCH_PREFIX}{struct.unpack_from('<i', payload)[0]}"
+        if frame_type == FRAME_HOMING and len(payload) >= 12:
+            return HOMING_PREFIX + " ".join(str(value) for value in struct.unpack_from("<3i", payload))
+        return payload.decode('utf-8', errors='ignore').strip()
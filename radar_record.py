@@ -0,0 +1,207 @@
+"""Gravação do tráfego serial em arquivo binário e reprodução determinística pelo mesmo caminho do cliente.
+
+    python radar_record.py sessao.rrec --speed 1 --print # Linhas com o instante, na velocidade gravada
+    python radar_record.py sessao.rrec --speed 0 --profile # O mais rápido possível, com cProfile do pipeline
+
+`SessionRecorder` grava cada bloco recebido (bytes brutos: texto ou quadros binários, exatamente como lidos
+da porta) e cada comando enviado, com o instante de `time.monotonic_ns()`. A thread de leitura apenas
+acrescenta o registro a um buffer em memória; uma thread própria o descarrega no disco a cada
+RECORD_FLUSH_INTERVAL_S ou RECORD_FLUSH_BYTES. O arquivo é só de acréscimo: cada abertura inicia uma nova
+sessão no fim dele.
+
+Formato: RECORD_MAGIC e, para cada registro, "<BQI" (tipo, ns desde o início da sessão, tamanho) seguido
+dos dados. Tipos: REC_SESSION (início de sessão; dados = hora de parede "<d"), REC_RX (bytes recebidos) e
+REC_TX (comando em UTF-8). Um registro truncado no fim (queda durante a escrita) é ignorado na leitura.
+
+`replay` entrega os blocos RX a um `ReplayClient` (ou qualquer RadarClientBase) pelo `_handle_data`, de
+modo que o codec, os eventos, os assinantes e as métricas se comportam como na sessão original.
+"""
+import argparse
+import cProfile
+import logging
+import pstats
+import struct
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from radar_client import RadarClientBase, TX
+
+RECORD_MAGIC = b"RADARREC\x01"
+REC_SESSION = 0
+REC_RX = 1
+REC_TX = 2
+RECORD_FLUSH_INTERVAL_S = 0.5 # Maior atraso até o registro chegar ao disco
+RECORD_FLUSH_BYTES = 64 * 1024 # Buffer que antecipa a escrita
+PROFILE_TOP_FUNCTIONS = 25
+
+_RECORD_HEADER = struct.Struct("<BQI")
+_SESSION_DATA = struct.Struct("<d")
+
+Record = namedtuple("Record", "kind time_s data") # time_s: segundos desde o início da sessão
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRecorder:
+    """Grava o tráfego de um cliente: `client.recorder = SessionRecorder("sessao.rrec")`.
+
+    `record_rx` e `record_tx` podem ser chamados de qualquer thread e não tocam no disco.
+    """
+
+    def __init__(self, path, flush_interval_s=RECORD_FLUSH_INTERVAL_S, flush_bytes=RECORD_FLUSH_BYTES):
+        self.path = path
+        self.records = 0
+        self._flush_interval_s = flush_interval_s
+        self._flush_bytes = flush_bytes
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(RECORD_MAGIC)
+        self._start_ns = time.monotonic_ns()
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._append(REC_SESSION, _SESSION_DATA.pack(time.time()))
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
+
+    def record_rx(self, data):
+        self._append(REC_RX, data)
+
+    def record_tx(self, command):
+        self._append(REC_TX, command.encode("utf-8"))
+
+    def _append(self, kind, data):
+        header = _RECORD_HEADER.pack(kind, time.monotonic_ns() - self._start_ns, len(data))
+        with self._lock:
+            self._buffer += header
+            self._buffer += data
+            self.records += 1
+            full = len(self._buffer) >= self._flush_bytes
+        if full:
+            self._wake.set()
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wake.wait(self._flush_interval_s)
+            self._wake.clear()
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            data, self._buffer = self._buffer, bytearray()
+        if data:
+            self._file.write(data)
+            self._file.flush()
+
+    def close(self):
+        """Descarrega o que falta e fecha o arquivo."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer_thread.join()
+        self._flush()
+        self._file.close()
+
+
+def read_records(path):
+    """Itera os `Record` do arquivo, sessão após sessão."""
+    with open(path, "rb") as f:
+        if f.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise ValueError(f"{path} não é uma gravação de sessão do radar.")
+        while True:
+            header = f.read(_RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < _RECORD_HEADER.size:
+                break
+            kind, time_ns, size = _RECORD_HEADER.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                break
+            yield Record(kind, time_ns / 1e9, data)
+    logger.warning("Gravação %s termina com um registro incompleto (ignorado).", path)
+
+
+class ReplayClient(RadarClientBase):
+    """Cliente sem porta para a reprodução: recebe os dados de `replay` e recusa comandos."""
+
+    is_connected = False
+
+    def send_raw(self, command):
+        raise ConnectionError("Reprodução de sessão: comandos não são enviados.")
+
+    def send(self, command, responses, stop_on_cancel=False, timeout=None):
+        raise ConnectionError("Reprodução de sessão: comandos não são enviados.")
+
+
+def replay(path, client=None, speed=1.0, stop_event=None):
+    """Reproduz a gravação em `client` (padrão: um ReplayClient novo) e o retorna.
+
+    `speed` 1.0 respeita os intervalos gravados, 2.0 reproduz no dobro da velocidade e 0 (ou None) o mais rápido
+    possível. Os comandos gravados chegam aos assinantes como TX, sem serem enviados. `stop_event`
+    (threading.Event) interrompe a reprodução.
+    """
+    client = client if client is not None else ReplayClient()
+    origin = None # Instante (perf_counter) correspondente ao início da sessão em reprodução
+    for record in read_records(path):
+        if stop_event is not None and stop_event.is_set():
+            break
+        if record.kind == REC_SESSION:
+            origin = None # Os instantes recomeçam a cada sessão
+            continue
+        if speed:
+            if origin is None:
+                origin = time.perf_counter() - record.time_s / speed
+            delay = origin + record.time_s / speed - time.perf_counter()
+            if delay > 0:
+                if stop_event is None:
+                    time.sleep(delay)
+                elif stop_event.wait(delay):
+                    break
+        if record.kind == REC_RX:
+            client._handle_data(record.data)
+        elif record.kind == REC_TX:
+            client._notify(TX, record.data.decode("utf-8", errors="replace"))
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduz uma sessão gravada do link serial do radar.")
+    parser.add_argument("path", help="Arquivo gravado (SessionRecorder ou 'Gravar sessão' da GUI)")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = tempo real, 0 = o mais rápido possível")
+    parser.add_argument("--print", action="store_true", help="Imprime cada linha TX/RX com o instante")
+    parser.add_argument("--profile", action="store_true", help="Executa sob cProfile e lista as funções mais caras")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    for record in read_records(args.path):
+        if record.kind == REC_SESSION:
+            (wall_time,) = _SESSION_DATA.unpack(record.data)
+            print(f"Sessão iniciada em {datetime.fromtimestamp(wall_time).isoformat(timespec='seconds')}")
+    client = ReplayClient()
+    start = time.perf_counter()
+    if args.print:
+        client.add_listener(lambda direction, line: print(f"{time.perf_counter() - start:10.4f} "
+                                                          f"{'>>' if direction == TX else '<<'} {line}"))
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    replay(args.path, client, args.speed)
+    if profiler is not None:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+    metrics = client.metrics
+    p50, p99 = (metrics.line_processing.quantile(fraction) or 0.0 for fraction in (0.5, 0.99))
+    print(f"{metrics.lines_received} linhas RX ({metrics.bytes_received} bytes) em {elapsed:.3f} s: "
+          f"{metrics.lines_received / elapsed if elapsed else 0:.0f} linhas/s; processamento por linha "
+          f"p50 {p50:.6f} s, p99 {p99:.6f} s")
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1532 @@
+"""Simulador da ESP32 do motor do radar (programa_radar_controle.txt), com o mesmo protocolo serial.
+
+Permite testar os clientes e a GUI sem a bancada. `SimulatedSerial` imita uma porta pyserial
+e pode ser passada diretamente ao cliente:
+
+    link = SimulatedSerial(baudrate=None, time_scale=None) # Link ideal e tempo virtual instantâneo
+    client = RadarMotorClient(serial_port=link)
+    client.connect()
+    client.move(90.0, 400).result(timeout=5)
+
+Para a GUI ou outro processo, `python radar_sim.py` expõe o simulador em um pseudo-terminal (POSIX).
+
+Modela a máquina de estados do loop(), a calibração, os dados da NVS, o fim de curso virtual,
+a duração dos movimentos (rampas), a vazão do UART e falhas injetadas (bytes perdidos, sensor
+travado, ACKs lentos). As mensagens de depuração (DEBUG_PRINT) do firmware não são reproduzidas.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import select
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from radar_protocol import (
+    BAUD_RATE, DEGREES_PER_PULSE, DEFAULT_MAX_SPEED_HZ, MAX_STEP_FREQUENCY_HZ, PROGRAM_QUEUE_SIZE,
+    PROGRAM_MAX_SEGMENTS_PER_COMMAND, PULSES_PER_REVOLUTION, RAMP_CONSTANT, RAMP_TRAPEZOIDAL, RAMP_SCURVE,
+    STATUS_CODES, FRAME_SOF, FRAME_MAX_PAYLOAD, FRAME_OVERHEAD, OP_ENABLE, OP_DISABLE, OP_STOP, OP_DIR,
+    OP_MOVE_ANGLE, OP_HOME, OP_CALIBRATE, OP_RESET_CALIB, OP_PROGRAM_ADD, OP_MOVE_TO, OP_TEXT_COMMAND,
+    OP_PROTO_TEXT, FRAME_STATUS, FRAME_TEXT, FRAME_TELEMETRY, FRAME_SCAN_POINT, FRAME_SEGMENT_DONE, FRAME_POSITION,
+    FRAME_STATS, FRAME_LIMIT_SWITCH, FRAME_HOMING, LIMIT_SWITCH_MAX_DEBOUNCE_US, HOMING_MAX_BACKOFF_DEGREES,
+    CALIBRATION_MAX_POINTS, CAL_TABLE_MAX_POINTS, CAL_TABLE_MAX_VALUES_PER_COMMAND, CAL_TABLE_MAX_CORRECTION_STEPS,
+    BACKLASH_MAX_STEPS,
+    crc16_ccitt, encode_frame,
+)
+from radar_calibration import StepConverter, build_step_lookup, corrected_steps, nominal_steps
+
+# --- Constantes do firmware ---
+HOMING_SEARCH_SPEED_HZ = 800 # Aproximação rápida
+HOMING_SLOW_SPEED_HZ = 100 # Reaproximação lenta (0 = uma passada)
+HOMING_RETRY_BACKOFF_DEGREES = 5.0
+LIMIT_SWITCH_DEFAULT_DEBOUNCE_US = 500
+BACKTRACK_DEGREES = 2.0 # G_BACKTRACK_DEGREES (homing) e AUTO_BACKOFF_DEGREES
+RAMP_START_SPEED_HZ = 50
+DEFAULT_ACCELERATION = 4000.0 # passos/s²
+DEFAULT_JERK = 40000.0 # passos/s³
+TELEMETRY_DEFAULT_INTERVAL_MS = 100
+NVS_FACTOR_KEY = "factor"
+NVS_OFFSET_KEY = "offset"
+NVS_HOMED_KEY = "homed"
+NVS_TABLE_KEY = "table"
+NVS_BACKLASH_KEY = "backlash"
+NVS_FLUSH_DELAY_MS = 250 # Gravação adiada da NVS: espera após a última alteração
+NVS_MIN_FLUSH_INTERVAL_MS = 2000 # e intervalo mínimo entre gravações (desgaste da flash)
+
+# --- Modelo do hardware ---
+UART_TX_BUFFER = 128 # Espaço informado por Serial.availableForWrite() com o buffer vazio
+SERIAL_READ_TIMEOUT_S = 1.0 # Timeout de Serial.readStringUntil() para uma linha sem '\n'
+BITS_PER_BYTE = 10 # 8N1
+DEFAULT_LIMIT_SWITCH_STEPS = -800 # Sensor 90° no sentido RE a partir da posição do eixo ao ligar
+MAX_EVENTS_PER_INSTANT = 10000 # Proteção contra um loop() que nunca muda de estado
+
+FORWARD = 0
+REVERSE = 1
+
+STATE_IDLE = 0
+STATE_MOVING_ANGULAR = 1
+STATE_HOMING_SEARCHING = 2
+STATE_AUTO_BACKOFF = 5
+STATE_SCAN_MOVING = 7
+STATE_SCAN_DWELL = 8
+STATE_PROGRAM_MOVING = 9
+STATE_PROGRAM_DWELL = 10
+_MOVING_STATES = (STATE_MOVING_ANGULAR, STATE_AUTO_BACKOFF, STATE_SCAN_MOVING, STATE_PROGRAM_MOVING)
+
+_STATUS_BY_TOKEN = {token: code for code, token in STATUS_CODES.items()}
+_INT_PATTERN = re.compile(r"\s*[+-]?\d+")
+_FLOAT_PATTERN = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+
+def _f32(value):
+    """Arredonda para float32, como as variáveis float do firmware."""
+    try:
+        return struct.unpack("<f", struct.pack("<f", value))[0]
+    except OverflowError:
+        return math.copysign(math.inf, value)
+
+
+def _roundf(value):
+    """roundf() do C: metades se afastam do zero (round() do Python arredonda para o par)."""
+    if not math.isfinite(value):
+        return 0
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1)
+
+
+def _to_int(text):
+    """String::toInt() do Arduino (atol): prefixo numérico ou 0."""
+    match = _INT_PATTERN.match(text)
+    return int(match.group()) if match else 0
+
+
+def _to_float(text):
+    """String::toFloat() do Arduino (atof), em float32."""
+    match = _FLOAT_PATTERN.match(text)
+    return _f32(float(match.group())) if match else 0.0
+
+
+def _u32(value):
+    return value & 0xFFFFFFFF
+
+
+def split_command_args(args, max_tokens):
+    """Igual a split_command_args() do firmware; None se houver mais de `max_tokens` argumentos."""
+    tokens = []
+    args = args.strip()
+    while args:
+        if len(tokens) == max_tokens:
+            return None
+        space_index = args.find(" ")
+        tokens.append(args if space_index == -1 else args[:space_index])
+        args = "" if space_index == -1 else args[space_index + 1:].strip()
+    return tokens
+
+
+def _take_up(sign, slack, backlash):
+    """Pulsos que apenas atravessam a folga antes de a saída andar no sentido `sign` (+1 FRENTE, -1 RE)."""
+    return max(0, backlash - slack) if sign > 0 else slack
+
+
+def _backlash_output(sign, steps, slack, backlash):
+    """Passos que chegam à saída após `steps` pulsos no sentido `sign` e a nova posição dentro da folga."""
+    take_up = min(steps, _take_up(sign, slack, backlash))
+    return steps - take_up, slack + sign * take_up
+
+
+@dataclass
+class SimulatorFaults:
+    """Falhas injetadas pelo simulador; podem ser alteradas com a simulação em andamento."""
+    drop_rx_probability: float = 0.0 # Chance de perder cada byte host -> ESP32
+    drop_tx_probability: float = 0.0 # Chance de perder cada byte ESP32 -> host
+    stuck_limit_switch: Optional[bool] = None # True/False trava a leitura do fim de curso; None = sensor normal
+    ack_delay_s: float = 0.0 # Atraso antes de cada ACK_* (o UART fica parado, preservando a ordem)
+    backlash_steps: int = 0 # Folga mecânica real entre o motor e o eixo (passos), a ser compensada com FOLGA
+
+
+class MotionProfile:
+    """Duração e progresso de um movimento com a rampa do firmware.
+
+    Aproximação contínua da tabela de meio-períodos da ISR; a S-curve é tratada como uma
+    rampa de aceleração constante com a mesma distância de aceleração.
+    """
+
+    def __init__(self, frequency_hz, pulses, profile=RAMP_TRAPEZOIDAL, acceleration=DEFAULT_ACCELERATION,
+                 jerk=DEFAULT_JERK):
+        self.pulses = pulses # -1 = contínuo (busca do homing)
+        cruise = float(frequency_hz)
+        start = min(float(RAMP_START_SPEED_HZ), cruise)
+        ramp_steps = 0.0
+        if profile != RAMP_CONSTANT and cruise > start:
+            if profile == RAMP_SCURVE:
+                delta_v = cruise - start
+                peak_accel = math.sqrt(delta_v * jerk) if delta_v * jerk < acceleration ** 2 else acceleration
+                jerk_time = peak_accel / jerk
+                ramp_steps = 0.5 * (start + cruise) * (2 * jerk_time + delta_v / peak_accel - jerk_time)
+            else:
+                ramp_steps = (cruise * cruise - start * start) / (2 * acceleration)
+        if ramp_steps <= 0:
+            start = cruise
+        self._start_hz = start
+        self._accel = (cruise * cruise - start * start) / (2 * ramp_steps) if ramp_steps > 0 else 0.0
+        if pulses >= 0 and 2 * ramp_steps > pulses: # Não chega à velocidade de cruzeiro
+            ramp_steps = pulses / 2.0
+        self._ramp_steps = ramp_steps
+        self._peak_hz = math.sqrt(start * start + 2 * self._accel * ramp_steps)
+        self._ramp_time = (self._peak_hz - start) / self._accel if self._accel else 0.0
+        if pulses >= 0:
+            self._cruise_steps = pulses - 2 * ramp_steps
+            self.duration = 2 * self._ramp_time + self._cruise_steps / self._peak_hz
+        else:
+            self._cruise_steps = math.inf
+            self.duration = math.inf
+
+    def _ramp_distance(self, t):
+        return self._start_hz * t + 0.5 * self._accel * t * t
+
+    def _ramp_duration(self, steps):
+        if not self._accel:
+            return steps / self._start_hz
+        return (math.sqrt(self._start_hz ** 2 + 2 * self._accel * steps) - self._start_hz) / self._accel
+
+    def steps_at(self, elapsed):
+        """Pulsos entregues `elapsed` segundos após o início."""
+        if elapsed <= 0:
+            return 0
+        if elapsed >= self.duration:
+            return self.pulses
+        if elapsed < self._ramp_time:
+            steps = self._ramp_distance(elapsed)
+        elif elapsed < self._ramp_time + self._cruise_steps / self._peak_hz:
+            steps = self._ramp_steps + (elapsed - self._ramp_time) * self._peak_hz
+        else:
+            steps = self.pulses - self._ramp_distance(self.duration - elapsed)
+        steps = int(steps + 1e-6)
+        return steps if self.pulses < 0 else min(steps, self.pulses)
+
+    def time_at(self, steps):
+        """Instante (desde o início) em que o pulso `steps` é entregue."""
+        if steps <= 0:
+            return 0.0
+        if steps <= self._ramp_steps:
+            return self._ramp_duration(steps)
+        if steps <= self._ramp_steps + self._cruise_steps:
+            return self._ramp_time + (steps - self._ramp_steps) / self._peak_hz
+        return self.duration - self._ramp_duration(self.pulses - steps)
+
+
+class _Motion:
+    """Movimento em curso no gerador de pulsos."""
+
+    def __init__(self, start_time, direction, profile):
+        self.start_time = start_time
+        self.sign = 1 if direction == FORWARD else -1
+        self.profile = profile
+        self.end_time = start_time + profile.duration
+
+
+class SimulatedFirmware:
+    """Réplica do firmware dirigida por tempo simulado (segundos em `now`).
+
+    `uart` recebe a saída (`uart_write(data, now, ack)`) e informa o espaço livre para transmissão
+    (`uart_available_for_write(now)`). `nvs` é o dicionário que faz o papel das Preferences
+    (chaves factor, offset e homed) e sobrevive a `power_on()`, assim como a posição real do eixo.
+    """
+
+    def __init__(self, uart, nvs=None, limit_switch_steps=DEFAULT_LIMIT_SWITCH_STEPS, faults=None):
+        self.uart = uart
+        self.nvs = {} if nvs is None else nvs
+        self.faults = faults if faults is not None else SimulatorFaults()
+        self.limit_switch_steps = limit_switch_steps # Eixo nesta posição (ou além, no sentido RE) ativa o sensor
+        self.shaft_steps = 0 # Posição real do eixo, nunca zerada pelo HOME
+        self.shaft_slack = 0 # Posição do motor dentro da folga mecânica (0 = encostado no sentido RE)
+        self.nvs_writes = {} # Chave -> gravações na flash (desgaste)
+        self.now = 0.0
+        self.commands_processed = 0
+        self.power_on()
+
+    # --- Reset / NVS ---
+    def power_on(self):
+        """Reinicia a RAM e executa o setup()."""
+        self._rx = deque() # (instante de chegada, bytes) ainda em trânsito
+        self._rx_buffer = bytearray()
+        self._rx_last_byte_at = self.now
+        self._rx_frame = bytearray()
+        self.binary_protocol = False
+        self.motor_is_enabled = True
+        self.motor_is_moving = False
+        self.current_direction = FORWARD
+        self.state = STATE_IDLE
+        self._position_base = 0
+        self.backlash_slack = 0 # g_backlash_slack
+        self._nvs_dirty = False
+        self._nvs_last_change_ms = 0
+        self._nvs_last_flush_ms = 0
+        self._steps_generated_base = 0
+        self._motion = None
+        self.position_referenced = False
+        self.limit_switch_active = False
+        self.limit_switch_debounce_us = LIMIT_SWITCH_DEFAULT_DEBOUNCE_US # O sensor virtual não tem repique
+        self._last_sensor_state = False
+        self.motor_homed = False
+        self.homing_in_progress = False
+        self.backoff_is_for_homing = False
+        self.homing_fast_hz = HOMING_SEARCH_SPEED_HZ
+        self.homing_slow_hz = HOMING_SLOW_SPEED_HZ
+        self.homing_backoff_degrees = HOMING_RETRY_BACKOFF_DEGREES
+        self.homing_final_backoff_degrees = BACKTRACK_DEGREES
+        self.homing_phase = "FAST" # FAST, RETRY_BACKOFF, SLOW, FINAL_BACKOFF (homing_phase_t)
+        self.homing_fast_trip_steps = 0
+        self.calibration_factor = 1.0
+        self.calibration_offset = 0.0
+        self.cal_table = [] # Tabela aplicada (g_cal_table); vazia = sem tabela
+        self.cal_table_upload = [] # Valores recebidos por CALTAB ADD
+        self.cal_lut = [] # g_cal_lut
+        self.step_conversion = StepConverter() # g_steps_per_unit_q e g_step_remainder_q
+        self.backlash_steps = 0
+        self.ramp_profile = RAMP_TRAPEZOIDAL
+        self.max_speed_hz = DEFAULT_MAX_SPEED_HZ
+        self.acceleration = DEFAULT_ACCELERATION
+        self.jerk = DEFAULT_JERK
+        self.step_cruise_hz = HOMING_SEARCH_SPEED_HZ
+        self.telemetry_mode = "MS"
+        self.telemetry_interval = TELEMETRY_DEFAULT_INTERVAL_MS
+        self._telemetry_last_steps = 0
+        self._telemetry_last_ms = 0
+        self._scan = None
+        self._program_queue = deque()
+        self._program_current = None
+        self._program_completed = 0
+        self._program_dwell_start_ms = 0
+        # g_stats: o simulador não mede tempos de CPU, então períodos, jitter e duração dos comandos ficam em 0
+        self.stats_loops = 0
+        self.stats_rx_bytes = 0
+        self.stats_tx_bytes = 0
+        self.stats_commands = 0
+        self._setup()
+
+    def load_calibration_data(self):
+        self.calibration_factor = _f32(self.nvs.get(NVS_FACTOR_KEY, 1.0))
+        self.calibration_offset = _f32(self.nvs.get(NVS_OFFSET_KEY, 0.0))
+        self.motor_homed = bool(self.nvs.get(NVS_HOMED_KEY, False))
+        if self.calibration_factor == 0.0:
+            self.calibration_factor = 1.0
+        self.backlash_steps = min(int(self.nvs.get(NVS_BACKLASH_KEY, 0)), BACKLASH_MAX_STEPS)
+        table = [_f32(value) for value in self.nvs.get(NVS_TABLE_KEY, [])]
+        self.cal_table = table if len(table) <= CAL_TABLE_MAX_POINTS else []
+        self.cal_table_build_lut()
+        self.step_conversion.set_factor(self.calibration_factor)
+
+    def save_calibration_data(self):
+        """Grava apenas as chaves alteradas; `nvs_writes` conta as gravações por chave."""
+        values = {NVS_FACTOR_KEY: self.calibration_factor, NVS_OFFSET_KEY: self.calibration_offset,
+                  NVS_HOMED_KEY: self.motor_homed, NVS_BACKLASH_KEY: self.backlash_steps,
+                  NVS_TABLE_KEY: list(self.cal_table)}
+        for key, value in values.items():
+            if self.nvs.get(key) != value:
+                self.nvs[key] = value
+                self.nvs_writes[key] = self.nvs_writes.get(key, 0) + 1
+
+    def mark_calibration_dirty(self):
+        self._nvs_dirty = True
+        self._nvs_last_change_ms = self._millis()
+
+    def _nvs_flush_due_ms(self):
+        return max(self._nvs_last_change_ms + NVS_FLUSH_DELAY_MS, self._nvs_last_flush_ms + NVS_MIN_FLUSH_INTERVAL_MS)
+
+    def nvs_service(self):
+        if not self._nvs_dirty or self.state != STATE_IDLE or self.homing_in_progress:
+            return
+        if self._millis() < self._nvs_flush_due_ms():
+            return
+        self.save_calibration_data()
+        self._nvs_dirty = False
+        self._nvs_last_flush_ms = self._millis()
+
+    def _setup(self):
+        self.load_calibration_data()
+        self.motor_enable(True)
+        self.uart_send_message("ACK_UART_READY\n")
+        self.uart_send_message("ACK_HOMING_CONCLUIDO\n" if self.motor_homed else "ACK_NOT_HOMED\n")
+
+    # --- Tempo, posição e sensor ---
+    def _millis(self):
+        return int(self.now * 1000 + 1e-6)
+
+    def _steps_done(self):
+        if self._motion is None:
+            return 0
+        return self._motion.profile.steps_at(self.now - self._motion.start_time)
+
+    @property
+    def position_steps(self):
+        """g_position_steps: contador de passos do firmware (zerado pelo HOME), sem os passos da folga."""
+        if self._motion is None:
+            return self._position_base
+        output, _ = _backlash_output(self._motion.sign, self._steps_done(), self.backlash_slack, self.backlash_steps)
+        return self._position_base + self._motion.sign * output
+
+    def shaft_position(self):
+        if self._motion is None:
+            return self.shaft_steps
+        output, _ = _backlash_output(self._motion.sign, self._steps_done(), self.shaft_slack, self.faults.backlash_steps)
+        return self.shaft_steps + self._motion.sign * output
+
+    @property
+    def steps_generated(self):
+        return self._steps_generated_base + self._steps_done()
+
+    def _remaining_pulses(self):
+        if self._motion is None or self._motion.profile.pulses < 0:
+            return 0
+        return self._motion.profile.pulses - self._steps_done()
+
+    def _generation_done(self):
+        return self._motion is not None and self.now >= self._motion.end_time
+
+    def read_limit_switch(self):
+        """digitalRead(LIMIT_SWITCH_PIN): sensor virtual, ou o valor travado pela falha injetada."""
+        if self.faults.stuck_limit_switch is not None:
+            return bool(self.faults.stuck_limit_switch)
+        return self.shaft_position() <= self.limit_switch_steps
+
+    def degrees_to_steps(self, degrees):
+        return self.step_conversion.steps(degrees)
+
+    def calibrated_steps(self, nominal):
+        return corrected_steps(nominal, self.cal_lut)
+
+    def nominal_steps(self, motor):
+        return nominal_steps(motor, self.cal_lut)
+
+    def table_relative_pulses(self, direction, nominal_pulses):
+        if not self.cal_lut:
+            return nominal_pulses
+        start = self.nominal_steps(self.position_steps)
+        target = self.calibrated_steps(start + nominal_pulses if direction == FORWARD else start - nominal_pulses)
+        return target - self.position_steps if direction == FORWARD else self.position_steps - target
+
+    # --- Saída serial ---
+    def _print(self, text):
+        data = text.encode("latin-1", errors="replace")
+        self.stats_tx_bytes += len(data)
+        self.uart.uart_write(data, self.now, text.startswith("ACK_"))
+
+    def send_frame(self, frame_type, payload=b"", ack=False):
+        data = encode_frame(frame_type, payload)
+        self.stats_tx_bytes += len(data)
+        self.uart.uart_write(data, self.now, ack)
+
+    def uart_send_message(self, message):
+        if not self.binary_protocol:
+            self._print(message)
+            return
+        token = message[:-1] if message.endswith("\n") else message
+        code = _STATUS_BY_TOKEN.get(token)
+        if code is not None:
+            self.send_frame(FRAME_STATUS, bytes((code,)), token.startswith("ACK_"))
+        else:
+            self.send_frame(FRAME_TEXT, token.encode("latin-1", errors="replace")[:FRAME_MAX_PAYLOAD])
+
+    # --- Eventos ---
+    def receive(self, data, arrival_time):
+        """Bytes do host que chegam ao UART da ESP32 em `arrival_time`."""
+        self._rx.append((arrival_time, bytes(data)))
+
+    def next_event_time(self):
+        """Próximo instante em que o loop() muda algo; None se nada acontecerá sem novos comandos."""
+        times = []
+        if self._rx:
+            times.append(self._rx[0][0])
+        if self._rx_buffer:
+            if self.binary_protocol or b"\n" in self._rx_buffer:
+                return self.now
+            times.append(self._rx_last_byte_at + SERIAL_READ_TIMEOUT_S)
+        sensor = self.read_limit_switch()
+        if sensor != self._last_sensor_state:
+            return self.now
+        if self.state != STATE_IDLE:
+            if not self.motor_is_moving:
+                return self.now
+            if sensor and not self.homing_in_progress and self.state != STATE_AUTO_BACKOFF:
+                return self.now
+            if self.state == STATE_HOMING_SEARCHING and self.limit_switch_active and self.homing_in_progress:
+                return self.now
+            times.append(self._telemetry_due_time())
+            if self.state in _MOVING_STATES and self._motion is not None:
+                times.append(self._motion.end_time)
+            elif self.state == STATE_SCAN_DWELL:
+                times.append((self._scan["dwell_start_ms"] + self._scan["dwell_ms"]) / 1000.0)
+            elif self.state == STATE_PROGRAM_DWELL:
+                times.append((self._program_dwell_start_ms + self._program_current[3]) / 1000.0)
+        times.append(self._limit_switch_crossing_time())
+        if self._nvs_dirty and self.state == STATE_IDLE and not self.homing_in_progress:
+            times.append(self._nvs_flush_due_ms() / 1000.0)
+        times = [t for t in times if t is not None]
+        return max(min(times), self.now) if times else None
+
+    def _telemetry_due_time(self):
+        if self.telemetry_mode == "MS":
+            return (self._telemetry_last_ms + self.telemetry_interval) / 1000.0
+        if self.telemetry_mode == "PULSOS" and self._motion is not None:
+            steps = self._telemetry_last_steps + self.telemetry_interval - self._steps_generated_base
+            if self._motion.profile.pulses < 0 or steps <= self._motion.profile.pulses:
+                return self._motion.start_time + self._motion.profile.time_at(steps)
+        return None
+
+    def _limit_switch_crossing_time(self):
+        if self._motion is None or self.faults.stuck_limit_switch is not None:
+            return None
+        motion = self._motion
+        if self.shaft_position() > self.limit_switch_steps and motion.sign < 0:
+            steps = self.shaft_steps - self.limit_switch_steps
+        elif self.shaft_position() <= self.limit_switch_steps and motion.sign > 0:
+            steps = self.limit_switch_steps + 1 - self.shaft_steps
+        else:
+            return None
+        steps += _take_up(motion.sign, self.shaft_slack, self.faults.backlash_steps) # Pulsos antes de o eixo andar
+        if motion.profile.pulses >= 0 and steps > motion.profile.pulses:
+            return None
+        return motion.start_time + motion.profile.time_at(steps) + 1e-9
+
+    def advance(self, now):
+        """Executa o loop() a cada evento até o instante `now`."""
+        events_at_instant = 0
+        while True:
+            event_time = self.next_event_time()
+            if event_time is None or event_time > now:
+                break
+            events_at_instant = events_at_instant + 1 if event_time <= self.now else 0
+            if events_at_instant > MAX_EVENTS_PER_INSTANT:
+                raise RuntimeError(f"Simulador sem progresso em t={self.now:.6f} s (estado {self.state})")
+            self.now = max(self.now, event_time)
+            self._loop()
+        self.now = max(self.now, now)
+
+    # --- loop() ---
+    def _loop(self):
+        self.stats_loops += 1
+        while self._rx and self._rx[0][0] <= self.now:
+            arrival_time, data = self._rx.popleft()
+            self.stats_rx_bytes += len(data)
+            self._rx_buffer.extend(data)
+            self._rx_last_byte_at = arrival_time
+
+        current_sensor_state = self.read_limit_switch()
+        if current_sensor_state != self._last_sensor_state:
+            self.limit_switch_active = current_sensor_state
+            if current_sensor_state:
+                self.uart_send_message("WARNING_LIMIT_SWITCH_ACTIVE\n")
+            else:
+                self.uart_send_message("ACK_LIMIT_SWITCH_RESET\n")
+        self._last_sensor_state = current_sensor_state
+
+        if self.binary_protocol:
+            data, self._rx_buffer = bytes(self._rx_buffer), bytearray()
+            for byte in data:
+                self.binary_protocol_receive_byte(byte)
+        elif self._rx_buffer:
+            newline = self._rx_buffer.find(b"\n")
+            if newline != -1:
+                line = bytes(self._rx_buffer[:newline])
+                del self._rx_buffer[:newline + 1]
+                self.process_serial_command(line.decode("latin-1").strip())
+            elif self.now >= self._rx_last_byte_at + SERIAL_READ_TIMEOUT_S: # readStringUntil() expirou
+                line, self._rx_buffer = bytes(self._rx_buffer), bytearray()
+                self.process_serial_command(line.decode("latin-1").strip())
+
+        self.nvs_service()
+
+        if self.state == STATE_IDLE:
+            return
+        if not self.motor_is_moving:
+            self.motor_stop_movement()
+            return
+        if self.read_limit_switch():
+            if not self.homing_in_progress and self.state != STATE_AUTO_BACKOFF:
+                self.send_limit_switch_record()
+                self.uart_send_message("WARNING_LIMIT_SWITCH_HIT\n")
+                self.step_generator_stop()
+                if self.program_is_running():
+                    self._program_queue.clear()
+                self.step_conversion.reset()
+                self.state = STATE_AUTO_BACKOFF
+                self.step_generator_start(FORWARD, self.step_cruise_hz, _roundf(BACKTRACK_DEGREES / DEGREES_PER_PULSE))
+                return
+
+        self.telemetry_poll()
+
+        if self.state == STATE_MOVING_ANGULAR:
+            if self._generation_done():
+                self.motor_stop_movement()
+                self.uart_send_message("ACK_ANGULO_CONCLUIDO\n")
+        elif self.state == STATE_HOMING_SEARCHING:
+            if self.limit_switch_active and self.homing_in_progress:
+                self.step_generator_stop()
+                self.send_limit_switch_record()
+                trip_steps = self.position_steps
+                self.uart_send_message("HOME: Limit switch found. Initiating auto-backoff as part of homing.\n")
+                self.state = STATE_AUTO_BACKOFF
+                self.backoff_is_for_homing = True
+                if self.homing_phase == "FAST" and self.homing_slow_hz > 0:
+                    self.homing_fast_trip_steps = trip_steps
+                    self.homing_phase = "RETRY_BACKOFF"
+                    self.step_generator_start(FORWARD, self.homing_fast_hz,
+                                              _roundf(self.homing_backoff_degrees / DEGREES_PER_PULSE))
+                else:
+                    if self.homing_phase == "SLOW":
+                        self.send_homing_record(trip_steps)
+                    self.homing_phase = "FINAL_BACKOFF"
+                    self.step_generator_start(FORWARD, self.homing_slow_hz or self.homing_fast_hz,
+                                              _roundf(self.homing_final_backoff_degrees / DEGREES_PER_PULSE))
+        elif self.state == STATE_AUTO_BACKOFF:
+            if (self._generation_done() and self.backoff_is_for_homing and self.homing_phase == "RETRY_BACKOFF"
+                    and not self.read_limit_switch()):
+                if not self.limit_switch_active:
+                    self.homing_phase = "SLOW"
+                    self.state = STATE_HOMING_SEARCHING
+                    self.step_generator_start(REVERSE, self.homing_slow_hz, -1)
+            elif self._generation_done():
+                self.state = STATE_IDLE
+                self.step_generator_stop()
+                self.motor_is_moving = False
+                self.send_telemetry_record(True)
+                if not self.read_limit_switch():
+                    self.uart_send_message("ACK_AUTO_BACKOFF_COMPLETE\n")
+                else:
+                    self.uart_send_message("WARNING_AUTO_BACKOFF_STUCK\n")
+                if self.backoff_is_for_homing and self.homing_phase != "FINAL_BACKOFF":
+                    self.uart_send_message("NACK_HOMING_FAILED_INTERRUPTED\n")
+                    self.homing_in_progress = False
+                    self.backoff_is_for_homing = False
+                elif self.backoff_is_for_homing:
+                    self.motor_homed = True
+                    self._position_base = 0
+                    self.position_referenced = True
+                    self.step_conversion.reset()
+                    self.send_telemetry_record(True)
+                    self.uart_send_message("ACK_HOMING_CONCLUIDO\n")
+                    self.mark_calibration_dirty()
+                    self.homing_in_progress = False
+                    self.backoff_is_for_homing = False
+        elif self.state == STATE_SCAN_MOVING:
+            if self._generation_done():
+                self.step_generator_stop()
+                self.scan_point_reached()
+        elif self.state == STATE_SCAN_DWELL:
+            if self._millis() - self._scan["dwell_start_ms"] >= self._scan["dwell_ms"]:
+                self.scan_advance()
+        elif self.state == STATE_PROGRAM_MOVING:
+            if self._generation_done():
+                self.step_generator_stop()
+                self.state = STATE_PROGRAM_DWELL
+                self._program_dwell_start_ms = self._millis()
+        elif self.state == STATE_PROGRAM_DWELL:
+            if self._millis() - self._program_dwell_start_ms >= self._program_current[3]:
+                self.send_segment_record()
+                self._program_completed += 1
+                self.program_next_segment()
+
+    # --- Gerador de pulsos ---
+    def step_generator_start(self, direction, frequency_hz, total_pulses):
+        self.step_generator_stop()
+        if total_pulses > 0: # Pulsos extras para atravessar a folga na reversão
+            total_pulses += _take_up(1 if direction == FORWARD else -1, self.backlash_slack, self.backlash_steps)
+        self.step_cruise_hz = frequency_hz
+        profile = MotionProfile(frequency_hz, total_pulses, self.ramp_profile, self.acceleration, self.jerk)
+        self._motion = _Motion(self.now, direction, profile)
+
+    def step_generator_stop(self):
+        if self._motion is None:
+            return
+        steps, sign = self._steps_done(), self._motion.sign
+        output, self.backlash_slack = _backlash_output(sign, steps, self.backlash_slack, self.backlash_steps)
+        self._position_base += sign * output
+        output, self.shaft_slack = _backlash_output(sign, steps, self.shaft_slack, self.faults.backlash_steps)
+        self.shaft_steps += sign * output
+        self._steps_generated_base += steps
+        self._motion = None
+
+    # --- Movimentos ---
+    def validate_angular_frequency(self, frequency_hz):
+        if frequency_hz < 1:
+            return 50
+        return min(frequency_hz, self.max_speed_hz)
+
+    def motor_enable(self, enable):
+        self.motor_is_enabled = enable
+        if enable:
+            self.uart_send_message("ACK_HABILITADO\n")
+            self.limit_switch_active = self.read_limit_switch()
+            self.motor_homed = False # Como no firmware: ao habilitar, assume não referenciado
+            self.uart_send_message("ACK_LIMIT_SWITCH_RESET\n")
+            self.uart_send_message("ACK_HOMING_CONCLUIDO\n" if self.motor_homed else "ACK_NOT_HOMED\n")
+        else:
+            self.motor_stop_movement()
+            self.uart_send_message("ACK_DESABILITADO\n")
+
+    def motor_stop_movement(self):
+        if self.state == STATE_IDLE and not self.homing_in_progress:
+            return
+        if self.program_is_running():
+            self._program_queue.clear()
+        self.state = STATE_IDLE
+        self.step_generator_stop()
+        self.motor_is_moving = False
+        if self.homing_in_progress:
+            self.uart_send_message("NACK_HOMING_FAILED_INTERRUPTED\n")
+            self.homing_in_progress = False
+            self.backoff_is_for_homing = False
+        else:
+            self.uart_send_message("ACK_PARADO\n")
+        self.send_telemetry_record(True)
+
+    def _check_can_move(self):
+        if not self.motor_is_enabled:
+            self.uart_send_message("NACK_MOTOR_DESABILITADO\n")
+            return False
+        if self.state != STATE_IDLE:
+            self.uart_send_message("NACK_MOTOR_OCUPADO\n")
+            return False
+        return True
+
+    def motor_start_movement(self, direction, frequency_hz, total_pulses):
+        if not self._check_can_move():
+            return
+        self.motor_is_moving = True
+        self.state = STATE_MOVING_ANGULAR
+        self.homing_in_progress = False
+        self.backoff_is_for_homing = False
+        self.step_generator_start(direction, frequency_hz, total_pulses)
+        self.uart_send_message("ACK_MOVIMENTO_INICIADO\n")
+
+    def motor_move_degrees(self, direction, degrees, frequency_hz):
+        if degrees < 0 or degrees > 360:
+            self.uart_send_message("NACK_ANGULO_RANGE_INVALIDO\n")
+            return
+        forward = direction == FORWARD
+        units = self.step_conversion.units(degrees)
+        total_q, nominal_pulses = self.step_conversion.relative(forward, units)
+        required_pulses = self.table_relative_pulses(direction, nominal_pulses)
+        if units <= 0 or required_pulses < 0:
+            self.uart_send_message("NACK_ANGULO_INVALIDO\n")
+            return
+        if not self._check_can_move():
+            return
+        self.step_conversion.carry(total_q, forward, nominal_pulses)
+        if required_pulses == 0: # Abaixo de um passo: fica no resto para o próximo movimento relativo
+            self.uart_send_message("ACK_ANGULO_CONCLUIDO\n")
+            return
+        self.motor_start_movement(direction, frequency_hz, required_pulses)
+
+    def motor_move_to(self, absolute_degrees, frequency_hz):
+        if not self._check_can_move():
+            return
+        if math.isnan(absolute_degrees) or absolute_degrees < 0 or absolute_degrees > 360:
+            self.uart_send_message("NACK_ANGULO_RANGE_INVALIDO\n")
+            return
+        self.step_conversion.reset()
+        revolution = PULSES_PER_REVOLUTION
+        target = self.calibrated_steps(self.degrees_to_steps(absolute_degrees))
+        delta = target % revolution - self.position_steps % revolution
+        if delta > revolution // 2:
+            delta -= revolution
+        elif delta <= -revolution // 2:
+            delta += revolution
+        if delta == 0:
+            self.uart_send_message("ACK_ANGULO_CONCLUIDO\n")
+            return
+        self.motor_start_movement(FORWARD if delta > 0 else REVERSE, frequency_hz, abs(delta))
+
+    def send_position_record(self):
+        position = self.position_steps
+        nominal = self.nominal_steps(position) % PULSES_PER_REVOLUTION
+        degrees = _f32(math.fmod(_f32(nominal * DEGREES_PER_PULSE * self.calibration_factor), 360.0))
+        referenced = 1 if self.position_referenced else 0
+        if self.binary_protocol:
+            self.send_frame(FRAME_POSITION, struct.pack("<ifB", position, degrees, referenced))
+        else:
+            self._print(f"POS {position} {degrees:.3f} {referenced}\n")
+
+    def send_limit_switch_record(self):
+        position = self.position_steps # loop() roda no instante exato do cruzamento, como a interrupção
+        if self.binary_protocol:
+            self.send_frame(FRAME_LIMIT_SWITCH, struct.pack("<i", position))
+        else:
+            self._print(f"LSW {position}\n")
+
+    def send_homing_record(self, slow_trip_steps):
+        values = (self.homing_fast_trip_steps, slow_trip_steps, slow_trip_steps - self.homing_fast_trip_steps)
+        if self.binary_protocol:
+            self.send_frame(FRAME_HOMING, struct.pack("<3i", *values))
+        else:
+            self._print("HOM " + " ".join(str(value) for value in values) + "\n")
+
+    def send_stats_record(self):
+        values = (self.stats_loops, 0, 0, 0, _u32(self.stats_rx_bytes), _u32(self.stats_tx_bytes),
+                  _u32(self.stats_commands), 0, 0)
+        if self.binary_protocol:
+            self.send_frame(FRAME_STATS, struct.pack("<Q8I", *values))
+        else:
+            self._print("STATS " + " ".join(str(value) for value in values) + "\n")
+
+    def motor_home(self):
+        if not self._check_can_move():
+            return
+        self.homing_in_progress = True
+        self.motor_homed = False
+        self.limit_switch_active = self.read_limit_switch()
+        self.uart_send_message("ACK_HOMING_STARTED\n")
+        self.state = STATE_HOMING_SEARCHING
+        self.motor_is_moving = True
+        self.backoff_is_for_homing = True
+        self.homing_phase = "FAST"
+        self.step_generator_start(REVERSE, self.homing_fast_hz, -1)
+
+    def command_stop(self):
+        if self.state == STATE_IDLE and not self.homing_in_progress:
+            self.uart_send_message("ACK_PARADO\n")
+        else:
+            self.step_conversion.reset()
+            self.motor_stop_movement()
+
+    def command_set_direction(self, direction):
+        self.current_direction = direction
+        self.uart_send_message("ACK_DIR_FRENTE\n" if direction == FORWARD else "ACK_DIR_RE\n")
+
+    # --- SCAN / VARREDURA ---
+    def scan_start(self, args, continuous):
+        if not self._check_can_move():
+            return
+        tokens = split_command_args(args, 5)
+        start_degrees = end_degrees = step_degrees = 0.0
+        dwell_ms, frequency_hz = -1, 0
+        if tokens is not None and len(tokens) == 5:
+            start_degrees, end_degrees, step_degrees = (_to_float(token) for token in tokens[:3])
+            dwell_ms, frequency_hz = _to_int(tokens[3]), _to_int(tokens[4])
+        conversion = self.step_conversion
+        start_units, end_units, step_units = (conversion.units(value)
+                                              for value in (start_degrees, end_degrees, step_degrees))
+        if (not 0 <= start_degrees <= 360 or not 0 <= end_degrees <= 360 or
+                conversion.units_to_steps(start_units) == conversion.units_to_steps(end_units) or
+                conversion.units_to_steps(step_units) < 1 or dwell_ms < 0 or frequency_hz < 1):
+            self.uart_send_message("NACK_SCAN_INVALIDO\n")
+            return
+        sign = 1 if end_units > start_units else -1
+        span = (end_units - start_units) * sign
+        conversion.reset()
+        self._scan = { # Ângulos em unidades (ANGLE_UNITS_PER_DEGREE), convertidos ponto a ponto
+            "continuous": continuous, "start": start_units, "sign": sign, "span": span, "step": step_units,
+            "last_index": (span + step_units - 1) // step_units, "index": 0, "index_step": 1, "pass": 0,
+            "dwell_ms": _u32(dwell_ms), "frequency_hz": self.validate_angular_frequency(_u32(frequency_hz)),
+            "dwell_start_ms": 0,
+        }
+        self.motor_is_moving = True
+        self.homing_in_progress = False
+        self.backoff_is_for_homing = False
+        self.uart_send_message("ACK_SCAN_INICIADO\n")
+        self.scan_move_to_current_point()
+
+    def scan_move_to_current_point(self):
+        scan = self._scan
+        offset = min(scan["index"] * scan["step"], scan["span"])
+        target = self.step_conversion.units_to_steps(scan["start"] + scan["sign"] * offset)
+        delta = self.calibrated_steps(target) - self.position_steps
+        if delta == 0:
+            self.scan_point_reached()
+            return
+        self.state = STATE_SCAN_MOVING
+        self.step_generator_start(FORWARD if delta > 0 else REVERSE, scan["frequency_hz"], abs(delta))
+
+    def scan_point_reached(self):
+        self.state = STATE_SCAN_DWELL
+        self._scan["dwell_start_ms"] = self._millis()
+        self.send_scan_record()
+
+    def scan_advance(self):
+        scan = self._scan
+        pass_end_index = scan["last_index"] if scan["index_step"] > 0 else 0
+        if scan["index"] == pass_end_index:
+            if not scan["continuous"]:
+                self.state = STATE_IDLE
+                self.motor_is_moving = False
+                self.uart_send_message("ACK_SCAN_CONCLUIDO\n")
+                self.send_telemetry_record(True)
+                return
+            scan["index_step"] = -scan["index_step"]
+            scan["pass"] += 1
+        scan["index"] += scan["index_step"]
+        self.scan_move_to_current_point()
+
+    def send_scan_record(self):
+        scan, position = self._scan, self.position_steps
+        if self.binary_protocol:
+            self.send_frame(FRAME_SCAN_POINT, struct.pack("<IIi", _u32(scan["pass"]), _u32(scan["index"]), position))
+        else:
+            self._print(f"SCN {scan['pass']} {scan['index']} {position}\n")
+
+    # --- Programa (PROG) ---
+    def program_make_segment(self, direction, degrees, frequency_hz, dwell_ms):
+        """Segmento (direção, ângulo em unidades, frequência, dwell_ms) ou None se inválido."""
+        if degrees <= 0 or degrees > 360 or frequency_hz < 1 or dwell_ms < 0:
+            return None
+        units = self.step_conversion.units(degrees)
+        if self.step_conversion.units_to_steps(units) <= 0:
+            return None
+        return (direction, units, self.validate_angular_frequency(_u32(frequency_hz)), _u32(dwell_ms))
+
+    def program_is_running(self):
+        return self.state in (STATE_PROGRAM_MOVING, STATE_PROGRAM_DWELL)
+
+    def program_add_segments(self, segments):
+        if self.state != STATE_IDLE and not self.program_is_running():
+            self.uart_send_message("NACK_MOTOR_OCUPADO\n")
+            return
+        if len(self._program_queue) + len(segments) > PROGRAM_QUEUE_SIZE:
+            self.uart_send_message("NACK_PROG_CHEIO\n")
+            return
+        self._program_queue.extend(segments)
+        self.uart_send_message("ACK_PROG_ADICIONADO\n")
+
+    def program_add_command(self, args):
+        segments = []
+        while args:
+            segment_str, _, args = args.partition(";")
+            tokens = split_command_args(segment_str, 4)
+            segment = None
+            if (len(segments) < PROGRAM_MAX_SEGMENTS_PER_COMMAND and tokens is not None and len(tokens) == 4 and
+                    tokens[0] in ("FRENTE", "RE")):
+                segment = self.program_make_segment(FORWARD if tokens[0] == "FRENTE" else REVERSE, _to_float(tokens[1]),
+                                                    _to_int(tokens[2]), _to_int(tokens[3]))
+            if segment is None:
+                self.uart_send_message("NACK_PROG_INVALIDO\n")
+                return
+            segments.append(segment)
+        if not segments:
+            self.uart_send_message("NACK_PROG_INVALIDO\n")
+            return
+        self.program_add_segments(segments)
+
+    def program_start(self):
+        if not self._check_can_move():
+            return
+        if not self._program_queue:
+            self.uart_send_message("NACK_PROG_VAZIO\n")
+            return
+        self._program_completed = 0
+        self.motor_is_moving = True
+        self.homing_in_progress = False
+        self.backoff_is_for_homing = False
+        self.uart_send_message("ACK_PROG_INICIADO\n")
+        self.program_next_segment()
+
+    def program_next_segment(self):
+        if not self._program_queue:
+            self.state = STATE_IDLE
+            self.motor_is_moving = False
+            self.uart_send_message("ACK_PROG_CONCLUIDO\n")
+            self.send_telemetry_record(True)
+            return
+        self._program_current = self._program_queue.popleft()
+        self.state = STATE_PROGRAM_MOVING
+        direction, units, frequency_hz, _ = self._program_current
+        forward = direction == FORWARD
+        total_q, nominal_pulses = self.step_conversion.relative(forward, units)
+        self.step_conversion.carry(total_q, forward, nominal_pulses)
+        if nominal_pulses <= 0: # Coberto pelo resto: só o dwell
+            self.state = STATE_PROGRAM_DWELL
+            self._program_dwell_start_ms = self._millis()
+            return
+        pulses = max(1, self.table_relative_pulses(direction, nominal_pulses))
+        self.step_generator_start(direction, frequency_hz, pulses)
+
+    def send_segment_record(self):
+        position = self.position_steps
+        if self.binary_protocol:
+            self.send_frame(FRAME_SEGMENT_DONE, struct.pack("<Ii", _u32(self._program_completed), position))
+        else:
+            self._print(f"SEG {self._program_completed} {position}\n")
+
+    # --- Telemetria ---
+    def telemetry_poll(self):
+        if self.telemetry_mode == "MS" and self._millis() - self._telemetry_last_ms >= self.telemetry_interval:
+            self.send_telemetry_record(False)
+        elif (self.telemetry_mode == "PULSOS" and
+              self.steps_generated - self._telemetry_last_steps >= self.telemetry_interval):
+            self.send_telemetry_record(False)
+
+    def send_telemetry_record(self, force):
+        if self.telemetry_mode == "OFF":
+            return
+        self._telemetry_last_steps = self.steps_generated
+        self._telemetry_last_ms = self._millis()
+        position, remaining, state = self.position_steps, self._remaining_pulses(), self.state
+        if self.binary_protocol:
+            payload = struct.pack("<iiB", position, remaining, state)
+            if force or self.uart.uart_available_for_write(self.now) >= len(payload) + FRAME_OVERHEAD + 1:
+                self.send_frame(FRAME_TELEMETRY, payload)
+        else:
+            record = f"TLM {position} {remaining} {state}\n"
+            if force or self.uart.uart_available_for_write(self.now) >= len(record):
+                self._print(record)
+
+    def configure_telemetry(self, args):
+        mode, _, value = args.partition(" ")
+        value = _to_int(value) if value else 0
+        if mode == "OFF":
+            self.telemetry_mode = "OFF"
+        elif mode in ("PULSOS", "MS") and value >= 1:
+            self.telemetry_mode = mode
+            self.telemetry_interval = value
+        else:
+            self.uart_send_message("NACK_TELEMETRIA_INVALIDA\n")
+            return
+        self._telemetry_last_steps = self.steps_generated
+        self.uart_send_message("ACK_TELEMETRIA\n")
+
+    def configure_ramp(self, args):
+        tokens = split_command_args(args, 4)
+        if not tokens or tokens[0] not in (RAMP_CONSTANT, RAMP_TRAPEZOIDAL, RAMP_SCURVE):
+            self.uart_send_message("NACK_RAMPA_INVALIDA\n")
+            return
+        max_speed_hz = _to_int(tokens[1]) if len(tokens) > 1 else self.max_speed_hz
+        acceleration = _to_float(tokens[2]) if len(tokens) > 2 else self.acceleration
+        jerk = _to_float(tokens[3]) if len(tokens) > 3 else self.jerk
+        if not 1 <= max_speed_hz <= MAX_STEP_FREQUENCY_HZ or acceleration <= 0 or jerk <= 0:
+            self.uart_send_message("NACK_RAMPA_INVALIDA\n")
+            return
+        self.ramp_profile = tokens[0]
+        self.max_speed_hz = max_speed_hz
+        self.acceleration = acceleration
+        self.jerk = jerk
+        self.uart_send_message("ACK_RAMPA\n")
+
+    def configure_backlash(self, args):
+        args = args.strip()
+        if not args[:1].isdigit() or _to_int(args) > BACKLASH_MAX_STEPS:
+            self.uart_send_message("NACK_FOLGA_INVALIDA\n")
+            return
+        if self.state != STATE_IDLE:
+            self.uart_send_message("NACK_MOTOR_OCUPADO\n")
+            return
+        self.backlash_steps = _to_int(args)
+        self.backlash_slack = min(self.backlash_slack, self.backlash_steps)
+        self.uart_send_message("ACK_FOLGA\n")
+        self.mark_calibration_dirty()
+
+    def configure_homing(self, args):
+        tokens = split_command_args(args, 4)
+        if not tokens:
+            self.uart_send_message("NACK_HOMING_INVALIDO\n")
+            return
+        fast_hz = _to_int(tokens[0])
+        slow_hz = _to_int(tokens[1]) if len(tokens) > 1 else self.homing_slow_hz
+        backoff_degrees = _to_float(tokens[2]) if len(tokens) > 2 else self.homing_backoff_degrees
+        final_backoff_degrees = _to_float(tokens[3]) if len(tokens) > 3 else self.homing_final_backoff_degrees
+        if (not 1 <= fast_hz <= MAX_STEP_FREQUENCY_HZ or not 0 <= slow_hz <= fast_hz
+                or not 0 < backoff_degrees <= HOMING_MAX_BACKOFF_DEGREES
+                or not 0 < final_backoff_degrees <= HOMING_MAX_BACKOFF_DEGREES):
+            self.uart_send_message("NACK_HOMING_INVALIDO\n")
+            return
+        if self.homing_in_progress:
+            self.uart_send_message("NACK_MOTOR_OCUPADO\n")
+            return
+        self.homing_fast_hz = fast_hz
+        self.homing_slow_hz = slow_hz
+        self.homing_backoff_degrees = backoff_degrees
+        self.homing_final_backoff_degrees = final_backoff_degrees
+        self.uart_send_message("ACK_HOMING_CONFIG\n")
+
+    # --- Calibração ---
+    def calibrate_motor_min_squares(self, theoretical_angles, measured_angles):
+        n = len(theoretical_angles)
+        sum_x, sum_y = sum(theoretical_angles), sum(measured_angles)
+        sum_xy = sum(x * y for x, y in zip(theoretical_angles, measured_angles))
+        sum_x2 = sum(x * x for x in theoretical_angles)
+        denominator = _f32(n * sum_x2 - sum_x * sum_x)
+        if denominator == 0:
+            self.uart_send_message("NACK_CALIBRATION_ERROR\n")
+            self.calibration_factor = 1.0
+            self.calibration_offset = 0.0
+            self.step_conversion.set_factor(self.calibration_factor)
+            self.mark_calibration_dirty()
+            return
+        self.calibration_factor = _f32((n * sum_xy - sum_x * sum_y) / denominator)
+        self.calibration_offset = _f32((sum_y - self.calibration_factor * sum_x) / n)
+        if abs(self.calibration_factor) < 0.000001:
+            self.uart_send_message("NACK_CALIBRATION_FACTOR_ZERO\n")
+            self.calibration_factor = 1.0
+            self.calibration_offset = 0.0
+        self.cal_table = []
+        self.cal_table_build_lut()
+        self.step_conversion.set_factor(self.calibration_factor)
+        self.uart_send_message("ACK_CALIBRATION_COMPLETE\n")
+        self.mark_calibration_dirty()
+
+    def reset_calibration_data(self):
+        self.calibration_factor = 1.0
+        self.calibration_offset = 0.0
+        self.cal_table = []
+        self.cal_table_build_lut()
+        self.step_conversion.set_factor(self.calibration_factor)
+        self.motor_homed = False
+        self.mark_calibration_dirty()
+        self.uart_send_message("ACK_CALIBRATION_RESET\n")
+        self.uart_send_message("ACK_NOT_HOMED\n")
+
+    def cal_table_build_lut(self):
+        self.cal_lut = build_step_lookup(self.cal_table) if self.cal_table else []
+
+    def cal_table_add_command(self, args):
+        tokens = split_command_args(args, CAL_TABLE_MAX_VALUES_PER_COMMAND + 1)
+        index = _to_int(tokens[0]) if tokens and len(tokens) > 1 else -1
+        if index == 0:
+            self.cal_table_upload = []
+        if index < 0 or index != len(self.cal_table_upload) or index + len(tokens) - 1 > CAL_TABLE_MAX_POINTS:
+            self.uart_send_message("NACK_CALTAB_INVALIDA\n")
+            return
+        for token in tokens[1:]:
+            correction = _f32(_to_float(token))
+            if abs(correction) > CAL_TABLE_MAX_CORRECTION_STEPS:
+                self.uart_send_message("NACK_CALTAB_INVALIDA\n")
+                return
+            self.cal_table_upload.append(correction)
+        self.uart_send_message("ACK_CALTAB\n")
+
+    def cal_table_apply_command(self, args):
+        points = _to_int(args.strip())
+        table = self.cal_table_upload
+        if not 2 <= points <= CAL_TABLE_MAX_POINTS or points != len(table):
+            self.uart_send_message("NACK_CALTAB_INVALIDA\n")
+            return
+        spacing_steps = PULSES_PER_REVOLUTION / points
+        if any(table[(i + 1) % points] - table[i] <= -spacing_steps for i in range(points)):
+            self.uart_send_message("NACK_CALTAB_INVALIDA\n")
+            return
+        if self.state != STATE_IDLE:
+            self.uart_send_message("NACK_MOTOR_OCUPADO\n")
+            return
+        self.cal_table = list(table)
+        self.calibration_factor = 1.0
+        self.calibration_offset = 0.0
+        self.cal_table_build_lut()
+        self.step_conversion.set_factor(self.calibration_factor)
+        self.uart_send_message("ACK_CALIBRATION_COMPLETE\n")
+        self.mark_calibration_dirty()
+
+    # --- Comandos ---
+    def process_serial_command(self, command):
+        self.commands_processed += 1
+        self.stats_commands += 1
+        if not self.binary_protocol:
+            self.uart_send_message(command)
+            self.uart_send_message("\n")
+
+        if command == "HABILITAR":
+            self.motor_enable(True)
+        elif command == "DESABILITAR":
+            self.motor_enable(False)
+        elif command == "PARAR":
+            self.command_stop()
+        elif command == "DIR FRENTE":
+            self.command_set_direction(FORWARD)
+        elif command == "DIR RE":
+            self.command_set_direction(REVERSE)
+        elif command.startswith("MOVER ANGULO "):
+            data = command[len("MOVER ANGULO "):]
+            degrees_str, space, frequency_str = data.partition(" ")
+            frequency_hz = self.validate_angular_frequency(_u32(_to_int(frequency_str))) if space else 50
+            self.motor_move_degrees(self.current_direction, _to_float(degrees_str), frequency_hz)
+        elif command.startswith("MOVER_PARA "):
+            tokens = split_command_args(command[len("MOVER_PARA "):], 2)
+            if not tokens:
+                self.uart_send_message("NACK_ANGULO_INVALIDO\n")
+            else:
+                frequency_hz = _u32(_to_int(tokens[1])) if len(tokens) == 2 else 50
+                self.motor_move_to(_to_float(tokens[0]), self.validate_angular_frequency(frequency_hz))
+        elif command == "POSICAO":
+            self.send_position_record()
+            self.uart_send_message("ACK_POSICAO\n")
+        elif command == "STATS":
+            self.send_stats_record()
+            self.uart_send_message("ACK_STATS\n")
+        elif command.startswith("DEBOUNCE "):
+            args = command[len("DEBOUNCE "):].strip()
+            if not args[:1].isdigit() or _to_int(args) > LIMIT_SWITCH_MAX_DEBOUNCE_US:
+                self.uart_send_message("NACK_DEBOUNCE_INVALIDO\n")
+            else:
+                self.limit_switch_debounce_us = _to_int(args)
+                self.uart_send_message("ACK_DEBOUNCE\n")
+        elif command.startswith("HOMING "):
+            self.configure_homing(command[len("HOMING "):])
+        elif command.startswith("FOLGA "):
+            self.configure_backlash(command[len("FOLGA "):])
+        elif command.startswith("CALTAB ADD "):
+            self.cal_table_add_command(command[len("CALTAB ADD "):])
+        elif command.startswith("CALTAB APLICAR "):
+            self.cal_table_apply_command(command[len("CALTAB APLICAR "):])
+        elif command.startswith("CALIBRAR "):
+            theoretical, measured = [], []
+            points = command[len("CALIBRAR "):].split(";")
+            for point in points[:CALIBRATION_MAX_POINTS]:
+                theoretical_str, comma, measured_str = point.partition(",")
+                if comma:
+                    theoretical.append(_to_float(theoretical_str))
+                    measured.append(_to_float(measured_str))
+            if len(theoretical) >= 2 and len(points) <= CALIBRATION_MAX_POINTS:
+                self.calibrate_motor_min_squares(theoretical, measured)
+            else:
+                self.uart_send_message("NACK_CALIBRATION_DATA_INCOMPLETE\n")
+        elif command == "HOME":
+            self.motor_home()
+        elif command == "RESET_CALIB":
+            self.reset_calibration_data()
+        elif command.startswith("TELEMETRIA "):
+            self.configure_telemetry(command[len("TELEMETRIA "):])
+        elif command.startswith("RAMPA "):
+            self.configure_ramp(command[len("RAMPA "):])
+        elif command.startswith("SCAN "):
+            self.scan_start(command[len("SCAN "):], False)
+        elif command.startswith("VARREDURA "):
+            self.scan_start(command[len("VARREDURA "):], True)
+        elif command.startswith("PROG ADD "):
+            self.program_add_command(command[len("PROG ADD "):])
+        elif command == "PROG INICIAR":
+            self.program_start()
+        elif command == "PROG LIMPAR":
+            if self.program_is_running():
+                self.uart_send_message("NACK_MOTOR_OCUPADO\n")
+            else:
+                self._program_queue.clear()
+                self.uart_send_message("ACK_PROG_LIMPO\n")
+        elif command == "PROTO BIN":
+            self.uart_send_message("ACK_PROTO_BIN\n")
+            self.binary_protocol = True
+        else:
+            self.uart_send_message("NACK_UNKNOWN_COMMAND\n")
+
+    def binary_protocol_receive_byte(self, byte):
+        frame = self._rx_frame
+        if not frame and byte != FRAME_SOF:
+            return
+        frame.append(byte)
+        if len(frame) == 2 and (byte == 0 or byte > FRAME_MAX_PAYLOAD + 1):
+            frame.clear()
+            self.uart_send_message("NACK_FRAME_MALFORMED\n")
+            return
+        if len(frame) >= 2 and len(frame) == frame[1] + FRAME_OVERHEAD:
+            body, (received_crc,) = bytes(frame[1:-2]), struct.unpack("<H", frame[-2:])
+            frame.clear()
+            if crc16_ccitt(body) != received_crc:
+                self.uart_send_message("NACK_FRAME_CRC\n")
+                return
+            self.process_binary_frame(body[1], body[2:])
+
+    def process_binary_frame(self, opcode, payload):
+        self.commands_processed += 1
+        self.stats_commands += 1
+        if opcode == OP_ENABLE:
+            self.motor_enable(True)
+        elif opcode == OP_DISABLE:
+            self.motor_enable(False)
+        elif opcode == OP_STOP:
+            self.command_stop()
+        elif opcode == OP_DIR:
+            if len(payload) < 1:
+                self.uart_send_message("NACK_FRAME_MALFORMED\n")
+            else:
+                self.command_set_direction(REVERSE if payload[0] else FORWARD)
+        elif opcode in (OP_MOVE_ANGLE, OP_MOVE_TO):
+            if len(payload) < 6:
+                self.uart_send_message("NACK_FRAME_MALFORMED\n")
+                return
+            degrees, frequency_hz = struct.unpack_from("<fH", payload)
+            if opcode == OP_MOVE_ANGLE:
+                self.motor_move_degrees(self.current_direction, degrees, self.validate_angular_frequency(frequency_hz))
+            else:
+                self.motor_move_to(degrees, self.validate_angular_frequency(frequency_hz))
+        elif opcode == OP_HOME:
+            self.motor_home()
+        elif opcode == OP_CALIBRATE:
+            count = payload[0] if payload else 0
+            if not 2 <= count <= CALIBRATION_MAX_POINTS or len(payload) < 1 + count * 8:
+                self.uart_send_message("NACK_CALIBRATION_DATA_INCOMPLETE\n")
+                return
+            pairs = [struct.unpack_from("<ff", payload, 1 + i * 8) for i in range(count)]
+            self.calibrate_motor_min_squares([t for t, _ in pairs], [m for _, m in pairs])
+        elif opcode == OP_RESET_CALIB:
+            self.reset_calibration_data()
+        elif opcode == OP_PROGRAM_ADD:
+            segment_size = 11
+            count = payload[0] if payload else 0
+            if count == 0 or count > PROGRAM_MAX_SEGMENTS_PER_COMMAND or len(payload) < 1 + count * segment_size:
+                self.uart_send_message("NACK_FRAME_MALFORMED\n")
+                return
+            segments = []
+            for i in range(count):
+                direction, degrees, frequency_hz, dwell_ms = struct.unpack_from("<BfHI", payload, 1 + i * segment_size)
+                segment = self.program_make_segment(REVERSE if direction else FORWARD, degrees, frequency_hz, dwell_ms)
+                if segment is None:
+                    self.uart_send_message("NACK_PROG_INVALIDO\n")
+                    return
+                segments.append(segment)
+            self.program_add_segments(segments)
+        elif opcode == OP_TEXT_COMMAND:
+            self.commands_processed -= 1 # Contado em process_serial_command
+            self.stats_commands -= 1
+            self.process_serial_command(payload.decode("latin-1"))
+        elif opcode == OP_PROTO_TEXT:
+            self.uart_send_message("ACK_PROTO_TEXT\n")
+            self.binary_protocol = False
+        else:
+            self.uart_send_message("NACK_UNKNOWN_COMMAND\n")
+
+
+class SimulatedSerial:
+    """Porta serial simulada (subconjunto da interface do pyserial) ligada a um SimulatedFirmware.
+
+    `time_scale` é quantos segundos simulados passam por segundo real. Com None o tempo é virtual
+    e salta para o próximo evento sempre que o host espera por dados: movimentos longos terminam
+    na hora, o que permite milhares de comandos por segundo. `baudrate=None` desliga o modelo de
+    vazão do UART (cada byte ocupa BITS_PER_BYTE / baudrate segundos em cada sentido).
+    """
+
+    def __init__(self, baudrate=BAUD_RATE, time_scale=1.0, faults=None, nvs=None,
+                 limit_switch_steps=DEFAULT_LIMIT_SWITCH_STEPS, timeout=0.1, seed=None):
+        self.port = "sim://radar"
+        self.baudrate = baudrate
+        self.time_scale = time_scale
+        self.timeout = timeout
+        self.faults = faults if faults is not None else SimulatorFaults()
+        self.is_open = True
+        self.bytes_dropped = 0
+        self._random = random.Random(seed)
+        self._cond = threading.Condition()
+        self._real_start = time.monotonic()
+        self._virtual_now = 0.0
+        self._tx_free_at = 0.0 # Fim da transmissão ESP32 -> host já enfileirada
+        self._rx_free_at = 0.0 # Idem host -> ESP32
+        self._output = deque() # (instante de entrega ao host, bytes)
+        with self._cond:
+            self.firmware = SimulatedFirmware(self, nvs, limit_switch_steps, self.faults)
+
+    @property
+    def simulated_time(self):
+        with self._cond:
+            return self._now()
+
+    def _now(self):
+        if self.time_scale is not None:
+            real_elapsed = time.monotonic() - self._real_start
+            self._virtual_now = max(self._virtual_now, real_elapsed * self.time_scale)
+        return self._virtual_now
+
+    def _byte_time(self, count):
+        return count * BITS_PER_BYTE / self.baudrate if self.baudrate else 0.0
+
+    def _drop(self, data, probability):
+        if probability <= 0:
+            return data
+        kept = bytes(b for b in data if self._random.random() >= probability)
+        self.bytes_dropped += len(data) - len(kept)
+        return kept
+
+    # --- Lado da ESP32 (chamado pelo SimulatedFirmware) ---
+    def uart_write(self, data, now, ack=False):
+        start = max(now + (self.faults.ack_delay_s if ack else 0.0), self._tx_free_at)
+        self._tx_free_at = start + self._byte_time(len(data))
+        data = self._drop(data, self.faults.drop_tx_probability)
+        if data:
+            self._output.append((self._tx_free_at, data))
+            self._cond.notify_all()
+
+    def uart_available_for_write(self, now):
+        backlog = (self._tx_free_at - now) * self.baudrate / BITS_PER_BYTE if self.baudrate else 0
+        return max(0, UART_TX_BUFFER - int(math.ceil(backlog)))
+
+    # --- Lado do host (interface pyserial) ---
+    def write(self, data):
+        data = bytes(data)
+        with self._cond:
+            if not self.is_open:
+                raise OSError("Porta simulada fechada.")
+            now = self._now()
+            self.firmware.advance(now)
+            self._rx_free_at = max(now, self._rx_free_at) + self._byte_time(len(data))
+            kept = self._drop(data, self.faults.drop_rx_probability)
+            if kept:
+                self.firmware.receive(kept, self._rx_free_at)
+            self.firmware.advance(now)
+            self._cond.notify_all()
+        return len(data)
+
+    def _take(self, now, size):
+        chunks = []
+        while self._output and self._output[0][0] <= now and size > 0:
+            delivery_time, data = self._output.popleft()
+            if len(data) > size:
+                self._output.appendleft((delivery_time, data[size:]))
+                data = data[:size]
+            chunks.append(data)
+            size -= len(data)
+        return b"".join(chunks)
+
+    def _next_time(self):
+        times = [self.firmware.next_event_time()]
+        if self._output:
+            times.append(self._output[0][0])
+        times = [t for t in times if t is not None]
+        return min(times) if times else None
+
+    def read(self, size=1):
+        """Bloqueia até haver bytes ou `timeout` (segundos reais) expirar."""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while self.is_open:
+                now = self._now()
+                self.firmware.advance(now)
+                data = self._take(now, size)
+                if data:
+                    return data
+                next_time = self._next_time()
+                if self.time_scale is None and next_time is not None:
+                    self._virtual_now = max(self._virtual_now, next_time) # Salta até o próximo evento
+                    continue
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    break
+                if next_time is not None and self.time_scale:
+                    until_event = (next_time - now) / self.time_scale
+                    wait = until_event if wait is None else min(wait, until_event)
+                self._cond.wait(wait)
+        return b""
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            now = self._now()
+            self.firmware.advance(now)
+            return sum(len(data) for delivery_time, data in self._output if delivery_time <= now)
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._output.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    # --- Controle do teste ---
+    def power_cycle(self):
+        """Reinicia a ESP32 simulada (RAM zerada, NVS e posição do eixo preservadas)."""
+        with self._cond:
+            self.firmware.now = self._now()
+            self.firmware.power_on()
+            self._cond.notify_all()
+
+    def set_faults(self, **changes):
+        """Altera as falhas injetadas (campos de SimulatorFaults) com a simulação em andamento."""
+        with self._cond:
+            for name, value in changes.items():
+                if not hasattr(self.faults, name):
+                    raise AttributeError(f"Falha desconhecida: {name}")
+                setattr(self.faults, name, value)
+            self._cond.notify_all()
+
+
+class PtyBridge:
+    """Expõe um SimulatedSerial em um pseudo-terminal (POSIX); `port_name` é o caminho para o pyserial/GUI."""
+
+    def __init__(self, link):
+        import pty
+        import tty
+        self.link = link
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave) # Sem eco nem tradução de fim de linha antes de o cliente abrir a porta
+        self.port_name = os.ttyname(self._slave)
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=target, daemon=True)
+                         for target in (self._host_to_device, self._device_to_host)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self.link.close()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _host_to_device(self):
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0.1)
+            if readable:
+                try:
+                    data = os.read(self._master, 4096)
+                except OSError:
+                    break
+                self.link.write(data)
+
+    def _device_to_host(self):
+        while self._running:
+            data = self.link.read(4096)
+            if data:
+                os.write(self._master, data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador da ESP32 do motor do radar em um pseudo-terminal.")
+    parser.add_argument("--baud", type=int, default=BAUD_RATE, help="Baud rate simulado (0 = sem limite de vazão)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Segundos simulados por segundo real (0 = tempo virtual instantâneo)")
+    parser.add_argument("--drop-rx", type=float, default=0.0, help="Probabilidade de perder cada byte host -> ESP32")
+    parser.add_argument("--drop-tx", type=float, default=0.0, help="Probabilidade de perder cada byte ESP32 -> host")
+    parser.add_argument("--ack-delay-ms", type=float, default=0.0, help="Atraso antes de cada ACK_*")
+    parser.add_argument("--stuck-limit-switch", choices=("ativo", "inativo"), help="Trava a leitura do fim de curso")
+    parser.add_argument("--limit-switch-deg", type=float, default=DEFAULT_LIMIT_SWITCH_STEPS * DEGREES_PER_PULSE,
+                        help="Posição do fim de curso em graus a partir do eixo ao ligar")
+    parser.add_argument("--nvs", help="Arquivo JSON que guarda a NVS simulada entre execuções")
+    parser.add_argument("--seed", type=int, help="Semente das falhas aleatórias")
+    parser.add_argument("--backlash-steps", type=int, default=0, help="Folga mecânica simulada (passos)")
+    args = parser.parse_args()
+
+    nvs = {}
+    if args.nvs and os.path.exists(args.nvs):
+        with open(args.nvs, encoding="utf-8") as f:
+            nvs = json.load(f)
+    stuck = None if args.stuck_limit_switch is None else args.stuck_limit_switch == "ativo"
+    faults = SimulatorFaults(args.drop_rx, args.drop_tx, stuck, args.ack_delay_ms / 1000.0, args.backlash_steps)
+    link = SimulatedSerial(baudrate=args.baud or None, time_scale=args.time_scale or None, faults=faults, nvs=nvs,
+                           limit_switch_steps=_roundf(args.limit_switch_deg / DEGREES_PER_PULSE), timeout=0.05,
+                           seed=args.seed)
+    bridge = PtyBridge(link)
+    bridge.start()
+    print(f"ESP32 simulada em {bridge.port_name} (Ctrl+C para encerrar)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge.stop()
+        if args.nvs:
+            with open(args.nvs, "w", encoding="utf-8") as f:
+                json.dump(link.firmware.nvs, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Fixtures dos testes: cliente ligado ao simulador (radar_sim), sem a bancada nem o pyserial."""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from radar_client import RadarMotorClient # noqa: E402
+from radar_sim import SimulatedSerial # noqa: E402
+
+COMMAND_TIMEOUT_S = 10.0
+
+
+def open_client(link):
+    """RadarMotorClient conectado a um SimulatedSerial, após as mensagens do boot."""
+    client = RadarMotorClient(serial_port=link)
+    client.connect()
+    time.sleep(0.05)
+    return client
+
+
+def wait_until(condition, timeout=COMMAND_TIMEOUT_S):
+    """Espera (tempo real) `condition()` ficar verdadeira; devolve o último valor."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def sim_link():
+    """SimulatedSerial ideal (tempo virtual instantâneo); o firmware simulado fica em `sim_link.firmware`."""
+    return SimulatedSerial(time_scale=None, baudrate=None)
+
+
+@pytest.fixture
+def sim_client(sim_link):
+    """RadarMotorClient ligado a `sim_link`, já com HOME feito."""
+    client = open_client(sim_link)
+    client.home().result(timeout=COMMAND_TIMEOUT_S)
+    yield client
+    client.close()
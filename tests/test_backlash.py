@@ -0,0 +1,55 @@
+"""Compensação da folga (FOLGA) nas inversões de sentido, com folga mecânica injetada no simulador."""
+
+import pytest
+
+from conftest import COMMAND_TIMEOUT_S
+from radar_autocal import measure_backlash, open_source
+from radar_protocol import RadarCommandError
+
+BACKLASH_STEPS = 40
+TARGETS = (90, 120, 60, 200, 30, 100) # Alterna os sentidos de chegada
+
+
+@pytest.fixture
+def sim_link(sim_link):
+    sim_link.set_faults(backlash_steps=BACKLASH_STEPS)
+    return sim_link
+
+
+@pytest.fixture
+def sim_client(sim_client):
+    """Refaz o HOME recuando 10° do sensor: o recuo padrão (2°) fica dentro da folga injetada."""
+    sim_client.configure_homing(1600, 200, 10, 10).result(timeout=COMMAND_TIMEOUT_S)
+    sim_client.home().result(timeout=COMMAND_TIMEOUT_S)
+    return sim_client
+
+
+def shaft_errors(client, firmware):
+    """Diferença entre o eixo e o motor em cada alvo; constante quando a folga está compensada."""
+    errors = []
+    for degrees in TARGETS:
+        client.move_to(degrees, 2000).result(timeout=COMMAND_TIMEOUT_S)
+        errors.append(firmware.shaft_position() - firmware.position_steps)
+    return errors
+
+
+def test_backlash_is_compensated(sim_client, sim_link):
+    sim_client.set_backlash(BACKLASH_STEPS).result(timeout=COMMAND_TIMEOUT_S)
+    assert len(set(shaft_errors(sim_client, sim_link.firmware))) == 1
+
+
+def test_uncompensated_backlash_shows_on_reversals(sim_client, sim_link):
+    sim_client.set_backlash(0).result(timeout=COMMAND_TIMEOUT_S)
+    errors = shaft_errors(sim_client, sim_link.firmware)
+    assert max(errors) - min(errors) == BACKLASH_STEPS
+
+
+def test_measure_backlash(sim_client, sim_link):
+    steps = measure_backlash(sim_client, open_source("sim", sim_link), settle_s=0)
+    assert steps == BACKLASH_STEPS
+    assert sim_link.firmware.backlash_steps == BACKLASH_STEPS
+
+
+def test_backlash_out_of_range_is_refused(sim_client):
+    with pytest.raises(RadarCommandError, match="NACK_FOLGA_INVALIDA"):
+        sim_client.set_backlash(401).result(timeout=COMMAND_TIMEOUT_S)
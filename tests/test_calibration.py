@@ -0,0 +1,74 @@
+"""Calibração linear (CALIBRAR) e tabela de correção (CALTAB) no simulador, com a gravação na NVS."""
+
+import math
+
+import pytest
+
+from conftest import COMMAND_TIMEOUT_S, wait_until
+from radar_calibration import METHOD_SPLINE, CalibrationPoint, fit_table, position_degrees, wrap_degrees
+from radar_protocol import DEGREES_PER_PULSE, RadarCommandError
+from radar_sim import SimulatedSerial
+
+TARGETS = (10, 95.5, 200, 359)
+
+
+def output_degrees(motor_degrees):
+    """Saída de um redutor com erro não linear (o que um sensor externo mediria)."""
+    radians = math.radians(motor_degrees)
+    return motor_degrees + 1.5 * math.sin(radians) + 0.5 * math.cos(2 * radians)
+
+
+@pytest.fixture
+def table():
+    points = [CalibrationPoint(t, output_degrees(t) % 360) for t in range(0, 360, 10)]
+    return fit_table(points, method=METHOD_SPLINE).corrections
+
+
+def test_caltab_corrects_the_output_angle(sim_client, sim_link, table):
+    firmware = sim_link.firmware
+    sim_client.upload_calibration_table(table).result(timeout=COMMAND_TIMEOUT_S)
+    for target in TARGETS:
+        sim_client.move_to(target, 2000).result(timeout=COMMAND_TIMEOUT_S)
+        output = output_degrees(firmware.position_steps * DEGREES_PER_PULSE)
+        assert abs(wrap_degrees(output - target)) <= DEGREES_PER_PULSE
+        sim_client.query_position().result(timeout=COMMAND_TIMEOUT_S)
+        assert abs(wrap_degrees(sim_client.position.degrees - target)) <= DEGREES_PER_PULSE
+
+
+def test_caltab_survives_power_cycle(sim_client, sim_link, table):
+    firmware = sim_link.firmware
+    sim_client.upload_calibration_table(table).result(timeout=COMMAND_TIMEOUT_S)
+    assert wait_until(lambda: "table" in firmware.nvs)
+    lookup = list(firmware.cal_lut)
+    assert SimulatedSerial(time_scale=None, baudrate=None, nvs=firmware.nvs).firmware.cal_lut == lookup
+
+
+def test_reversing_caltab_is_refused(sim_client, sim_link):
+    with pytest.raises(RadarCommandError, match="NACK_CALTAB_INVALIDA"):
+        sim_client.upload_calibration_table([0.0, 0.0, 0.0, -900.0]).result(timeout=COMMAND_TIMEOUT_S)
+    assert sim_link.firmware.cal_table == []
+
+
+def test_rejected_caltab_chunk_fails_with_its_own_nack(sim_client, sim_link):
+    sent = []
+    sim_client.add_listener(lambda direction, line: sent.append(line) if line.startswith("CALTAB") else None)
+    table = [0.0] * 24
+    table[15] = 500.0 # Acima de CAL_TABLE_MAX_CORRECTION_STEPS: recusado no segundo bloco
+    with pytest.raises(RadarCommandError) as error:
+        sim_client.upload_calibration_table(table).result(timeout=COMMAND_TIMEOUT_S)
+    assert error.value.command.startswith("CALTAB ADD 12 ")
+    assert not any(line.startswith("CALTAB APLICAR") for line in sent)
+    assert sim_link.firmware.cal_table == []
+
+
+
+def test_position_with_factor_above_one_wraps(sim_client, sim_link):
+    firmware = sim_link.firmware
+    sim_client.calibrate([(0, 0), (90, 99), (180, 198)]).result(timeout=COMMAND_TIMEOUT_S)
+    for _ in range(2):
+        sim_client.move(187, 2000).result(timeout=COMMAND_TIMEOUT_S) # 374° calibrados: 340° do motor
+    sim_client.query_position().result(timeout=COMMAND_TIMEOUT_S)
+    degrees = sim_client.position.degrees
+    assert 0 <= degrees < 360
+    assert degrees == pytest.approx(position_degrees(firmware.position_steps, firmware.calibration_factor), abs=1e-3)
+    assert degrees == pytest.approx(14, abs=DEGREES_PER_PULSE)
@@ -0,0 +1,44 @@
+"""HOME em duas passadas (aproximação rápida, recuo e reaproximação lenta) e em uma passada."""
+
+import pytest
+
+from conftest import COMMAND_TIMEOUT_S
+from radar_protocol import DEGREES_PER_PULSE, LimitSwitchTrip, RadarCommandError
+
+
+def home_from(client, degrees):
+    """Afasta o eixo `degrees` do HOME e refaz o homing; devolve os LSW recebidos."""
+    trips = []
+    client.move(degrees, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    client.homing_report = None
+    client.events.subscribe(LimitSwitchTrip, trips.append)
+    client.home().result(timeout=COMMAND_TIMEOUT_S)
+    return trips
+
+
+def test_two_phase_homing(sim_client, sim_link):
+    firmware = sim_link.firmware
+    sim_client.configure_homing(1000, 150, 4, 3).result(timeout=COMMAND_TIMEOUT_S)
+    trips = home_from(sim_client, 90)
+    report = sim_client.homing_report
+    assert len(trips) == 2 # Uma parada no sensor por passada
+    assert report is not None and report.delta_steps == 0
+    assert report.fast_trip_steps == report.slow_trip_steps == trips[-1].position_steps
+    assert firmware.shaft_steps == firmware.limit_switch_steps + round(3 / DEGREES_PER_PULSE)
+    sim_client.query_position().result(timeout=COMMAND_TIMEOUT_S)
+    assert sim_client.position.position_steps == 0 and sim_client.position.referenced
+
+
+def test_single_pass_homing(sim_client, sim_link):
+    firmware = sim_link.firmware
+    sim_client.configure_homing(600, 0).result(timeout=COMMAND_TIMEOUT_S)
+    trips = home_from(sim_client, 90)
+    assert len(trips) == 1
+    assert sim_client.homing_report is None # O HOM só existe no homing em duas passadas
+    backoff_steps = round(firmware.homing_final_backoff_degrees / DEGREES_PER_PULSE)
+    assert firmware.shaft_steps == firmware.limit_switch_steps + backoff_steps
+
+
+def test_invalid_homing_config_is_refused(sim_client):
+    with pytest.raises(RadarCommandError, match="NACK_HOMING_INVALIDO"):
+        sim_client.configure_homing(0).result(timeout=COMMAND_TIMEOUT_S)
@@ -0,0 +1,29 @@
+"""Gravação adiada da NVS: as alterações ficam na RAM e são gravadas de uma vez, com o motor parado."""
+
+import pytest
+
+from conftest import COMMAND_TIMEOUT_S, open_client, wait_until
+from radar_sim import SimulatedSerial
+
+
+@pytest.fixture
+def realtime_link():
+    """Tempo simulado igual ao real: os comandos chegam dentro do atraso da gravação. A NVS já tem os padrões."""
+    nvs = {"factor": 1.0, "offset": 0.0, "homed": False, "backlash": 0, "table": []}
+    return SimulatedSerial(time_scale=1.0, baudrate=None, nvs=nvs)
+
+
+def test_nvs_writes_are_deferred_and_coalesced(realtime_link):
+    firmware = realtime_link.firmware
+    client = open_client(realtime_link)
+    try:
+        for steps in range(1, 11):
+            client.set_backlash(steps).result(timeout=COMMAND_TIMEOUT_S)
+        assert firmware.nvs_writes.get("backlash", 0) == 0 # Responde sem esperar a flash
+        assert wait_until(lambda: firmware.nvs.get("backlash") == 10)
+        assert firmware.nvs_writes["backlash"] == 1
+        assert list(firmware.nvs_writes) == ["backlash"] # Só as chaves alteradas
+    finally:
+        client.close()
+    realtime_link.power_cycle()
+    assert firmware.backlash_steps == 10
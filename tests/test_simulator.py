@@ -0,0 +1,65 @@
+"""Protocolo do simulador pelo RadarMotorClient: movimentos, posição absoluta, SCAN e PROG, em texto e binário."""
+
+import struct
+
+import pytest
+
+from conftest import COMMAND_TIMEOUT_S
+from radar_protocol import (
+    DEGREES_PER_PULSE, FRAME_SCAN_POINT, PULSES_PER_REVOLUTION, ProgramSegment, RadarCommandError, SerialCodec,
+    encode_frame,
+)
+
+
+@pytest.fixture(params=[False, True], ids=["texto", "binario"])
+def client(request, sim_client):
+    if request.param:
+        sim_client.request_binary_protocol().result(timeout=COMMAND_TIMEOUT_S)
+    return sim_client
+
+
+def test_move_and_position(client, sim_link):
+    client.move(90, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    client.query_position().result(timeout=COMMAND_TIMEOUT_S)
+    assert client.position.position_steps == sim_link.firmware.position_steps == round(90 / DEGREES_PER_PULSE)
+    assert client.position.referenced
+
+
+def test_move_to_takes_the_shortest_path(client, sim_link):
+    for degrees in (120, 240):
+        client.move_to(degrees, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    client.move_to(10, 2000).result(timeout=COMMAND_TIMEOUT_S) # 130° no sentido FRENTE, não 230° no RE
+    assert sim_link.firmware.position_steps == round(370 / DEGREES_PER_PULSE)
+    client.query_position().result(timeout=COMMAND_TIMEOUT_S)
+    assert client.position.position_steps % PULSES_PER_REVOLUTION == round(10 / DEGREES_PER_PULSE)
+
+
+def test_angle_out_of_range_is_refused(client):
+    with pytest.raises(RadarCommandError, match="NACK_ANGULO_RANGE_INVALIDO"):
+        client.move(361, 2000).result(timeout=COMMAND_TIMEOUT_S)
+
+
+
+def test_scan_reports_every_point(client):
+    points = []
+    client.add_listener(lambda direction, line: points.append(line) if line.startswith("SCN ") else None)
+    result = client.scan(0, 90, 9, 0, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    assert result.response == "ACK_SCAN_CONCLUIDO"
+    assert [int(line.split()[3]) for line in points] == [index * 80 for index in range(11)] # 9° = 80 passos
+
+
+def test_binary_scan_index_beyond_16_bits():
+    codec = SerialCodec()
+    codec.binary = True
+    frame = encode_frame(FRAME_SCAN_POINT, struct.pack("<IIi", 3, 70000, -1234)) # Varredura longa: > 65535 pontos
+    assert codec.feed(frame) == ["SCN 3 70000 -1234"]
+
+
+def test_program_runs_every_segment(client, sim_link):
+    segments = [ProgramSegment(True, 9.0, 2000, 5)] * 20 + [ProgramSegment(False, 9.0, 2000, 0)] * 5
+    start = sim_link.firmware.position_steps
+    done = []
+    result = client.run_program(segments, on_segment=done.append).result(timeout=COMMAND_TIMEOUT_S)
+    assert result.response == "ACK_PROG_CONCLUIDO"
+    assert len(done) == len(segments)
+    assert sim_link.firmware.position_steps - start == 15 * 80
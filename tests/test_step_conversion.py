@@ -0,0 +1,63 @@
+"""Conversão de ângulos em passos em ponto fixo, com o resto levado entre os MOVER ANGULO."""
+
+import pytest
+
+from conftest import COMMAND_TIMEOUT_S
+from radar_calibration import StepConverter
+from radar_program import make_segment, predict_steps
+from radar_protocol import DEGREES_PER_PULSE, ScanPoint
+
+
+def move_many(client, firmware, degrees, count):
+    start = firmware.position_steps
+    for _ in range(count):
+        client.move(degrees, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    return firmware.position_steps - start
+
+
+def test_converter_half_degree_moves_sum_exactly():
+    converter = StepConverter()
+    assert sum(converter.move(True, 0.5) for _ in range(1000)) == round(500 / DEGREES_PER_PULSE)
+
+
+@pytest.mark.parametrize("degrees", [0.1, 0.05])
+def test_converter_sub_step_moves_accumulate(degrees):
+    converter = StepConverter()
+    assert sum(converter.move(True, degrees) for _ in range(1000)) == round(1000 * degrees / DEGREES_PER_PULSE)
+
+
+@pytest.mark.parametrize("degrees", [0.5, 0.1, 0.05])
+def test_sim_moves_sum_exactly(sim_client, sim_link, degrees):
+    assert move_many(sim_client, sim_link.firmware, degrees, 1000) == round(1000 * degrees / DEGREES_PER_PULSE)
+
+
+def test_sim_sub_step_move_is_acknowledged(sim_client, sim_link):
+    result = sim_client.move(0.05, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    assert result.response == "ACK_ANGULO_CONCLUIDO"
+    assert sim_link.firmware.position_steps == 0
+
+
+def test_scan_points_do_not_drift(sim_client):
+    points = []
+    sim_client.events.subscribe(ScanPoint, points.append)
+    sim_client.scan(0, 90, 0.5, 0, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    converter = StepConverter()
+    assert [point.position_steps for point in points] == [converter.steps(i * 0.5) for i in range(181)]
+
+
+def test_program_matches_predicted_steps(sim_client, sim_link):
+    segments = [make_segment(True, 0.3, 2000, 0) for _ in range(100)]
+    segments += [make_segment(False, 0.07, 2000, 0) for _ in range(30)]
+    start = sim_link.firmware.position_steps
+    sim_client.run_program(segments).result(timeout=COMMAND_TIMEOUT_S)
+    expected = sum(pulses if segment.forward else -pulses
+                   for pulses, segment in zip(predict_steps(segments), segments))
+    assert sim_link.firmware.position_steps - start == expected
+
+
+def test_linear_calibration_matches_host_conversion(sim_client, sim_link):
+    firmware = sim_link.firmware
+    sim_client.calibrate([(0, 0), (90, 91), (180, 182)]).result(timeout=COMMAND_TIMEOUT_S)
+    assert firmware.calibration_factor != 1.0
+    sim_client.move_to(90, 2000).result(timeout=COMMAND_TIMEOUT_S)
+    assert firmware.position_steps == StepConverter(firmware.calibration_factor).steps(90)